@@ -0,0 +1,140 @@
+### LOAD LIBRARIES #############################################################
+import time
+
+import db
+import hunts
+import tables
+
+### PER-PUZZLE ANALYTICS #######################################################
+
+# Solve-time buckets (upper bounds in seconds) for the per-puzzle distribution:
+SOLVE_TIME_BUCKETS = [300, 900, 1800, 3600, 7200, 14400]
+BUCKET_LABELS = ['< 5m', '5-15m', '15-30m', '30m-1h', '1-2h', '2-4h', '> 4h']
+
+# A team's "solve time" on a puzzle runs from its first guess on that puzzle to its
+# correct guess. Everything is aggregated in Postgres (percentile_cont, FILTER,
+# width_bucket), so only one row per puzzle or bucket reaches the bot.
+PER_TEAM_SQL = """SELECT puzzle_id, team_id,
+        min(guess_time) AS first_guess,
+        min(guess_time) FILTER (WHERE guess_status = 'correct') AS solve_time,
+        count(*) FILTER (WHERE guess_status = 'incorrect') AS num_incorrect
+    FROM guesslog {where} GROUP BY puzzle_id, team_id"""
+
+def format_duration(seconds):
+    if seconds is None:
+        return ''
+    minutes = int(seconds // 60)
+    return f'{minutes // 60}:{minutes % 60:02d}'
+
+# Cached results, discarded when a puzzle is solved (and after max_age seconds in
+# any case, since incorrect guesses also move the guess-to-solve ratios).
+    # In write-behind mode the guesslog trails the bot by one flush interval, which
+    # max_age also covers.
+class Analytics:
+    def __init__(self, max_age=60.0):
+        self.max_age = max_age
+        self.cached = {} # None (all puzzles) or puzzle_id -> (computed at, rendered pages)
+        self.hits = 0
+        self.misses = 0
+
+    # Drop results that a new solve of this puzzle makes stale:
+    def invalidate(self, puzzle_id):
+        self.cached.pop(puzzle_id, None)
+        self.cached.pop(None, None)
+
+    def clear(self):
+        self.cached.clear()
+
+    async def get(self, key, compute):
+        cached = self.cached.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.max_age:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        pages = await compute()
+        self.cached[key] = (time.monotonic(), pages)
+        return pages
+
+    # Summary for every puzzle, as a list of message-sized tables:
+    async def summary(self):
+        return await self.get(None, self.compute_summary)
+
+    async def compute_summary(self):
+        sql = f"""WITH per_team AS ({PER_TEAM_SQL.format(where='')})
+            SELECT puzzles.puzzle_id, puzzles.puzzle_name,
+                count(per_team.solve_time) AS num_solves,
+                min(per_team.solve_time) AS first_solve,
+                percentile_cont(0.5) WITHIN GROUP (
+                    ORDER BY extract(epoch FROM per_team.solve_time - per_team.first_guess)) AS median_seconds,
+                percentile_cont(0.9) WITHIN GROUP (
+                    ORDER BY extract(epoch FROM per_team.solve_time - per_team.first_guess)) AS p90_seconds,
+                sum(per_team.num_incorrect) AS num_incorrect
+            FROM puzzles LEFT JOIN per_team ON per_team.puzzle_id = puzzles.puzzle_id
+            GROUP BY puzzles.puzzle_id, puzzles.puzzle_name
+            ORDER BY puzzles.puzzle_id ASC"""
+        rows = await db.fetchall(sql, lane=db.READ)
+
+        table = [['#', 'Puzzle', 'Solves', 'First Solve', 'Median', 'P90', 'Wrong/Solve']]
+        for row in rows:
+            num_solves = row['num_solves']
+            first_solve = row['first_solve'].strftime('%m-%d %H:%M') if row['first_solve'] else ''
+            ratio = f"{(row['num_incorrect'] or 0) / num_solves:.1f}" if num_solves else ''
+            table.append([str(row['puzzle_id']), row['puzzle_name'], str(num_solves), first_solve,
+                format_duration(row['median_seconds']), format_duration(row['p90_seconds']), ratio])
+        return tables.render_pages(table)
+
+    # Detail for one puzzle: headline figures, first solvers and the solve-time histogram:
+    async def puzzle(self, puzzle_id):
+        return await self.get(puzzle_id, lambda: self.compute_puzzle(puzzle_id))
+
+    async def compute_puzzle(self, puzzle_id):
+        per_team = PER_TEAM_SQL.format(where='WHERE puzzle_id = %s')
+        async with db.cursor(db.READ) as cur:
+            sql = f"""WITH per_team AS ({per_team})
+                SELECT count(*) AS num_teams, count(solve_time) AS num_solves,
+                    sum(num_incorrect) AS num_incorrect,
+                    percentile_cont(0.5) WITHIN GROUP (
+                        ORDER BY extract(epoch FROM solve_time - first_guess)) AS median_seconds,
+                    percentile_cont(0.9) WITHIN GROUP (
+                        ORDER BY extract(epoch FROM solve_time - first_guess)) AS p90_seconds
+                FROM per_team"""
+            await cur.execute(sql, (puzzle_id,))
+            overview = await cur.fetchone()
+
+            sql = f"""WITH per_team AS ({per_team})
+                SELECT width_bucket(extract(epoch FROM solve_time - first_guess)::NUMERIC, %s::NUMERIC[]) AS bucket,
+                    count(*) AS num_teams
+                FROM per_team WHERE solve_time IS NOT NULL GROUP BY bucket"""
+            await cur.execute(sql, (puzzle_id, SOLVE_TIME_BUCKETS))
+            buckets = {row['bucket']: row['num_teams'] for row in await cur.fetchall()}
+
+            sql = f"""WITH per_team AS ({per_team})
+                SELECT teams.team_name, per_team.solve_time FROM per_team
+                JOIN teams ON teams.team_id = per_team.team_id
+                WHERE per_team.solve_time IS NOT NULL
+                ORDER BY per_team.solve_time ASC LIMIT 5"""
+            await cur.execute(sql, (puzzle_id,))
+            first_solvers = await cur.fetchall()
+
+        num_solves = overview['num_solves']
+        lines = [f"{overview['num_teams']} teams guessed, {num_solves} solved; "
+            f"median solve time {format_duration(overview['median_seconds']) or '-'}, "
+            f"90th percentile {format_duration(overview['p90_seconds']) or '-'}; "
+            f"{(overview['num_incorrect'] or 0) / num_solves if num_solves else 0:.1f} wrong guesses per solve."]
+
+        # A text bar chart of solve times:
+        largest = max(buckets.values(), default=0)
+        chart = [['Solve Time', 'Teams', '']]
+        for bucket, label in enumerate(BUCKET_LABELS):
+            count = buckets.get(bucket, 0)
+            chart.append([label, str(count), '█' * round(20 * count / largest) if largest else ''])
+        lines.append(tables.render_table(chart))
+
+        if first_solvers:
+            solvers = [['#', 'First Solvers', 'Time']]
+            for place, row in enumerate(first_solvers, start=1):
+                solvers.append([str(place), row['team_name'], row['solve_time'].strftime('%m-%d %H:%M:%S')])
+            lines.append(tables.render_table(solvers))
+        return ['\n'.join(lines)]
+
+cache = hunts.PerHunt(Analytics)
@@ -0,0 +1,85 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+import datetime
+
+import db
+import hunts
+from normalize import normalize_guess # Every guess and response is compared in this form
+
+### ANSWER INDEX ###############################################################
+
+# Postgres channel notified whenever puzzles or responses change:
+CONTENT_CHANNEL = 'hunt_content'
+
+# An in-memory copy of the puzzles and responses tables, used to classify guesses
+# without a database round trip. Both tables are small and rarely change mid-hunt.
+class AnswerIndex:
+    def __init__(self):
+        self.puzzles = {} # puzzle_id -> puzzle row
+        self.responses = {} # (puzzle_id, normalized guess) -> response entry
+        self.loaded_at = None
+        self.reload_task = None
+        self.reload_pending = False
+
+    # Read both tables and swap in the new index in one step:
+    async def load(self):
+        async with db.cursor() as cur:
+            await cur.execute("""SELECT puzzle_id, puzzle_name, puzzle_points, is_final_puzzle
+                FROM puzzles ORDER BY puzzle_id ASC""")
+            puzzle_rows = await cur.fetchall()
+            await cur.execute("""SELECT puzzle_id, guess, is_answer, response
+                FROM responses WHERE guess IS NOT NULL ORDER BY response_id ASC""")
+            response_rows = await cur.fetchall()
+
+        puzzles = {row['puzzle_id']: row for row in puzzle_rows}
+        responses = {}
+        for row in response_rows:
+            puzzle = puzzles.get(row['puzzle_id'])
+            if puzzle is None: # Ignore responses attached to a missing puzzle
+                continue
+            key = (row['puzzle_id'], normalize_guess(row['guess']))
+            # Keep the first entry if two responses normalize to the same guess:
+            responses.setdefault(key, {
+                'response': row['response'],
+                'is_answer': row['is_answer'],
+                'puzzle_points': puzzle['puzzle_points'],
+                'is_final_puzzle': puzzle['is_final_puzzle'],
+                })
+
+        self.puzzles = puzzles
+        self.responses = responses
+        self.loaded_at = datetime.datetime.now(datetime.timezone.utc)
+        return len(puzzles), len(responses)
+
+    # Coalesce bursts of reload requests (e.g. one NOTIFY per edited row) into one load:
+    def request_reload(self):
+        if self.reload_task is not None and not self.reload_task.done():
+            self.reload_pending = True
+            return
+        self.reload_task = asyncio.create_task(self.reload_until_current())
+
+    async def reload_until_current(self):
+        while True:
+            self.reload_pending = False
+            try:
+                num_puzzles, num_responses = await self.load()
+                print(f'Answer index reloaded: {num_puzzles} puzzles, {num_responses} responses.')
+            except Exception as error:
+                print(f'Answer index reload failed: {error}')
+            if not self.reload_pending:
+                return
+
+    # Look up a puzzle row (or None for an unknown puzzle):
+    def puzzle(self, puzzle_id):
+        return self.puzzles.get(puzzle_id)
+
+    # Classify a normalized guess as correct, partial or incorrect:
+    def classify(self, puzzle_id, guess):
+        entry = self.responses.get((puzzle_id, guess))
+        if entry is None:
+            return 'incorrect', None
+        if entry['is_answer']:
+            return 'correct', entry['response']
+        return 'partial', entry['response']
+
+index = hunts.PerHunt(AnswerIndex)
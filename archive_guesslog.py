@@ -0,0 +1,148 @@
+### LOAD LIBRARIES #############################################################
+import argparse
+import datetime
+import os
+import sys
+
+import psycopg2
+from psycopg2 import sql as pgsql
+import export_guesslog # Writes each day's guesses out before it is detached
+import manage_hunts # Connects to the chosen hunt's tables
+
+# Export old days' partitions of the guesslog (see migration 10) to CSV files, then
+# detach them, so that the bot's queries and vacuum only ever see recent days:
+    # python archive_guesslog.py --older-than 30 --export-dir archives
+    # python archive_guesslog.py --before 2024-04-15 --hunt "Practice Hunt" --export-dir archives --drop
+# Each day is written to <schema>.guesslog_YYYYMMDD.csv in the export directory
+# (with export_guesslog.py's columns) and recorded in guesslog_archives; a day is
+# only detached once its export is recorded and still matches the partition. The
+# detached day is kept as a plain table, guesslog_archived_YYYYMMDD, in the hunt's
+# schema (or dropped, with --drop). Duplicate checks, scores, puzzle counters and
+# audit_scores.py use team_solves and team_guesses, so they are unaffected; only
+# !analytics and export_guesslog.py leave out archived days.
+
+### EXPORTING ##################################################################
+
+# The guesslog's daily partitions, as (day, table name), oldest first:
+def daily_partitions(cur):
+    cur.execute("""SELECT child.relname FROM pg_inherits
+        JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'guesslog'::regclass
+        AND child.relname ~ '^guesslog_[0-9]{8}$'
+        ORDER BY child.relname ASC""")
+    return [(datetime.datetime.strptime(row[0][len('guesslog_'):], '%Y%m%d').date(), row[0])
+        for row in cur.fetchall()]
+
+def count_rows(cur, name):
+    cur.execute(pgsql.SQL('SELECT COUNT(*) FROM {}').format(pgsql.Identifier(name)))
+    return cur.fetchone()[0]
+
+# Write one day's guesses to a CSV file and record it in guesslog_archives,
+# returning the number of rows written:
+    # The partition is locked against writes while it is read, and the file is
+    # written under a temporary name and synced to disk before it takes its place.
+def export_partition(conn, day, name, filename):
+    since = datetime.datetime.combine(day, datetime.time(), datetime.timezone.utc)
+    sql, data = export_guesslog.export_query(since=since, until=since + datetime.timedelta(days=1))
+    partial = filename + '.partial'
+    with conn.cursor() as cur:
+        cur.execute(pgsql.SQL('LOCK TABLE {} IN SHARE MODE').format(pgsql.Identifier(name)))
+        num_rows = count_rows(cur, name)
+        num_exported = export_guesslog.export_csv(conn, partial, sql, data)
+        if num_exported != num_rows:
+            os.remove(partial)
+            raise RuntimeError(f'{name} has {num_rows} rows, but {num_exported} were exported.')
+        with open(partial, 'rb') as file:
+            os.fsync(file.fileno())
+        os.replace(partial, filename)
+        cur.execute("""INSERT INTO guesslog_archives (day, file_name, num_rows) VALUES (%s, %s, %s)
+            ON CONFLICT (day) DO UPDATE SET file_name = EXCLUDED.file_name,
+                num_rows = EXCLUDED.num_rows, archived_at = CURRENT_TIMESTAMP""",
+            (day, os.path.abspath(filename), num_rows))
+    conn.commit()
+    return num_rows
+
+### ARCHIVING ##################################################################
+
+# Detach (and keep or drop) one day's partition, refusing unless its export is
+# recorded and the partition still holds exactly the rows that were exported:
+def detach_partition(conn, day, name, drop=False):
+    with conn.cursor() as cur:
+        cur.execute(pgsql.SQL('LOCK TABLE {} IN SHARE MODE').format(pgsql.Identifier(name)))
+        cur.execute("SELECT file_name, num_rows FROM guesslog_archives WHERE day = %s", (day,))
+        export = cur.fetchone()
+        if export is None:
+            raise RuntimeError(f'{name} has not been exported.')
+        file_name, num_exported = export
+        if count_rows(cur, name) != num_exported or not os.path.exists(file_name):
+            raise RuntimeError(f'{name} has changed since it was exported to {file_name}.')
+        cur.execute(pgsql.SQL('ALTER TABLE guesslog DETACH PARTITION {}').format(pgsql.Identifier(name)))
+        if drop:
+            cur.execute(pgsql.SQL('DROP TABLE {}').format(pgsql.Identifier(name)))
+        else:
+            cur.execute(pgsql.SQL('ALTER TABLE {} RENAME TO {}').format(pgsql.Identifier(name),
+                pgsql.Identifier(f"guesslog_archived_{day.strftime('%Y%m%d')}")))
+    conn.commit()
+
+# Export, then detach, every partition for a day before the cutoff, one day (and
+# one short transaction per step) at a time so that guesses are only held up briefly:
+def archive_partitions(conn, cutoff, export_dir, drop=False):
+    archived = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT current_schema()")
+        schema = cur.fetchone()[0]
+        partitions = daily_partitions(cur)
+    conn.commit()
+    for day, name in partitions:
+        if day >= cutoff:
+            break
+        filename = os.path.join(export_dir, f"{schema}.{name}.csv")
+        export_partition(conn, day, name, filename)
+        detach_partition(conn, day, name, drop)
+        archived.append(day)
+    return archived
+
+### RUN SCRIPT #################################################################
+
+def parse_day(value):
+    return datetime.date.fromisoformat(value)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and detach old days' partitions of the guesslog.")
+    cutoff = parser.add_mutually_exclusive_group(required=True)
+    cutoff.add_argument('--before', type=parse_day, help='archive days before this date (YYYY-MM-DD, UTC)')
+    cutoff.add_argument('--older-than', type=int, help='archive days more than this many days ago')
+    parser.add_argument('--export-dir', required=True, help="directory to write each day's guesses to")
+    parser.add_argument('--drop', action='store_true', help='drop the detached days instead of keeping them')
+    parser.add_argument('--hunt', help='the hunt to use, by name (default: the default hunt)')
+    args = parser.parse_args(argv)
+
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    before = args.before or today - datetime.timedelta(days=args.older_than)
+    if before > today:
+        parser.error("today's and future partitions cannot be archived")
+    if not os.path.isdir(args.export_dir):
+        parser.error(f'{args.export_dir} is not a directory')
+
+    try:
+        conn = manage_hunts.connect(args.hunt)
+    except manage_hunts.HuntError as error:
+        print(error)
+        return 1
+    try:
+        archived = archive_partitions(conn, before, args.export_dir, args.drop)
+    except (psycopg2.DatabaseError, OSError, RuntimeError) as error:
+        conn.rollback()
+        print(f'Archiving failed: {error}')
+        return 1
+    finally:
+        conn.close()
+    if not archived:
+        print(f'No guesslog partitions before {before}.')
+    else:
+        print(f"Exported and {'dropped' if args.drop else 'archived'} {len(archived)} days of guesses "
+            f'({archived[0]} to {archived[-1]}) to {args.export_dir}.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
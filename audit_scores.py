@@ -0,0 +1,181 @@
+### LOAD LIBRARIES #############################################################
+import argparse
+import io
+import sys
+import time
+
+import psycopg2
+import manage_hunts # Connects to the chosen hunt's tables
+
+try:
+    import pandas as pd # Required for this tool only (pip install pandas)
+except ImportError:
+    pd = None
+
+# Recompute every team's score, remaining guesses and solve times from its solves
+# and guesses (team_solves and team_guesses, which keep the guesses of days archived
+# from the guesslog) and compare them with the counters in the teams table, which
+# the bot updates in place. Optionally write the recomputed values back in one
+# batched UPDATE:
+    # python audit_scores.py
+    # python audit_scores.py --fix
+# Only a team's first correct guess on each puzzle counts. Remaining guesses are
+# checked against a starting allowance (--allowance) minus incorrect guesses, and
+# are only corrected with --fix-guesses, since organizers may have granted extras.
+
+AUDITED_COLUMNS = ['score', 'is_hunt_solved', 'last_solve_time', 'hunt_solve_time', 'num_guesses']
+
+### READING ####################################################################
+
+# Stream a query's rows with COPY straight into a DataFrame:
+def read_frame(cur, sql, **read_csv_args):
+    buffer = io.StringIO()
+    cur.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)', buffer)
+    buffer.seek(0)
+    return pd.read_csv(buffer, **read_csv_args)
+
+# Timestamps are sent as integer microseconds since the epoch, which parse far
+# faster than timestamp text:
+def epoch_us(column):
+    return f'(extract(epoch FROM {column}) * 1000000)::BIGINT AS {column}'
+
+def parse_times(frame, *columns):
+    for column in columns:
+        frame[column] = pd.to_datetime(frame[column], unit='us', utc=True)
+    return frame
+
+def read_tables(cur):
+    # Solves (with their times) and incorrect guesses (which only need counting):
+    guesses = read_frame(cur, """SELECT team_id, puzzle_id, 'correct' AS guess_status,
+            (extract(epoch FROM solve_time) * 1000000)::BIGINT AS guess_time FROM team_solves
+        UNION ALL SELECT team_id, puzzle_id, guess_status, NULL
+            FROM team_guesses WHERE guess_status = 'incorrect'""",
+        dtype={'team_id': 'int32', 'puzzle_id': 'int32', 'guess_status': 'category'})
+    puzzles = read_frame(cur, """SELECT puzzle_id, puzzle_points, is_final_puzzle FROM puzzles""",
+        dtype={'puzzle_id': 'int32'})
+    teams = read_frame(cur, f"""SELECT team_id, team_name, score, num_guesses, is_hunt_solved,
+        {epoch_us('last_solve_time')}, {epoch_us('hunt_solve_time')} FROM teams WHERE is_deleted = FALSE""")
+    parse_times(guesses, 'guess_time')
+    parse_times(teams, 'last_solve_time', 'hunt_solve_time')
+    for frame, column in ((puzzles, 'is_final_puzzle'), (teams, 'is_hunt_solved')):
+        frame[column] = frame[column].map({'t': True, 'f': False}).astype(bool)
+    return guesses, puzzles, teams.set_index('team_id')
+
+### REPLAY #####################################################################
+
+# Recompute each team's counters from its guesses, with grouped (vectorized)
+# aggregations rather than a per-guess loop:
+def replay(guesses, puzzles, teams, allowance):
+    correct = guesses[guesses['guess_status'] == 'correct']
+    first_solves = (correct.groupby(['team_id', 'puzzle_id'], observed=True)['guess_time'].min()
+        .reset_index().merge(puzzles, on='puzzle_id', how='inner'))
+    solves = first_solves.groupby('team_id').agg(
+        score=('puzzle_points', 'sum'), last_solve_time=('guess_time', 'max'))
+    hunt_solves = (first_solves[first_solves['is_final_puzzle']]
+        .groupby('team_id')['guess_time'].min().rename('hunt_solve_time'))
+    incorrect = guesses[guesses['guess_status'] == 'incorrect'].groupby('team_id').size()
+
+    expected = pd.DataFrame(index=teams.index)
+    expected['score'] = solves['score'].reindex(teams.index).fillna(0).astype('int64')
+    expected['hunt_solve_time'] = hunt_solves.reindex(teams.index)
+    expected['is_hunt_solved'] = expected['hunt_solve_time'].notna()
+    # Teams with no solves keep their registration time as last_solve_time:
+    expected['last_solve_time'] = solves['last_solve_time'].reindex(teams.index).fillna(teams['last_solve_time'])
+    expected['num_guesses'] = allowance - incorrect.reindex(teams.index).fillna(0).astype('int64')
+    return expected[AUDITED_COLUMNS]
+
+# Compare recorded counters with the replay, returning {column: mismatch mask}:
+def compare(teams, expected):
+    mismatches = {}
+    for column in AUDITED_COLUMNS:
+        recorded = teams[column]
+        replayed = expected[column]
+        both_missing = recorded.isna() & replayed.isna()
+        mismatches[column] = ~(both_missing | (recorded == replayed))
+    return mismatches
+
+def print_report(teams, expected, mismatches, limit):
+    for column, mask in mismatches.items():
+        print(f'{column}: {int(mask.sum())} teams differ')
+    differing = pd.concat(list(mismatches.values()), axis=1).any(axis=1)
+    for team_id in teams.index[differing][:limit]:
+        changes = ', '.join(f'{column} {teams.at[team_id, column]} -> {expected.at[team_id, column]}'
+            for column, mask in mismatches.items() if mask[team_id])
+        print(f'  team {team_id} ("{teams.at[team_id, "team_name"]}"): {changes}')
+    if differing.sum() > limit:
+        print(f'  ... and {int(differing.sum()) - limit} more')
+
+### CORRECTIONS ################################################################
+
+# Write the replayed values for every differing team in one UPDATE:
+def write_corrections(cur, expected, columns):
+    cur.execute("""CREATE TEMP TABLE audited_teams (
+        team_id INTEGER PRIMARY KEY,
+        score INTEGER,
+        is_hunt_solved BOOLEAN,
+        last_solve_time TIMESTAMP WITH TIME ZONE,
+        hunt_solve_time TIMESTAMP WITH TIME ZONE,
+        num_guesses INTEGER) ON COMMIT DROP""")
+    buffer = io.StringIO()
+    expected.reset_index().to_csv(buffer, index=False, header=False,
+        columns=['team_id'] + AUDITED_COLUMNS, date_format='%Y-%m-%d %H:%M:%S.%f%z')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY audited_teams (team_id, {', '.join(AUDITED_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer)
+    assignments = ', '.join(f'{column} = audited.{column}' for column in columns)
+    recorded = ', '.join(f'teams.{column}' for column in columns)
+    replayed = ', '.join(f'audited.{column}' for column in columns)
+    cur.execute(f"""UPDATE teams SET {assignments} FROM audited_teams AS audited
+        WHERE teams.team_id = audited.team_id AND ({recorded}) IS DISTINCT FROM ({replayed})""")
+    return cur.rowcount
+
+### RUN SCRIPT #################################################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute teams' counters from their solves and guesses and report differences.")
+    parser.add_argument('--allowance', type=int, default=50, help='guesses each team started with')
+    parser.add_argument('--fix', action='store_true', help='write the recomputed score and solve times')
+    parser.add_argument('--fix-guesses', action='store_true', help='also reset remaining guesses to allowance - incorrect')
+    parser.add_argument('--limit', type=int, default=20, help='differing teams to list')
+    parser.add_argument('--hunt', help='the hunt to use, by name (default: the default hunt)')
+    args = parser.parse_args(argv)
+    if pd is None:
+        print('audit_scores.py requires pandas (pip install pandas).')
+        return 1
+
+    started = time.perf_counter()
+    try:
+        conn = manage_hunts.connect(args.hunt)
+    except manage_hunts.HuntError as error:
+        print(error)
+        return 1
+    try:
+        if not (args.fix or args.fix_guesses): # Read from one consistent snapshot
+            conn.set_session(readonly=True, isolation_level='REPEATABLE READ')
+        with conn.cursor() as cur:
+            if args.fix or args.fix_guesses:
+                # Hold off new guesses (not reads) until the corrections are written:
+                cur.execute("LOCK TABLE team_solves, team_guesses IN SHARE MODE")
+            guesses, puzzles, teams = read_tables(cur)
+            read_seconds = time.perf_counter() - started
+            expected = replay(guesses, puzzles, teams, args.allowance)
+            mismatches = compare(teams, expected)
+            print(f'Replayed {len(guesses)} guesses for {len(teams)} teams in '
+                f'{time.perf_counter() - started:.2f} s ({read_seconds:.2f} s reading).')
+            print_report(teams, expected, mismatches, args.limit)
+
+            if args.fix or args.fix_guesses:
+                columns = AUDITED_COLUMNS if args.fix_guesses else AUDITED_COLUMNS[:-1]
+                num_fixed = write_corrections(cur, expected, columns)
+                conn.commit()
+                print(f'Corrected {num_fixed} teams. Run !reload so the running bot picks up the changes.')
+    except psycopg2.DatabaseError as error:
+        conn.rollback()
+        print(f'Audit failed: {error}')
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
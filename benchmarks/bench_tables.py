@@ -0,0 +1,66 @@
+### LOAD LIBRARIES #############################################################
+import os
+import sys
+import random
+import timeit
+
+# Allow running as `python benchmarks/bench_tables.py` from the repository root:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wcwidth import wcwidth
+import tables
+
+### PREVIOUS RENDERER ##########################################################
+
+# The rendering loop previously duplicated in display_leaderboard/display_puzzles,
+# kept here as the baseline for comparison:
+def legacy_calculate_width(text):
+    return round(sum(wcwidth(char) if wcwidth(char) != 2 else 2.2 for char in text))
+
+def legacy_pad_to_width(text, width):
+    padding_needed = width - legacy_calculate_width(text)
+    return text + ' ' * padding_needed
+
+def legacy_render_table(table):
+    col_widths = [max(legacy_calculate_width(row[i]) for row in table) for i in range(len(table[0]))]
+    header_line = "-|-".join('-' * col_width for col_width in col_widths) + "\n"
+    display_table = "```\n"
+    for row in table:
+        padded_row = [legacy_pad_to_width(cell, col_widths[i]) for i, cell in enumerate(row)]
+        display_table += " | ".join(padded_row) + "\n"
+        if row == table[0]:
+            display_table += header_line
+    display_table += "```"
+    return display_table
+
+### BENCHMARK ##################################################################
+
+# Build a leaderboard-shaped table with a mix of plain, accented and emoji names:
+def make_leaderboard(num_teams, seed=0):
+    rng = random.Random(seed)
+    words = ['Puzzle', 'Hunters', 'Ciphers', 'Café', 'Nerds', '🔎', '🧩', 'Team', 'Über', '謎']
+    table = [["#", "Team Name", "Score", "Last Solve", "Hunt Finish"]]
+    for place in range(1, num_teams + 1):
+        name = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        finish = '04-12 18:%02d:%02d' % (rng.randint(0, 59), rng.randint(0, 59)) if place <= 10 else ''
+        table.append([str(place), name, str(rng.randint(0, 40)),
+            '04-12 %02d:%02d:%02d' % (rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59)), finish])
+    return table
+
+def run(sizes=(100, 1000, 2000, 5000), repeat=5):
+    print(f"{'rows':>6} | {'previous (ms)':>13} | {'cold (ms)':>9} | {'warm (ms)':>9} | {'speedup':>7}")
+    for num_teams in sizes:
+        table = make_leaderboard(num_teams)
+        assert tables.render_table(table) == legacy_render_table(table)
+
+        legacy = min(timeit.repeat(lambda: legacy_render_table(table), number=1, repeat=repeat))
+        # Cold: width caches emptied before every render (first render after startup).
+        cold = min(timeit.repeat(lambda: tables.render_table(table), number=1, repeat=repeat,
+            setup=lambda: (tables.calculate_width.cache_clear(), tables.char_width.cache_clear())))
+        # Warm: names already measured by an earlier render (the usual case mid-hunt).
+        tables.render_table(table)
+        warm = min(timeit.repeat(lambda: tables.render_table(table), number=1, repeat=repeat))
+        print(f'{num_teams:>6} | {legacy * 1000:>13.2f} | {cold * 1000:>9.2f} | {warm * 1000:>9.2f} | '
+            f'{legacy / warm:>6.1f}x')
+
+if __name__ == '__main__':
+    run()
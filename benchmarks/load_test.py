@@ -0,0 +1,273 @@
+### LOAD LIBRARIES #############################################################
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+# Allow running as `python benchmarks/load_test.py` from the repository root:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import discord
+import psycopg2
+from psycopg2 import sql as pgsql
+from psycopg2.extras import execute_values
+
+from config import load_config, load_pool_config, load_write_behind_config
+import migrations
+import db
+import answers
+import hunts
+import leaderboard
+import membership
+import solves
+import team_queue
+import writebehind
+import main # The bot's command handlers (importing main does not connect to Discord)
+
+# Drives the bot's command handlers directly with stand-in Discord objects against
+# a throwaway database on the Postgres server in database.ini, so capacity can be
+# measured before hunt day without a Discord connection. Run it before and after a
+# change (--save, then --compare) to see the effect on throughput and latency.
+
+### STAND-IN DISCORD OBJECTS ###################################################
+
+class FakeUser:
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+
+# Passes the handlers' isinstance(ctx.channel, discord.DMChannel) checks:
+class FakeDMChannel(discord.DMChannel):
+    def __init__(self):
+        pass
+
+class FakeMessage:
+    def __init__(self, content):
+        self.id = random.getrandbits(63)
+        self.content = content
+
+    async def edit(self, **kwargs):
+        self.content = kwargs.get('content', self.content)
+
+    async def pin(self):
+        pass
+
+    async def add_reaction(self, emoji):
+        pass
+
+# Records what a command would have sent instead of calling the Discord API:
+class FakeContext:
+    def __init__(self, author):
+        self.author = author
+        self.channel = FakeDMChannel()
+        self.num_sent = 0
+        self.last_sent = None
+
+    async def send(self, content=None, **kwargs):
+        self.num_sent += 1
+        self.last_sent = content
+        return FakeMessage(content)
+
+### THROWAWAY DATABASE #########################################################
+
+# (Re)create an empty database alongside the configured one:
+def create_database(config, name):
+    conn = psycopg2.connect(**config)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(pgsql.SQL("DROP DATABASE IF EXISTS {}").format(pgsql.Identifier(name)))
+        cur.execute(pgsql.SQL("CREATE DATABASE {}").format(pgsql.Identifier(name)))
+    conn.close()
+
+def drop_database(config, name):
+    conn = psycopg2.connect(**config)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(pgsql.SQL("DROP DATABASE IF EXISTS {}").format(pgsql.Identifier(name)))
+    conn.close()
+
+# Apply the migrations and add puzzles, teams and solvers for the simulation.
+    # Returns the solvers as (discord_id, name, team_id) tuples.
+def populate_database(config, args):
+    conn = psycopg2.connect(**config)
+    migrations.migrate(conn)
+    with conn.cursor() as cur:
+        execute_values(cur, """INSERT INTO puzzles (puzzle_name, puzzle_points, is_final_puzzle) VALUES %s""",
+            [(f'Puzzle {i}', 1, i == args.puzzles) for i in range(1, args.puzzles + 1)])
+        responses = []
+        for i in range(1, args.puzzles + 1):
+            responses.append((i, f'answer{i}', True, 'Correct!'))
+            responses.append((i, f'keepgoing{i}', False, 'Keep going!'))
+        execute_values(cur, """INSERT INTO responses (puzzle_id, guess, is_answer, response) VALUES %s""",
+            responses)
+
+        # Enough guesses that no team runs out mid-test:
+        execute_values(cur, """INSERT INTO teams (team_name, team_token, num_guesses) VALUES %s""",
+            [(f'Load Test Team {i} 🧩', f'TOKEN{i:07d}', args.solvers * args.actions + 1)
+                for i in range(1, args.teams + 1)])
+        solvers = []
+        for team_id in range(1, args.teams + 1):
+            for i in range(args.solvers):
+                solvers.append((str(10**15 + team_id * 1000 + i), f'solver{team_id}_{i}', team_id, i == 0))
+        execute_values(cur, """INSERT INTO solvers (discord_id, discord_name, team_id, is_captain) VALUES %s""",
+            solvers)
+    conn.commit()
+    conn.close()
+    return [(discord_id, name, team_id) for discord_id, name, team_id, is_captain in solvers]
+
+### WORKLOAD ###################################################################
+
+# Share of each solver's actions going to each command, and of guesses of each kind:
+COMMAND_MIX = {'guess': 0.80, '!guess': 0.10, '!puzzles': 0.05, '!leaderboard': 0.05}
+GUESS_MIX = {'incorrect': 0.65, 'duplicate': 0.15, 'partial': 0.10, 'correct': 0.10}
+
+# One solver working through their actions, recording the latency of each:
+async def run_solver(solver, args, rng, team_guesses, latencies):
+    discord_id, name, team_id = solver
+    ctx = FakeContext(FakeUser(int(discord_id), name))
+    commands = list(COMMAND_MIX)
+    kinds = list(GUESS_MIX)
+    for _ in range(args.actions):
+        if args.think > 0:
+            await asyncio.sleep(rng.expovariate(1 / args.think))
+        command = rng.choices(commands, weights=COMMAND_MIX.values())[0]
+        started = time.perf_counter()
+        if command == 'guess':
+            kind = rng.choices(kinds, weights=GUESS_MIX.values())[0]
+            previous = team_guesses[team_id]
+            if kind == 'duplicate' and previous:
+                puzzle_id, guess = rng.choice(previous)
+            else:
+                puzzle_id = rng.randint(1, args.puzzles)
+                if kind == 'correct':
+                    guess = f'answer{puzzle_id}'
+                elif kind == 'partial':
+                    guess = f'keepgoing{puzzle_id}'
+                else:
+                    guess = f'wrong{rng.getrandbits(32)}'
+                previous.append((puzzle_id, guess))
+            await main.process_guess(ctx, str(puzzle_id), guess)
+            command = f'guess ({kind})'
+        elif command == '!guess':
+            await main.gather_guess.callback(ctx)
+        elif command == '!puzzles':
+            await main.display_puzzles.callback(ctx)
+        else:
+            await main.display_leaderboard.callback(ctx)
+        latencies.setdefault(command, []).append(time.perf_counter() - started)
+
+# Start the bot's in-memory state as setup_hook would, then run every solver at once:
+async def run_load_test(config, args, solvers):
+    pool_config = load_pool_config()
+    if args.pool_size:
+        pool_config['max_size'] = args.pool_size
+    await db.open_pool(config, pool_config)
+    await hunts.registry.load() # The default hunt, served from the public schema
+    await answers.index.load()
+    await leaderboard.board.load()
+    await solves.solved.load()
+    writebehind.writer.start(dict(load_write_behind_config(), enabled=args.write_behind))
+
+    rng = random.Random(args.seed)
+    team_guesses = {team_id: [] for team_id in range(1, args.teams + 1)}
+    latencies = {}
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(run_solver(solver, args, random.Random(rng.getrandbits(64)),
+            team_guesses, latencies) for solver in solvers))
+        # In write-behind mode, include the time to write out the queue:
+        if writebehind.writer.enabled:
+            await writebehind.writer.flush()
+        elapsed = time.perf_counter() - started
+    finally:
+        await writebehind.writer.stop()
+        await db.close_pool()
+    return latencies, elapsed
+
+### REPORTING ##################################################################
+
+def percentile(values, p):
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+def summarize(latencies, elapsed):
+    results = {}
+    for command, values in sorted(latencies.items()):
+        values = sorted(values)
+        results[command] = {
+            'count': len(values),
+            'per_second': len(values) / elapsed,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': values[-1] * 1000,
+            }
+    total = sum(len(values) for values in latencies.values())
+    results['all'] = {'count': total, 'per_second': total / elapsed, 'elapsed_s': elapsed}
+    return results
+
+def print_report(results, baseline=None):
+    print(f"{'command':<20} {'count':>7} {'per sec':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for command, row in results.items():
+        if command == 'all':
+            continue
+        line = (f"{command:<20} {row['count']:>7} {row['per_second']:>9.1f} {row['p50_ms']:>8.2f} "
+            f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}")
+        # Show the change in p95 latency against an earlier run:
+        if baseline and command in baseline and baseline[command]['p95_ms']:
+            change = row['p95_ms'] / baseline[command]['p95_ms'] - 1
+            line += f'  (p95 {change:+.0%} vs baseline)'
+        print(line)
+    total = results['all']
+    line = f"{total['count']} actions in {total['elapsed_s']:.2f} s ({total['per_second']:.1f}/s)"
+    if baseline and 'all' in baseline:
+        line += f", {total['per_second'] / baseline['all']['per_second'] - 1:+.0%} throughput vs baseline"
+    print(line)
+
+### RUN SCRIPT #################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate teams of solvers using the bot, without Discord.')
+    parser.add_argument('--teams', type=int, default=50)
+    parser.add_argument('--solvers', type=int, default=4, help='solvers per team')
+    parser.add_argument('--actions', type=int, default=50, help='commands run by each solver')
+    parser.add_argument('--puzzles', type=int, default=20)
+    parser.add_argument('--think', type=float, default=0.0, help='mean seconds between a solver\'s commands')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--write-behind', action='store_true', help='enable write-behind guess logging')
+    parser.add_argument('--pool-size', type=int, help='override [pool] max_size')
+    parser.add_argument('--database', default='hunt_bot_load_test', help='throwaway database to (re)create')
+    parser.add_argument('--keep', action='store_true', help='keep the throwaway database afterwards')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare against results saved earlier with --save')
+    args = parser.parse_args()
+
+    server_config = load_config()
+    if args.database == server_config.get('database'):
+        sys.exit('Refusing to overwrite the configured hunt database; choose another --database.')
+    config = dict(server_config, database=args.database)
+
+    create_database(server_config, args.database)
+    try:
+        solvers = populate_database(config, args)
+        latencies, elapsed = asyncio.run(run_load_test(config, args, solvers))
+    finally:
+        if not args.keep:
+            drop_database(server_config, args.database)
+
+    results = summarize(latencies, elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+    print(f'{args.teams} teams x {args.solvers} solvers x {args.actions} actions'
+        f' ({"write-behind" if args.write_behind else "direct"} guess logging)')
+    print_report(results, baseline)
+    print(f'Membership cache: {membership.cache.hits} hits, {membership.cache.misses} misses')
+    print(f'Team queues: {team_queue.queues.totals()}')
+    for lane, stats in db.lane_stats.items():
+        print(f'{lane} lane: {stats.as_dict()}')
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'args': vars(args), 'results': results}, file, indent=2)
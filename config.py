@@ -15,6 +15,106 @@ def load_config(filename='database.ini', section='postgresql'):
 
     return config
 
+# Settings of the optional [replica] section that are not connection parameters:
+REPLICA_DEFAULTS = {
+    'max_lag': 5.0, # Seconds the replica may trail the primary before dashboards read from the primary
+    'lag_check_interval': 1.0, # Seconds between checks of how far the replica trails
+}
+
+# Connection parameters for an optional read replica, from a [replica] section
+# (None if there is none). Parameters it leaves out (e.g. user, password) are
+# taken from the [postgresql] section, so often only host and port are needed.
+def load_replica_config(filename='database.ini', section='replica'):
+    parser = ConfigParser()
+    parser.read(filename)
+    if not parser.has_section(section):
+        return None
+
+    config = load_config(filename)
+    for param in parser.items(section):
+        if param[0] not in REPLICA_DEFAULTS:
+            config[param[0]] = param[1]
+    return config
+
+def load_replica_settings(filename='database.ini', section='replica'):
+    return load_settings(REPLICA_DEFAULTS, section, filename)
+
+# Connection pool settings, read from an optional [pool] section:
+POOL_DEFAULTS = {
+    'min_size': 2, # Connections opened at startup and kept warm
+    'max_size': 10, # Hard cap, to stay well below Postgres max_connections
+    'timeout': 30.0, # Seconds to wait for a free connection before failing
+    'max_idle': 600.0, # Seconds before an unused connection is closed
+    'max_lifetime': 3600.0, # Seconds before a connection is recycled
+    'check_interval': 60.0, # Seconds between health checks of idle connections
+    'reserved_for_guesses': 2, # Connections that dashboard reads may never occupy
+    'read_timeout': 5.0, # Statement timeout (seconds) for dashboard reads
+}
+
+# Read an optional section of settings, falling back to the defaults for any
+# missing setting (or a missing section) and converting to the defaults' types:
+def load_settings(defaults, section, filename='database.ini'):
+    parser = ConfigParser()
+    parser.read(filename)
+
+    config = dict(defaults)
+    if parser.has_section(section):
+        for key, default in defaults.items():
+            if not parser.has_option(section, key):
+                continue
+            if isinstance(default, bool):
+                config[key] = parser.getboolean(section, key)
+            else:
+                config[key] = type(default)(parser.get(section, key))
+
+    return config
+
+def load_pool_config(filename='database.ini', section='pool'):
+    return load_settings(POOL_DEFAULTS, section, filename)
+
+# Write-behind guess logging settings, read from an optional [write_behind] section:
+WRITE_BEHIND_DEFAULTS = {
+    'enabled': False, # Queue accepted guesses and write them in batches
+    'flush_interval_ms': 200, # Longest a guess waits in the queue
+    'max_batch_rows': 500, # Flush early once this many guesses are queued
+}
+
+def load_write_behind_config(filename='database.ini', section='write_behind'):
+    return load_settings(WRITE_BEHIND_DEFAULTS, section, filename)
+
+# Live leaderboard settings, read from an optional [live_leaderboard] section:
+LIVE_LEADERBOARD_DEFAULTS = {
+    'min_edit_interval': 10.0, # Seconds between edits of the live leaderboard message
+}
+
+def load_live_leaderboard_config(filename='database.ini', section='live_leaderboard'):
+    return load_settings(LIVE_LEADERBOARD_DEFAULTS, section, filename)
+
+# Metrics endpoint settings, read from an optional [metrics] section:
+METRICS_DEFAULTS = {
+    'enabled': False, # Serve Prometheus metrics over HTTP
+    'host': '127.0.0.1', # Keep the endpoint local unless deliberately exposed
+    'port': 9108,
+}
+
+def load_metrics_config(filename='database.ini', section='metrics'):
+    return load_settings(METRICS_DEFAULTS, section, filename)
+
+# Guesslog partition upkeep settings, read from an optional [partitions] section:
+PARTITIONS_DEFAULTS = {
+    'days_ahead': 3, # Days of guesslog partitions kept created in advance
+    'check_interval': 3600.0, # Seconds between checks for missing partitions
+}
+
+def load_partitions_config(filename='database.ini', section='partitions'):
+    return load_settings(PARTITIONS_DEFAULTS, section, filename)
+
 if __name__ == '__main__':
     config = load_config()
     print(config)
+    print(load_replica_config())
+    print(load_pool_config())
+    print(load_write_behind_config())
+    print(load_live_leaderboard_config())
+    print(load_metrics_config())
+    print(load_partitions_config())
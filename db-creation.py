@@ -1,43 +1,24 @@
+import sys
 import psycopg2
-from config import load_config
+from config import load_config, load_partitions_config
+import migrations
+import load_hunt
 
-def create_tables():
+# Drop every table, and every other hunt's schema (destructive; only used by --reset):
+def drop_tables():
     commands = (
-        """ DROP TABLE IF EXISTS puzzles, responses, guesslog, solvers, teams CASCADE """,
-        """ CREATE TABLE IF NOT EXISTS puzzles (
-            puzzle_id SERIAL PRIMARY KEY,
-            puzzle_name VARCHAR(255) NOT NULL,
-            puzzle_points INTEGER NOT NULL,
-            is_final_puzzle BOOLEAN NOT NULL) """,
-        """ CREATE TABLE IF NOT EXISTS responses (
-            response_id SERIAL PRIMARY KEY,
-            puzzle_id INTEGER NOT NULL,
-            guess VARCHAR(255),
-            is_answer BOOLEAN DEFAULT FALSE,
-            response VARCHAR(255) NOT NULL) """,
-        """ CREATE TABLE IF NOT EXISTS guesslog (
-            guess_id SERIAL PRIMARY KEY,
-            puzzle_id INTEGER NOT NULL,
-            team_id INTEGER NOT NULL,
-            guess VARCHAR(255),
-            guess_status VARCHAR(20),
-            guess_time TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP) """,
-        """ CREATE TABLE IF NOT EXISTS solvers (
-            solver_id SERIAL PRIMARY KEY,
-            discord_id VARCHAR(255) NOT NULL,
-            discord_name VARCHAR(255) NOT NULL,
-            team_id INTEGER NOT NULL,
-            is_captain BOOLEAN NOT NULL) """,
-        """ CREATE TABLE IF NOT EXISTS teams (
-            team_id SERIAL PRIMARY KEY,
-            team_name VARCHAR(255) NOT NULL,
-            team_token VARCHAR(20) NOT NULL,
-            num_guesses INTEGER DEFAULT 50,
-            score INTEGER DEFAULT 0,
-            is_hunt_solved BOOLEAN DEFAULT FALSE,
-            is_deleted BOOLEAN DEFAULT FALSE,
-            last_solve_time TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-            hunt_solve_time TIMESTAMP WITH TIME ZONE DEFAULT NULL)""")
+        """ DO $$
+            DECLARE
+                v_schema VARCHAR;
+            BEGIN
+                IF to_regclass('public.hunts') IS NOT NULL THEN
+                    FOR v_schema IN SELECT schema_name FROM public.hunts WHERE schema_name <> 'public' LOOP
+                        EXECUTE format('DROP SCHEMA IF EXISTS %I CASCADE', v_schema);
+                    END LOOP;
+                END IF;
+            END $$ """,
+        """ DROP TABLE IF EXISTS puzzles, responses, guesslog, team_solves, team_guesses, solvers, teams,
+            puzzle_stats, guesslog_archives, bot_settings, schema_migrations, hunts CASCADE """,)
     try:
         config = load_config()
         with psycopg2.connect(**config) as conn:
@@ -47,32 +28,72 @@ def create_tables():
     except (psycopg2.DatabaseError, Exception) as error:
         print(error)
 
-def populate_tables():
-    commands = (
-        """ INSERT INTO puzzles (puzzle_name, puzzle_points, is_final_puzzle)
-            VALUES ('Example Puzzle 1', 1, FALSE),
-                ('Example Puzzle 2', 1, FALSE),
-                ('Example Puzzle 3', 1, FALSE),
-                ('Example Meta', 1, TRUE) """,
-        """ INSERT INTO responses (puzzle_id, guess, is_answer, response)
-            VALUES (1, 'answer1', TRUE, 'Correct!'),
-                (1, 'keepgoing1', FALSE, 'Keep going!'),
-                (2, 'answer2', TRUE, 'Correct!'),
-                (2, 'keepgoing2', FALSE, 'Keep going!'),
-                (3, 'answer3', TRUE, 'Correct!'),
-                (3, 'keepgoing3', FALSE, 'Keep going!'),
-                (4, 'metaanswer', TRUE, 'Correct! You've finished the hunt!'),
-                (4, 'metakeepgoing', FALSE, 'Keep going!')"""
-            )
+# Create the schema, or bring an existing database up to date, by applying any
+# pending migrations (see migrations.py) to every hunt. Existing data is never dropped.
+    # Each hunt's guesslog partitions for the next few days are also created (the
+    # running bot keeps these topped up itself).
+def create_tables():
     try:
         config = load_config()
         with psycopg2.connect(**config) as conn:
-            with conn.cursor() as cur:
-                for command in commands:
-                    cur.execute(command)
+            migrations.migrate_all(conn)
+            for schema in migrations.hunt_schemas(conn):
+                migrations.use_schema(conn, schema)
+                with conn.cursor() as cur:
+                    cur.execute("""SELECT create_guesslog_partitions((CURRENT_TIMESTAMP AT TIME ZONE 'UTC')::DATE,
+                        (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')::DATE + %s)""", (load_partitions_config()['days_ahead'],))
+                conn.commit()
     except (psycopg2.DatabaseError, Exception) as error:
         print(error)
 
+# EXPLAIN the bot's hot queries, checking that each one can use its index:
+def check_query_plans():
+    try:
+        config = load_config()
+        with psycopg2.connect(**config) as conn:
+            passed = True
+            for schema in migrations.hunt_schemas(conn):
+                print(f'{schema}:')
+                migrations.use_schema(conn, schema)
+                passed = migrations.check_query_plans(conn) and passed
+            return passed
+    except (psycopg2.DatabaseError, Exception) as error:
+        print(error)
+        return False
+
+def rebuild_puzzle_stats():
+    try:
+        config = load_config()
+        with psycopg2.connect(**config) as conn:
+            for schema in migrations.hunt_schemas(conn):
+                migrations.use_schema(conn, schema)
+                with conn.cursor() as cur:
+                    cur.execute("SELECT rebuild_puzzle_stats()")
+                    num_puzzles = cur.fetchone()[0]
+                conn.commit()
+                print(f'Rebuilt solve/guess counters for {num_puzzles} puzzles in {schema}.')
+    except (psycopg2.DatabaseError, Exception) as error:
+        print(error)
+
+# Load the example hunt in examples/ (see load_hunt.py for loading real content):
+def populate_tables():
+    load_hunt.main(['examples'])
+
 if __name__ == '__main__':
-    create_tables()
-    populate_tables()
+    # Use --reset to drop everything and start over with the example puzzles:
+    if '--reset' in sys.argv:
+        drop_tables()
+        create_tables()
+        populate_tables()
+    # Use --rebuild-stats to recompute the per-puzzle counters from the solves and guesses:
+    elif '--rebuild-stats' in sys.argv:
+        rebuild_puzzle_stats()
+    # Use --check-plans to confirm that the hot queries use index scans:
+    elif '--check-plans' in sys.argv:
+        if not check_query_plans():
+            sys.exit(1)
+    # Otherwise apply pending migrations, adding the example puzzles if asked:
+    else:
+        create_tables()
+        if '--examples' in sys.argv:
+            populate_tables()
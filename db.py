@@ -0,0 +1,415 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+import collections
+import time # To measure time spent waiting on and using connections
+import weakref
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar # The hunt (schema) each command is served from
+from functools import lru_cache
+
+import psycopg
+from psycopg import sql as pgsql # To quote identifiers safely
+from psycopg.rows import dict_row # To read DB queries as dictionaries
+from psycopg_pool import AsyncConnectionPool # Shared pool of async connections
+from config import load_config, load_pool_config, load_replica_config, load_replica_settings
+
+### CONNECTION POOL ############################################################
+
+# Each hunt's tables live in their own Postgres schema (see hunts.py). Every hunt
+# shares one pool, so the bot never holds more than max_size connections however
+# many hunts it serves; each borrow points its connection at the hunt's schema.
+    # search_path is set for the session and only changed when a connection last
+    # served another hunt, so a single hunt pays no extra round trip per borrow.
+DEFAULT_SCHEMA = 'public'
+current_schema = ContextVar('current_schema', default=DEFAULT_SCHEMA)
+
+pool = None # Shared by every command handler, for every hunt
+schemas = set() # The hunts opened with open_pool
+connection_schemas = weakref.WeakKeyDictionary() # connection -> schema on its search_path
+health_check_task = None
+listener_tasks = []
+
+# Translate the psycopg2-style config into libpq connection parameters:
+def connection_kwargs(config):
+    kwargs = dict(config)
+    if 'database' in kwargs: # libpq spells this parameter 'dbname'
+        kwargs['dbname'] = kwargs.pop('database')
+    return kwargs
+
+# A (not yet opened) pool of connections to one server:
+def make_pool(config, pool_config, name):
+    return AsyncConnectionPool(
+        kwargs=connection_kwargs(config),
+        min_size=pool_config['min_size'],
+        max_size=pool_config['max_size'],
+        timeout=pool_config['timeout'],
+        max_idle=pool_config['max_idle'],
+        max_lifetime=pool_config['max_lifetime'],
+        name=name,
+        open=False)
+
+# Open the shared pool (once, at startup) and begin periodic health checks, along
+# with the read replica pool if a [replica] section is configured; then serve the
+# given hunt's schema from it:
+    # (config/pool_config default to database.ini; benchmarks pass their own, and
+    # then get no replica unless they pass replica_config too.)
+async def open_pool(config=None, pool_config=None, schema=DEFAULT_SCHEMA, replica_config=None):
+    global pool, health_check_task, read_timeout
+    if pool is None:
+        if config is None:
+            config = load_config()
+            replica_config = replica_config or load_replica_config()
+        pool_config = pool_config or load_pool_config()
+        new_pool = make_pool(config, pool_config, 'hunt-bot')
+        # Fail fast at startup if the database cannot be reached:
+        await new_pool.open(wait=True, timeout=pool_config['timeout'])
+        pool = new_pool
+        health_check_task = asyncio.create_task(check_pool_health(pool_config['check_interval']))
+        if replica_config is not None:
+            await open_replica_pool(replica_config, pool_config)
+
+        # Size the lanes so that dashboard reads always leave connections for guesses:
+        max_size = pool_config['max_size']
+        read_slots = max(1, max_size - pool_config['reserved_for_guesses'])
+        lane_slots[WRITE] = asyncio.Semaphore(max_size)
+        lane_slots[READ] = asyncio.Semaphore(read_slots)
+        read_timeout = pool_config['read_timeout']
+    schemas.add(schema)
+    return pool
+
+# Periodically test idle connections, discarding any that have gone bad:
+    # (Checking in the background keeps a round trip off every borrow.)
+async def check_pool_health(interval):
+    while True:
+        await asyncio.sleep(interval)
+        for name, source in (('primary', pool), ('replica', replica)):
+            if source is None:
+                continue
+            try:
+                await source.check()
+            except Exception as error:
+                print(f'Database health check failed ({name}): {error}')
+
+# Stop serving one hunt's schema, or (by default) stop the health checks and
+# listeners and close the pools:
+async def close_pool(schema=None):
+    global pool, replica, health_check_task, replica_task
+    if schema is not None:
+        schemas.discard(schema)
+        return
+    schemas.clear()
+    for task in [health_check_task, replica_task] + listener_tasks:
+        if task is not None:
+            task.cancel()
+    health_check_task = replica_task = None
+    listener_tasks.clear()
+    for source in (pool, replica):
+        if source is not None:
+            await source.close()
+    pool = replica = None
+
+# The shared pool, if it is serving the hunt being served (None otherwise):
+def current_pool():
+    return pool if current_schema.get() in schemas else None
+
+# Borrow a connection (from the primary's pool by default) with the current hunt's
+# schema as its search_path; commits when the block exits cleanly, rolls back on error:
+@asynccontextmanager
+async def connection(source=None):
+    schema = current_schema.get()
+    source = source or pool
+    if source is None or schema not in schemas:
+        raise RuntimeError(f'The database pool for schema "{schema}" has not been opened.')
+    async with source.connection() as conn:
+        try:
+            if connection_schemas.get(conn) != schema:
+                await conn.execute("SELECT set_config('search_path', %s, false)", (schema,))
+                connection_schemas[conn] = schema
+            yield conn
+        except BaseException:
+            # The rollback also undoes a search_path set in this transaction:
+            connection_schemas.pop(conn, None)
+            raise
+
+### READ REPLICA ###############################################################
+
+# Dashboard commands (see REPLICA_COMMANDS in main.py) may read from an optional
+# streaming replica, so that their queries do not compete with guesses on the
+# primary. Only READ-lane cursors opened inside replica_reads() use it, and only
+# while it trails the primary by at most max_lag seconds; everything else (guesses,
+# team changes, and loading the bot's in-memory state) always uses the primary.
+    # Staleness is measured by sampling the primary's WAL position every
+    # lag_check_interval seconds: once the replica has replayed past a sample,
+    # everything committed before that sample was taken is on the replica.
+replica = None # Pool on the replica, shared by every hunt like the primary's
+replica_task = None
+replica_max_lag = None
+replica_caught_up_to = None # time.monotonic() before which every commit is on the replica
+read_from_replica = ContextVar('read_from_replica', default=False)
+recent_writes = {} # (schema, key) -> time.monotonic() of that key's (e.g. team's) last write
+
+class ReplicaStats:
+    def __init__(self):
+        self.reads = 0 # READ-lane cursors served by the replica
+        self.stale_reads = 0 # ... sent to the primary as the replica was too far behind
+        self.own_writes = 0 # ... sent to the primary so a team sees its own writes
+        self.check_failures = 0 # Failed staleness checks
+
+    def as_dict(self):
+        return dict(vars(self))
+
+replica_stats = ReplicaStats()
+
+async def open_replica_pool(replica_config, pool_config):
+    global replica, replica_task, replica_max_lag
+    settings = load_replica_settings()
+    replica_max_lag = settings['max_lag']
+    replica = make_pool(replica_config, pool_config, 'hunt-bot-replica')
+    # The replica is optional: open in the background, reading from the primary
+    # until it is reachable and caught up.
+    await replica.open(wait=False)
+    replica_task = asyncio.create_task(check_replica_lag(settings['lag_check_interval']))
+
+# Read the dashboard queries in the block from the replica, while it is fresh enough:
+@contextmanager
+def replica_reads():
+    token = read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        read_from_replica.reset(token)
+
+# Seconds of commits the replica may be missing (None if it has never caught up):
+def replica_staleness():
+    if replica_caught_up_to is None:
+        return None
+    return time.monotonic() - replica_caught_up_to
+
+# Record that key (e.g. a team_id) has just written to the primary:
+def note_write(key):
+    recent_writes[(current_schema.get(), key)] = time.monotonic()
+
+# Read-your-writes: send the rest of this command's reads to the primary if key
+# wrote something the replica may not have replayed yet:
+def read_own_writes(key):
+    written = recent_writes.get((current_schema.get(), key))
+    if written is None or not read_from_replica.get():
+        return
+    if replica_caught_up_to is None or written >= replica_caught_up_to:
+        replica_stats.own_writes += 1
+        read_from_replica.set(False)
+
+# The replica pool a READ-lane cursor should use now (None for the primary):
+def replica_pool():
+    if replica is None or not read_from_replica.get():
+        return None
+    staleness = replica_staleness()
+    if staleness is None or staleness > replica_max_lag:
+        replica_stats.stale_reads += 1
+        return None
+    replica_stats.reads += 1
+    return replica
+
+# A pg_lsn ('16/B374D848') as a comparable integer:
+def parse_lsn(lsn):
+    high, low = lsn.split('/')
+    return (int(high, 16) << 32) | int(low, 16)
+
+# Every interval seconds, sample the primary's WAL position and see how far the
+# replica has replayed:
+async def check_replica_lag(interval):
+    global replica_caught_up_to
+    samples = collections.deque(maxlen=1000) # (time.monotonic(), primary WAL position), oldest first
+    healthy = True
+    while True:
+        try:
+            sampled = time.monotonic()
+            async with pool.connection() as conn:
+                cur = await conn.execute("SELECT pg_current_wal_lsn()::TEXT")
+                samples.append((sampled, parse_lsn((await cur.fetchone())[0])))
+            async with replica.connection() as conn:
+                cur = await conn.execute("SELECT pg_last_wal_replay_lsn()::TEXT")
+                replayed = (await cur.fetchone())[0]
+            if replayed is None:
+                raise RuntimeError('the [replica] server is not a standby of the primary')
+            replayed = parse_lsn(replayed)
+            while len(samples) > 1 and samples[1][1] <= replayed:
+                samples.popleft()
+            if samples[0][1] <= replayed:
+                replica_caught_up_to = max(replica_caught_up_to or 0.0, samples[0][0])
+                # Writes from before that point are visible on the replica:
+                for key, written in list(recent_writes.items()):
+                    if written < replica_caught_up_to:
+                        del recent_writes[key]
+            if not healthy:
+                print('Read replica check succeeded again.')
+            healthy = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            replica_stats.check_failures += 1
+            if healthy:
+                print(f'Read replica check failed; dashboards will read from the primary: {error}')
+            healthy = False
+        await asyncio.sleep(interval)
+
+### LANES ######################################################################
+
+# Guess processing and team changes run in the write lane; dashboards in the read lane.
+    # The read lane holds fewer slots than the pool has connections, so a burst of
+    # slow !leaderboard/!puzzles queries can never starve guesses of a connection.
+WRITE = 'write'
+READ = 'read'
+lane_slots = {} # lane -> semaphore, shared by every hunt
+read_timeout = None
+
+# Running counters describing each lane's load:
+class LaneStats:
+    def __init__(self):
+        self.borrows = 0 # Connections handed out
+        self.waiting = 0 # Requests currently queued for a slot
+        self.in_flight = 0 # Connections currently in use
+        self.max_in_flight = 0 # High-water mark of concurrent use
+        self.wait_time = 0.0 # Total seconds spent waiting for a connection
+        self.busy_time = 0.0 # Total seconds connections were held
+        self.errors = 0 # Blocks that exited with an exception
+
+    def as_dict(self):
+        return dict(vars(self))
+
+lane_stats = {WRITE: LaneStats(), READ: LaneStats()}
+
+# Borrow a connection in the given lane and open a dictionary cursor on it:
+    # Inside replica_reads(), a READ-lane cursor comes from the replica while it is
+    # fresh enough; those need no lane slot, since they take no primary connection.
+@asynccontextmanager
+async def cursor(lane=WRITE):
+    if current_pool() is None:
+        raise RuntimeError(f'The database pool for schema "{current_schema.get()}" has not been opened.')
+    source = replica_pool() if lane == READ else None
+    stats = lane_stats[lane]
+    requested = time.perf_counter()
+    acquired = None
+    stats.waiting += 1
+    try:
+        async with (lane_slots[lane] if source is None else nullcontext()):
+            async with connection(source) as conn:
+                acquired = time.perf_counter()
+                stats.waiting -= 1
+                stats.borrows += 1
+                stats.in_flight += 1
+                stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+                stats.wait_time += acquired - requested
+                try:
+                    if lane == READ: # Bound how long a dashboard query may run
+                        await conn.execute("SELECT set_config('statement_timeout', %s, true)",
+                            (str(int(read_timeout * 1000)),))
+                    async with TimedCursor(conn, row_factory=dict_row) as cur:
+                        yield cur
+                except Exception:
+                    stats.errors += 1
+                    raise
+                finally:
+                    stats.in_flight -= 1
+                    stats.busy_time += time.perf_counter() - acquired
+    finally:
+        if acquired is None: # Gave up (or failed) before obtaining a connection
+            stats.waiting -= 1
+
+### STATEMENT TIMING ###########################################################
+
+# Running counters for one SQL statement:
+class StatementStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0 # Total seconds spent executing (including the round trip)
+        self.max_time = 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+statement_stats = {} # statement name -> StatementStats
+
+# Identify a statement by its whitespace-collapsed text (queries are parameterized,
+# so the text is the same for every call):
+@lru_cache(maxsize=1024)
+def statement_name(query):
+    return ' '.join(str(query).split())[:100]
+
+# Cursor that times every execute()/executemany() into statement_stats:
+class TimedCursor(psycopg.AsyncCursor):
+    async def execute(self, query, *args, **kwargs):
+        async with timed_statement(query):
+            return await super().execute(query, *args, **kwargs)
+
+    async def executemany(self, query, *args, **kwargs):
+        async with timed_statement(query):
+            return await super().executemany(query, *args, **kwargs)
+
+@asynccontextmanager
+async def timed_statement(query):
+    name = statement_name(query)
+    stats = statement_stats.get(name)
+    if stats is None:
+        stats = statement_stats[name] = StatementStats()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stats.errors += 1
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.calls += 1
+        stats.total_time += elapsed
+        stats.max_time = max(stats.max_time, elapsed)
+
+### QUERY HELPERS ##############################################################
+
+# Run a query and return its first row (or None):
+async def fetchone(sql, data=None, lane=WRITE):
+    async with cursor(lane) as cur:
+        await cur.execute(sql, data)
+        return await cur.fetchone()
+
+# Run a query and return all of its rows:
+async def fetchall(sql, data=None, lane=WRITE):
+    async with cursor(lane) as cur:
+        await cur.execute(sql, data)
+        return await cur.fetchall()
+
+# Run a statement that returns no rows:
+async def execute(sql, data=None, lane=WRITE):
+    async with cursor(lane) as cur:
+        await cur.execute(sql, data)
+
+### NOTIFICATIONS ##############################################################
+
+# Start a background task that LISTENs on a Postgres channel:
+def start_listener(channel, callback):
+    task = asyncio.create_task(listen(channel, callback))
+    listener_tasks.append(task)
+    return task
+
+# Hold a dedicated (unpooled) connection open, calling callback(payload) per NOTIFY.
+    # Notifications sent while disconnected are lost, so after a reconnect the
+    # callback is invoked with None to let the listener resynchronize.
+async def listen(channel, callback, retry_delay=5.0):
+    kwargs = connection_kwargs(load_config())
+    reconnecting = False
+    while True:
+        try:
+            conn = await psycopg.AsyncConnection.connect(autocommit=True, **kwargs)
+            async with conn:
+                await conn.execute(pgsql.SQL('LISTEN {}').format(pgsql.Identifier(channel)))
+                if reconnecting:
+                    callback(None)
+                async for notify in conn.notifies():
+                    callback(notify.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            print(f'Lost the LISTEN connection on "{channel}": {error}')
+        reconnecting = True
+        await asyncio.sleep(retry_delay)
@@ -0,0 +1,160 @@
+### LOAD LIBRARIES #############################################################
+import argparse
+import datetime
+import sys
+import time
+
+import psycopg2
+import manage_hunts # Connects to the chosen hunt's tables
+
+try:
+    import pyarrow # Optional: only needed for Parquet and Arrow IPC output
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Export the guesslog, joined with team and puzzle names, for post-hunt analysis.
+# Rows are streamed from the server (COPY for CSV, a named cursor for Parquet and
+# Arrow), so memory use stays constant however many guesses there are:
+    # python export_guesslog.py guesses.csv
+    # python export_guesslog.py guesses.parquet --since 2024-04-12T18:00 --team 3 --team 7
+
+### QUERY ######################################################################
+
+EXPORT_COLUMNS = """guesslog.guess_id, guesslog.guess_time,
+    guesslog.team_id, teams.team_name,
+    guesslog.puzzle_id, puzzles.puzzle_name,
+    guesslog.guess, guesslog.guess_status"""
+
+# Build the export query for the given filters, as (sql, data):
+def export_query(since=None, until=None, team_ids=None, puzzle_ids=None):
+    conditions = []
+    data = []
+    if since is not None:
+        conditions.append('guesslog.guess_time >= %s')
+        data.append(since)
+    if until is not None:
+        conditions.append('guesslog.guess_time < %s')
+        data.append(until)
+    if team_ids:
+        conditions.append('guesslog.team_id = ANY(%s)')
+        data.append(list(team_ids))
+    if puzzle_ids:
+        conditions.append('guesslog.puzzle_id = ANY(%s)')
+        data.append(list(puzzle_ids))
+    sql = f"""SELECT {EXPORT_COLUMNS}
+        FROM guesslog
+        JOIN teams ON guesslog.team_id = teams.team_id
+        JOIN puzzles ON guesslog.puzzle_id = puzzles.puzzle_id
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY guesslog.guess_id ASC"""
+    return sql, tuple(data)
+
+### WRITERS ####################################################################
+
+# CSV: let the server format the rows with COPY ... TO STDOUT.
+    # COPY takes no parameters, so the filters are bound client-side with mogrify.
+def export_csv(conn, filename, sql, data):
+    with conn.cursor() as cur:
+        query = cur.mogrify(sql, data).decode()
+        with open(filename, 'w', newline='', encoding='utf-8') as file:
+            cur.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)', file)
+        return cur.rowcount # Rows copied, from the COPY command tag
+
+def arrow_schema():
+    return pyarrow.schema([
+        ('guess_id', pyarrow.int32()),
+        ('guess_time', pyarrow.timestamp('us', tz='UTC')),
+        ('team_id', pyarrow.int32()),
+        ('team_name', pyarrow.string()),
+        ('puzzle_id', pyarrow.int32()),
+        ('puzzle_name', pyarrow.string()),
+        ('guess', pyarrow.string()),
+        ('guess_status', pyarrow.string()),
+        ])
+
+# Parquet/Arrow IPC: fetch batches from a named (server-side) cursor and append
+# each batch to the file as it arrives.
+def export_arrow(conn, filename, sql, data, file_format, batch_size):
+    if pyarrow is None:
+        raise RuntimeError('Parquet and Arrow output require pyarrow (pip install pyarrow).')
+    schema = arrow_schema()
+    if file_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(filename, schema)
+    else:
+        writer = pyarrow.ipc.new_file(filename, schema)
+    num_rows = 0
+    try:
+        with conn.cursor(name='guesslog_export') as cur:
+            cur.itersize = batch_size
+            cur.execute(sql, data)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                batch = pyarrow.RecordBatch.from_arrays(
+                    [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+                    schema=schema)
+                if file_format == 'parquet':
+                    writer.write_batch(batch)
+                else:
+                    writer.write(batch)
+                num_rows += len(rows)
+    finally:
+        writer.close()
+    return num_rows
+
+### RUN SCRIPT #################################################################
+
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+def parse_time(value):
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None: # Treat naive times as UTC
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the guesslog with team and puzzle names.')
+    parser.add_argument('output', help='output file (.csv, .parquet, or .arrow/.feather for Arrow IPC)')
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())), help='override the format implied by the file name')
+    parser.add_argument('--since', type=parse_time, help='only guesses at or after this ISO time (UTC unless given)')
+    parser.add_argument('--until', type=parse_time, help='only guesses before this ISO time')
+    parser.add_argument('--team', type=int, action='append', help='only this team_id (repeatable)')
+    parser.add_argument('--puzzle', type=int, action='append', help='only this puzzle_id (repeatable)')
+    parser.add_argument('--batch-size', type=int, default=50000, help='rows fetched per round trip (Parquet/Arrow)')
+    parser.add_argument('--hunt', help='the hunt to use, by name (default: the default hunt)')
+    args = parser.parse_args(argv)
+
+    file_format = args.format
+    if file_format is None:
+        file_format = next((fmt for ext, fmt in FORMATS.items() if args.output.lower().endswith(ext)), None)
+    if file_format is None:
+        parser.error('cannot tell the format from the file name; use --format')
+
+    sql, data = export_query(args.since, args.until, args.team, args.puzzle)
+    started = time.perf_counter()
+    try:
+        conn = manage_hunts.connect(args.hunt)
+    except manage_hunts.HuntError as error:
+        print(error)
+        return 1
+    try:
+        # One read-only snapshot, so the export is consistent while guesses keep arriving:
+        conn.set_session(readonly=True, isolation_level='REPEATABLE READ')
+        if file_format == 'csv':
+            num_rows = export_csv(conn, args.output, sql, data)
+        else:
+            num_rows = export_arrow(conn, args.output, sql, data, file_format, args.batch_size)
+    except (psycopg2.DatabaseError, RuntimeError) as error:
+        print(f'Export failed: {error}')
+        return 1
+    finally:
+        conn.close()
+    print(f'Exported {num_rows} guesses to {args.output} in {time.perf_counter() - started:.2f} s.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+### LOAD LIBRARIES #############################################################
+from contextlib import contextmanager
+
+import db
+
+# One bot can serve several hunts at once (e.g. a main hunt and a practice hunt in
+# different servers). Each hunt keeps its own copy of every table in its own
+# Postgres schema, listed in public.hunts; the original tables in the public schema
+# are the "default" hunt. See manage_hunts.py for creating hunts.
+
+# Postgres channel notified whenever public.hunts changes:
+HUNTS_CHANNEL = 'hunts'
+
+### HUNT CONTEXT ###############################################################
+
+# Serve a block of code (a command, an interaction, a background task started
+# inside it) from the given hunt's schema and in-memory state:
+@contextmanager
+def use(schema):
+    token = db.current_schema.set(schema)
+    try:
+        yield
+    finally:
+        db.current_schema.reset(token)
+
+per_hunt_state = [] # Every PerHunt, so a removed hunt's state can be dropped
+
+# Stands in for a module-level singleton (e.g. answers.index), forwarding to a
+# separate instance for each hunt, chosen by the hunt currently being served.
+    # Callers keep using the singleton as before; instances are created on first use.
+class PerHunt:
+    def __init__(self, factory):
+        self._factory = factory
+        self._instances = {} # schema -> instance
+        per_hunt_state.append(self)
+
+    def _instance(self):
+        schema = db.current_schema.get()
+        instance = self._instances.get(schema)
+        if instance is None:
+            instance = self._instances[schema] = self._factory()
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self._instance(), name)
+
+# Every hunt's instance of a PerHunt singleton, as (schema, instance) pairs:
+def each(singleton):
+    return list(singleton._instances.items())
+
+# Drop a hunt's in-memory state (once the hunt is deactivated):
+def forget(schema):
+    for singleton in per_hunt_state:
+        singleton._instances.pop(schema, None)
+
+### HUNT REGISTRY ##############################################################
+
+# The active hunts, and which hunt each server (and each direct message) belongs to:
+class HuntRegistry:
+    def __init__(self):
+        self.hunts = {} # schema_name -> hunt row
+        self.guilds = {} # guild_id -> schema_name
+        self.choices = {} # discord user id -> schema_name chosen with !hunt
+        self.default_guild_name = None # DISCORD_GUILD: the default hunt's server, if unregistered
+
+    # Read public.hunts, returning the hunts (added, removed) since the last load:
+        # Removed hunts (a list of schemas) leave the registry at once. Added hunts
+        # (schema -> hunt row) are only served once add() records them, after they
+        # have started, so a hunt that fails to start is offered again by the next load.
+    async def load(self, default_guild_name=None):
+        self.default_guild_name = default_guild_name
+        sql = """SELECT hunt_id, hunt_name, schema_name, guild_id FROM public.hunts
+            WHERE is_active = TRUE ORDER BY hunt_id ASC"""
+        with use(db.DEFAULT_SCHEMA):
+            rows = await db.fetchall(sql, lane=db.READ)
+        hunts = {row['schema_name']: row for row in rows}
+        added = {schema: row for schema, row in hunts.items() if schema not in self.hunts}
+        removed = [schema for schema in self.hunts if schema not in hunts]
+        self.hunts = {schema: row for schema, row in hunts.items() if schema in self.hunts}
+        self.index_guilds()
+        return added, removed
+
+    # Serve a hunt (once it has started):
+    def add(self, hunt):
+        self.hunts[hunt['schema_name']] = hunt
+        self.index_guilds()
+
+    def index_guilds(self):
+        self.guilds = {hunt['guild_id']: schema for schema, hunt in self.hunts.items()
+            if hunt['guild_id'] is not None}
+
+    # The hunt row being served (None outside any registered hunt):
+    def current(self):
+        return self.hunts.get(db.current_schema.get())
+
+    def schema_for_id(self, hunt_id):
+        return next((schema for schema, hunt in self.hunts.items() if hunt['hunt_id'] == hunt_id), None)
+
+    def find(self, name):
+        return next((schema for schema, hunt in self.hunts.items()
+            if hunt['hunt_name'].lower() == name.lower()), None)
+
+    # The hunt held in a server (the default hunt also claims the DISCORD_GUILD server):
+    def for_guild(self, guild):
+        schema = self.guilds.get(guild.id)
+        if schema is None and guild.name == self.default_guild_name:
+            default = self.hunts.get(db.DEFAULT_SCHEMA)
+            if default is not None and default['guild_id'] is None:
+                schema = db.DEFAULT_SCHEMA
+        return schema
+
+    # The hunts a user can reach in direct messages (those of the servers they share with the bot):
+    def for_user(self, user):
+        if len(self.hunts) == 1:
+            return list(self.hunts)
+        schemas = {self.for_guild(guild) for guild in user.mutual_guilds}
+        return [schema for schema in self.hunts if schema in schemas]
+
+    # Route a command: by server, or in DMs by the user's choice or their only hunt.
+        # Returns None if the hunt cannot be told (e.g. the user is in two hunts'
+        # servers and has not chosen one with !hunt).
+    def for_context(self, ctx):
+        if ctx.guild is not None:
+            return self.for_guild(ctx.guild)
+        choice = self.choices.get(ctx.author.id)
+        if choice in self.hunts:
+            return choice
+        schemas = self.for_user(ctx.author)
+        return schemas[0] if len(schemas) == 1 else None
+
+registry = HuntRegistry()
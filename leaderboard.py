@@ -0,0 +1,107 @@
+### LOAD LIBRARIES #############################################################
+import datetime
+from bisect import bisect_left, insort # Binary search over the sorted ranking
+
+import db
+import hunts
+
+### RANKED LEADERBOARD #########################################################
+
+# Sorts before every real timestamp (used for teams that have finished the hunt):
+EARLIEST = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+# Teams per page of !leaderboard. Team names are capped at 30 characters, so a
+# row is at most ~120 characters and a page stays well inside Discord's
+# 2,000-character message limit:
+PAGE_SIZE = 10
+
+# Columns of the teams table that the leaderboard keeps in memory:
+TEAM_COLUMNS = 'team_id, team_name, score, is_hunt_solved, last_solve_time, hunt_solve_time'
+
+# Ranking key matching the original ORDER BY:
+    # hunt_solve_time ASC (NULLs last), score DESC, last_solve_time ASC; team_id breaks ties.
+def rank_key(team):
+    hunt_solve_time = team['hunt_solve_time']
+    return (hunt_solve_time is None, hunt_solve_time or EARLIEST,
+        -team['score'], team['last_solve_time'], team['team_id'])
+
+# An in-process copy of the standings, kept sorted as teams solve puzzles.
+    # Updates locate their position by binary search, so a solve costs O(log n)
+    # comparisons (plus a memmove of the key list) rather than a full re-sort.
+    # Rendered pages are cached until the next change to the ranking.
+class Leaderboard:
+    def __init__(self):
+        self.keys = [] # Sorted ranking keys
+        self.teams = {} # team_id -> team row
+        self.rendered = {} # page number -> rendered table
+        self.version = 0 # Incremented whenever the ranking changes
+
+    # Load every undeleted team from the database, replacing the current standings:
+    async def load(self):
+        sql = f"""SELECT {TEAM_COLUMNS} FROM teams WHERE is_deleted = FALSE"""
+        rows = await db.fetchall(sql, lane=db.READ)
+        self.teams = {row['team_id']: row for row in rows}
+        self.keys = sorted(rank_key(row) for row in rows)
+        self.changed()
+        return len(rows)
+
+    # Add a team, or move an existing team to its new position:
+    def update(self, team):
+        team = dict(team)
+        old = self.teams.get(team['team_id'])
+        if old is not None:
+            old_key = rank_key(old)
+            new_key = rank_key(team)
+            if old_key == new_key and old['team_name'] == team['team_name']:
+                return
+            del self.keys[bisect_left(self.keys, old_key)]
+        self.teams[team['team_id']] = team
+        insort(self.keys, rank_key(team))
+        self.changed()
+
+    # Drop a (deleted) team from the standings:
+    def remove(self, team_id):
+        old = self.teams.pop(team_id, None)
+        if old is not None:
+            del self.keys[bisect_left(self.keys, rank_key(old))]
+            self.changed()
+
+    # Discard rendered pages and note that the ranking has changed:
+    def changed(self):
+        self.rendered.clear()
+        self.version += 1
+
+    # Iterate over team rows from first place to last:
+    def ranked(self):
+        return [self.teams[key[-1]] for key in self.keys]
+
+    # Whether any team has finished the hunt (finished teams always rank first):
+    def is_hunt_won(self):
+        return bool(self.keys) and not self.keys[0][0]
+
+    def num_pages(self):
+        return max(1, -(-len(self.keys) // PAGE_SIZE))
+
+    # A team's 1-based place in the standings, or None if it is not ranked:
+    def place(self, team_id):
+        team = self.teams.get(team_id)
+        if team is None:
+            return None
+        return bisect_left(self.keys, rank_key(team)) + 1
+
+    # The page (1-based) on which a given place appears:
+    def page_of(self, place):
+        return (place - 1) // PAGE_SIZE + 1
+
+    # Return one page of the rendered standings, rebuilding it only if the ranking
+    # has changed. Only that page's rows are formatted, however many teams there are.
+        # build_table(teams, first_place, show_finish) renders a slice of the ranking.
+    def render_page(self, number, build_table):
+        number = min(max(number, 1), self.num_pages())
+        if number not in self.rendered:
+            start = (number - 1) * PAGE_SIZE
+            teams = [self.teams[key[-1]] for key in self.keys[start:start + PAGE_SIZE]]
+            self.rendered[number] = build_table(teams, start + 1, self.is_hunt_won())
+        return number, self.rendered[number]
+
+board = hunts.PerHunt(Leaderboard)
@@ -0,0 +1,87 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+
+import discord
+
+import db
+import hunts
+import leaderboard
+from config import load_live_leaderboard_config
+
+### LIVE LEADERBOARD MESSAGE ###################################################
+
+# The bot_settings row remembering the live message, as "<channel_id>:<message_id>":
+SETTING_NAME = 'live_leaderboard'
+
+# A single (pinned) message in a hunt channel that the bot edits in place as the
+# standings change, so solvers can watch it rather than each running !leaderboard.
+    # Changes are coalesced: the message is re-rendered at most once every
+    # min_edit_interval seconds however many solves land in between, which keeps
+    # edits far below Discord's rate limits (discord.py also waits out any 429).
+class LiveLeaderboard:
+    def __init__(self):
+        self.channel_id = None
+        self.message_id = None
+        self.min_edit_interval = 10.0
+        self.task = None
+        self.shown_version = None # leaderboard.board.version currently displayed
+        # Metrics:
+        self.edits = 0
+        self.edit_failures = 0
+
+    # Restore the live message (if any) from the database and start the edit loop.
+        # render() returns the message content for the current standings.
+    async def start(self, bot, render):
+        self.min_edit_interval = load_live_leaderboard_config()['min_edit_interval']
+        sql = """SELECT setting_value FROM bot_settings WHERE setting_name = %s"""
+        data = (SETTING_NAME,)
+        row = await db.fetchone(sql, data, lane=db.READ)
+        if row is not None:
+            channel_id, message_id = row['setting_value'].split(':')
+            self.channel_id, self.message_id = int(channel_id), int(message_id)
+        self.task = asyncio.create_task(self.run(bot, render))
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    # Make a newly posted message the live leaderboard, remembering it across restarts:
+    async def attach(self, channel_id, message_id):
+        sql = """INSERT INTO bot_settings (setting_name, setting_value) VALUES (%s, %s)
+            ON CONFLICT (setting_name) DO UPDATE SET setting_value = EXCLUDED.setting_value"""
+        data = (SETTING_NAME, f'{channel_id}:{message_id}')
+        await db.execute(sql, data)
+        self.channel_id, self.message_id = channel_id, message_id
+        self.shown_version = leaderboard.board.version
+
+    # Stop updating the live message:
+    async def detach(self):
+        self.channel_id, self.message_id = None, None
+        sql = """DELETE FROM bot_settings WHERE setting_name = %s"""
+        data = (SETTING_NAME,)
+        await db.execute(sql, data)
+
+    # Every min_edit_interval seconds, edit the message if the standings have changed:
+    async def run(self, bot, render):
+        await bot.wait_until_ready()
+        while True:
+            await asyncio.sleep(self.min_edit_interval)
+            version = leaderboard.board.version
+            if self.message_id is None or version == self.shown_version:
+                continue
+            try:
+                try:
+                    channel = bot.get_channel(self.channel_id) or await bot.fetch_channel(self.channel_id)
+                    await channel.get_partial_message(self.message_id).edit(content=render())
+                    self.shown_version = version
+                    self.edits += 1
+                except (discord.NotFound, discord.Forbidden) as error:
+                    print(f'Live leaderboard message can no longer be edited ({error}); detaching it.')
+                    await self.detach()
+            except Exception as error:
+                # Try again after the next interval:
+                self.edit_failures += 1
+                print(f'Live leaderboard update failed: {error}')
+
+live = hunts.PerHunt(LiveLeaderboard)
@@ -0,0 +1,238 @@
+### LOAD LIBRARIES #############################################################
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+
+import psycopg2
+import manage_hunts # Connects to the chosen hunt's tables
+from normalize import normalize_guess # The same sanitizer applied to solvers' guesses
+
+try:
+    import yaml # Optional: only needed to load .yaml/.yml hunt files
+except ImportError:
+    yaml = None
+
+# Load puzzles and responses from spreadsheets (a directory holding puzzles.csv and
+# responses.csv) or from a single YAML file, upserting them into the database in one
+# transaction. Loading the same files twice changes nothing.
+    # puzzles.csv:   puzzle_name, puzzle_points, is_final_puzzle
+    # responses.csv: puzzle_name, guess, is_answer, response
+    # See examples/ for both formats.
+
+### READING CONTENT ############################################################
+
+TRUE_VALUES = {'true', 't', 'yes', 'y', '1', 'x'}
+
+class ContentError(Exception):
+    pass
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+# Read the two CSV files in a directory:
+def read_csv_content(directory):
+    puzzles = []
+    responses = []
+    with open(os.path.join(directory, 'puzzles.csv'), newline='', encoding='utf-8-sig') as file:
+        for line, row in enumerate(csv.DictReader(file), start=2):
+            puzzles.append((line, row['puzzle_name'].strip(), row['puzzle_points'],
+                parse_bool(row.get('is_final_puzzle'))))
+    with open(os.path.join(directory, 'responses.csv'), newline='', encoding='utf-8-sig') as file:
+        for line, row in enumerate(csv.DictReader(file), start=2):
+            responses.append((line, row['puzzle_name'].strip(), row['guess'],
+                parse_bool(row.get('is_answer')), row['response']))
+    return puzzles, responses
+
+# Read a YAML file of the form {puzzles: [{name, points, final, responses: [...]}]}:
+def read_yaml_content(filename):
+    if yaml is None:
+        raise ContentError('Loading YAML files requires PyYAML (pip install pyyaml).')
+    with open(filename, encoding='utf-8') as file:
+        document = yaml.safe_load(file) or {}
+    puzzles = []
+    responses = []
+    for number, puzzle in enumerate(document.get('puzzles', []), start=1):
+        name = str(puzzle['name']).strip()
+        puzzles.append((f'puzzle {number}', name, puzzle.get('points', 1), parse_bool(puzzle.get('final'))))
+        for response in puzzle.get('responses', []):
+            responses.append((f'puzzle {number}', name, str(response['guess']),
+                parse_bool(response.get('is_answer')), str(response['response'])))
+    return puzzles, responses
+
+# Check the content and normalize guesses, raising ContentError listing every problem:
+def validate(puzzles, responses):
+    problems = []
+    warnings = []
+    clean_puzzles = {}
+    for line, name, points, is_final in puzzles:
+        if not name:
+            problems.append(f'puzzles {line}: missing puzzle name')
+            continue
+        if name in clean_puzzles:
+            problems.append(f'puzzles {line}: duplicate puzzle "{name}"')
+            continue
+        try:
+            points = int(points)
+        except (TypeError, ValueError):
+            problems.append(f'puzzles {line}: "{name}" has invalid points "{points}"')
+            continue
+        if len(name) > 100: # Discord's limit for select menu labels
+            warnings.append(f'puzzles {line}: "{name}" is longer than 100 characters')
+        clean_puzzles[name] = (name, points, is_final)
+
+    clean_responses = {}
+    for line, name, guess, is_answer, response in responses:
+        normalized = normalize_guess(guess)
+        if name not in clean_puzzles:
+            problems.append(f'responses {line}: unknown puzzle "{name}"')
+        elif not normalized:
+            problems.append(f'responses {line}: guess "{guess}" is empty once normalized')
+        elif not response.strip():
+            problems.append(f'responses {line}: missing response to "{guess}"')
+        elif (name, normalized) in clean_responses:
+            problems.append(f'responses {line}: "{guess}" duplicates an earlier guess on "{name}" '
+                f'(both normalize to "{normalized}")')
+        else:
+            clean_responses[(name, normalized)] = (name, normalized, is_answer, response.strip())
+
+    answered = {name for name, normalized, is_answer, response in clean_responses.values() if is_answer}
+    for name in clean_puzzles:
+        if name not in answered:
+            warnings.append(f'"{name}" has no response marked as the answer')
+    if not any(is_final for name, points, is_final in clean_puzzles.values()):
+        warnings.append('no puzzle is marked as the final puzzle')
+
+    if problems:
+        raise ContentError('\n'.join(problems))
+    return list(clean_puzzles.values()), list(clean_responses.values()), warnings
+
+### LOADING CONTENT ############################################################
+
+# Stream rows into a table with COPY:
+def copy_rows(cur, table, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(f'COPY {table} FROM STDIN WITH (FORMAT csv)', buffer)
+
+# Upsert the content in one transaction, returning counts of what changed.
+    # With prune, responses to loaded puzzles that no longer appear in the files are
+    # deleted. Puzzles themselves are never deleted (the guesslog refers to them).
+def load_content(conn, puzzles, responses, prune=False):
+    counts = {}
+    with conn.cursor() as cur:
+        cur.execute("""CREATE TEMP TABLE staged_puzzles (
+            puzzle_name VARCHAR(255) PRIMARY KEY,
+            puzzle_points INTEGER NOT NULL,
+            is_final_puzzle BOOLEAN NOT NULL) ON COMMIT DROP""")
+        cur.execute("""CREATE TEMP TABLE staged_responses (
+            puzzle_name VARCHAR(255) NOT NULL,
+            guess VARCHAR(255) NOT NULL,
+            is_answer BOOLEAN NOT NULL,
+            response VARCHAR(255) NOT NULL,
+            PRIMARY KEY (puzzle_name, guess)) ON COMMIT DROP""")
+        copy_rows(cur, 'staged_puzzles', puzzles)
+        copy_rows(cur, 'staged_responses', responses)
+
+        # Diff the staged content against the database:
+        cur.execute("""SELECT
+                count(*) FILTER (WHERE puzzles.puzzle_id IS NULL),
+                count(*) FILTER (WHERE (puzzles.puzzle_points, puzzles.is_final_puzzle)
+                    IS DISTINCT FROM (staged.puzzle_points, staged.is_final_puzzle))
+                    - count(*) FILTER (WHERE puzzles.puzzle_id IS NULL)
+            FROM staged_puzzles AS staged LEFT JOIN puzzles USING (puzzle_name)""")
+        counts['puzzles added'], counts['puzzles changed'] = cur.fetchone()
+        cur.execute("""SELECT
+                count(*) FILTER (WHERE responses.response_id IS NULL),
+                count(*) FILTER (WHERE (responses.is_answer, responses.response)
+                    IS DISTINCT FROM (staged.is_answer, staged.response))
+                    - count(*) FILTER (WHERE responses.response_id IS NULL)
+            FROM staged_responses AS staged
+            LEFT JOIN puzzles USING (puzzle_name)
+            LEFT JOIN responses ON responses.puzzle_id = puzzles.puzzle_id
+                AND responses.guess = staged.guess""")
+        counts['responses added'], counts['responses changed'] = cur.fetchone()
+        cur.execute("""SELECT count(*) FROM puzzles
+            WHERE puzzle_name NOT IN (SELECT puzzle_name FROM staged_puzzles)""")
+        counts['puzzles only in the database'] = cur.fetchone()[0]
+
+        # Apply it, only touching rows that actually differ:
+        cur.execute("""INSERT INTO puzzles (puzzle_name, puzzle_points, is_final_puzzle)
+            SELECT puzzle_name, puzzle_points, is_final_puzzle FROM staged_puzzles
+            ON CONFLICT (puzzle_name) DO UPDATE
+            SET puzzle_points = EXCLUDED.puzzle_points, is_final_puzzle = EXCLUDED.is_final_puzzle
+            WHERE (puzzles.puzzle_points, puzzles.is_final_puzzle)
+                IS DISTINCT FROM (EXCLUDED.puzzle_points, EXCLUDED.is_final_puzzle)""")
+        cur.execute("""INSERT INTO responses (puzzle_id, guess, is_answer, response)
+            SELECT puzzles.puzzle_id, staged.guess, staged.is_answer, staged.response
+            FROM staged_responses AS staged JOIN puzzles USING (puzzle_name)
+            ON CONFLICT (puzzle_id, guess) DO UPDATE
+            SET is_answer = EXCLUDED.is_answer, response = EXCLUDED.response
+            WHERE (responses.is_answer, responses.response)
+                IS DISTINCT FROM (EXCLUDED.is_answer, EXCLUDED.response)""")
+        if prune:
+            cur.execute("""DELETE FROM responses USING puzzles
+                WHERE responses.puzzle_id = puzzles.puzzle_id
+                AND puzzles.puzzle_name IN (SELECT puzzle_name FROM staged_puzzles)
+                AND NOT EXISTS (SELECT 1 FROM staged_responses AS staged
+                    WHERE staged.puzzle_name = puzzles.puzzle_name AND staged.guess = responses.guess)""")
+            counts['responses removed'] = cur.rowcount
+    return counts
+
+### RUN SCRIPT #################################################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load puzzles and responses from CSV or YAML files.')
+    parser.add_argument('source', help='a directory with puzzles.csv and responses.csv, or a .yaml/.yml file')
+    parser.add_argument('--prune', action='store_true',
+        help='delete responses to the loaded puzzles that are not in the files')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change, then roll back')
+    parser.add_argument('--hunt', help='the hunt to use, by name (default: the default hunt)')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        if args.source.endswith(('.yaml', '.yml')):
+            puzzles, responses = read_yaml_content(args.source)
+        else:
+            puzzles, responses = read_csv_content(args.source)
+        puzzles, responses, warnings = validate(puzzles, responses)
+    except (ContentError, OSError, KeyError) as error:
+        print(f'Could not load {args.source}:\n{error}')
+        return 1
+    for warning in warnings:
+        print(f'Warning: {warning}')
+    read_seconds = time.perf_counter() - started
+
+    try:
+        conn = manage_hunts.connect(args.hunt)
+    except manage_hunts.HuntError as error:
+        print(error)
+        return 1
+    try:
+        counts = load_content(conn, puzzles, responses, prune=args.prune)
+        if args.dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except psycopg2.DatabaseError as error:
+        conn.rollback()
+        print(f'Nothing was loaded: {error}')
+        return 1
+    finally:
+        conn.close()
+
+    total_seconds = time.perf_counter() - started
+    print(f"{'Would load' if args.dry_run else 'Loaded'} {len(puzzles)} puzzles and {len(responses)} responses "
+        f'in {total_seconds:.2f} s ({read_seconds:.2f} s reading and validating):')
+    for name, count in counts.items():
+        print(f'  {name}: {count}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,24 +1,36 @@
 ### LOAD LIBRARIES #############################################################
 import os # Interactions with OS (e.g. accessing files)
-import random # Generating random numbers
-import re # Regular Expressions
-from wcwidth import wcwidth # To find widths of extended Unicode/emoji characters
+import re # To read puzzle ids back out of component custom_ids
 import datetime # To format datetimes
+import asyncio # To refresh the hunt registry in the background
+import time # To time commands for !stats
 
 import discord # Communicate with the Discord API
 from discord.ext import commands
-from discord.ui import Select, View, Modal, TextInput # For nice UI on user input
+from discord.ui import Button, DynamicItem, View, Modal, TextInput, button, select # For nice UI on user input
 from dotenv import load_dotenv
 from asyncio import TimeoutError # To implement timeouts on user interactions
+from psycopg.errors import UniqueViolation # Raised when a new team token or solver is already in use
 
 load_dotenv() # Load environment variables related to the Discord API (from .env)
 TOKEN = os.getenv('DISCORD_TOKEN')
 GUILD = os.getenv('DISCORD_GUILD')
 
-import psycopg2 # Interactions with the PostgreSQL server
-import psycopg2.extras
-from psycopg2.extras import RealDictCursor # To read DB queries as dictionaries
-from config import load_config
+import db # Shared pool of connections to the PostgreSQL server
+import answers # In-memory index of puzzles and responses
+import membership # Cache of which team each solver belongs to
+import leaderboard # In-memory, incrementally updated team standings
+import team_state # In-memory per-team counters, solves and prior guesses
+import writebehind # Optional batched guesslog writes
+import tables # Rendering of text tables for the leaderboard and dashboard
+import liveboard # Auto-updating leaderboard message in a hunt channel
+import team_queue # Per-team queues that process each team's guesses in order
+import metrics # Command/SQL timings for !stats and the optional metrics endpoint
+import tokens # Secure, unique team tokens
+import analytics # Cached per-puzzle solve statistics for organizers
+import solves # In-memory record of the puzzles each team has solved
+import hunts # Which hunt (and so which schema and state) each command belongs to
+import partitions # Creates each day's guesslog partition ahead of time
 
 ### LOADING THE BOT ############################################################
 
@@ -27,24 +39,187 @@ intents.message_content = True
 intents.reactions = True # Ensure that the bot can receive reactions
 intents.messages = True
 intents.members = True # To fetch guild members
-bot = commands.Bot(command_prefix='!',intents=intents)
 
-### HELPER FUNCTIONS ###########################################################
-
-# Generate a random string using easily identifiable characters:
-def generate_random_string(length=8):
-    # Omit I, 1, 0, O.
-    characterbank = 'ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz23456789'
-    return ''.join(random.choice(characterbank) for _ in range(length))
+# Sharded automatically, so one bot can serve many hunt servers:
+class HuntBot(commands.AutoShardedBot):
+    # Open the shared pool, then start every registered hunt (loading its answer index)
+    # before connecting to Discord:
+    async def setup_hook(self):
+        await db.open_pool()
+        added, removed = await hunts.registry.load(GUILD)
+        await start_hunts(added)
+        # Reload a hunt's index whenever its puzzles/responses are edited mid-hunt,
+        # and start or stop hunts as they are registered or deactivated:
+        db.start_listener(answers.CONTENT_CHANNEL, reload_hunt_content)
+        db.start_listener(hunts.HUNTS_CHANNEL, lambda payload: asyncio.create_task(refresh_hunts()))
+        # Route !guess picker interactions by custom_id, including pickers sent
+        # before a restart:
+        self.add_view(GuessPicker())
+        self.add_dynamic_items(PickerPageButton)
+        await metrics.start_server()
+
+    # Run each command against its hunt: the one held in the server it was used
+    # in or, in direct messages, the hunt the solver chose or their only hunt.
+        # Dashboard commands may read from the replica, if one is configured.
+    async def invoke(self, ctx):
+        if ctx.command is None or ctx.command.qualified_name in HUNTLESS_COMMANDS:
+            return await super().invoke(ctx)
+        schema = hunts.registry.for_context(ctx)
+        if schema is None:
+            await ctx.send(unrouted_message(ctx))
+            return
+        with hunts.use(schema):
+            if ctx.command.qualified_name in REPLICA_COMMANDS:
+                with db.replica_reads():
+                    await super().invoke(ctx)
+            else:
+                await super().invoke(ctx)
+
+    # Write out any queued guesses, then close the database pools on shutdown:
+    async def close(self):
+        await super().close()
+        await metrics.stop_server()
+        for schema in list(hunts.registry.hunts):
+            await stop_hunt(schema)
+        await db.close_pool()
+
+bot = HuntBot(command_prefix='!',intents=intents)
+
+### HUNTS ######################################################################
+
+# Commands that work the same whichever hunt the user is in:
+HUNTLESS_COMMANDS = {'help', 'hunt'}
+
+# Read-only dashboard commands, whose READ-lane queries may go to the read replica
+# (guesses, !team and everything else always use the primary; !leaderboard is
+# served from memory and reads nothing):
+REPLICA_COMMANDS = {'puzzles', 'analytics'}
+
+# Serve a hunt's schema from the shared pool and load its in-memory state:
+async def start_hunt(schema):
+    with hunts.use(schema):
+        await db.open_pool(schema=schema)
+        await answers.index.load()
+        await leaderboard.board.load()
+        await solves.solved.load()
+        writebehind.writer.start()
+        partitions.upkeep.start()
+        await liveboard.live.start(bot, render_live_leaderboard)
+
+# Write out a hunt's queued guesses and stop serving its schema (the default hunt's
+# schema stays served, since it also holds the hunt registry):
+async def stop_hunt(schema):
+    with hunts.use(schema):
+        liveboard.live.stop()
+        partitions.upkeep.stop()
+        await writebehind.writer.stop()
+    if schema != db.DEFAULT_SCHEMA:
+        await db.close_pool(schema)
+    hunts.forget(schema)
+
+# Start each newly registered hunt (schema -> hunt row), serving it only once it has
+# started. A hunt that fails to start is stopped again and left out of the registry
+# (so the next refresh retries it), and the remaining hunts still start:
+async def start_hunts(added):
+    for schema, hunt in added.items():
+        try:
+            await start_hunt(schema)
+        except Exception as error:
+            print(f"Could not start hunt \"{hunt['hunt_name']}\": {error}")
+            await stop_hunt(schema)
+            continue
+        hunts.registry.add(hunt)
+        print(f"Started hunt \"{hunt['hunt_name']}\".")
+
+# Refreshes run one at a time, so that two notifications cannot start the same hunt twice:
+refresh_lock = asyncio.Lock()
+
+# Start newly registered hunts and stop deactivated ones:
+async def refresh_hunts():
+    async with refresh_lock:
+        try:
+            added, removed = await hunts.registry.load(GUILD)
+            for schema in removed:
+                await stop_hunt(schema)
+            await start_hunts(added)
+        except Exception as error:
+            print(f'Could not refresh the hunt registry: {error}')
+
+# Reload the answer index of the hunt whose content changed (the payload names its
+# schema); after a reconnect, when notifications may have been missed, reload all:
+def reload_hunt_content(payload):
+    schemas = [payload] if payload in hunts.registry.hunts else list(hunts.registry.hunts)
+    for schema in schemas:
+        with hunts.use(schema):
+            answers.index.request_reload()
+
+# The Discord server of the hunt being served:
+def hunt_guild():
+    hunt = hunts.registry.current()
+    if hunt is not None and hunt['guild_id'] is not None:
+        return bot.get_guild(hunt['guild_id'])
+    return discord.utils.get(bot.guilds, name=GUILD)
+
+# Explain why a command could not be matched to a hunt:
+def unrouted_message(ctx):
+    if ctx.guild is not None:
+        return 'This server is not set up for a hunt.'
+    names = [hunts.registry.hunts[schema]['hunt_name'] for schema in hunts.registry.for_user(ctx.author)]
+    if not names:
+        return 'Please join a hunt\'s Discord server before using this command.'
+    return ('You are in more than one hunt. Choose one with `!hunt <name>`: '
+        + ', '.join(f'`{name}`' for name in names))
 
-# Calculate string width, using wcwidth() for width of nonstandard characters:
-def calculate_width(text):
-    return round(sum(wcwidth(char) if wcwidth(char) != 2 else 2.2 for char in text))
+### HELPER FUNCTIONS ###########################################################
 
-# Pad a string to a given width using whitespace:
-def pad_to_width(text, width):
-    padding_needed = width - calculate_width(text)
-    return text + ' ' * padding_needed
+# Create a team with its captain, returning the new team row and its join token:
+    # Tokens are random (see tokens.py), so a collision is vanishingly rare; if the
+    # unique constraint on team_token ever rejects one, retry with a fresh token.
+async def create_team(team_name, user_id, user_name, attempts=5):
+    for attempt in range(attempts):
+        token = tokens.generate_token()
+        try:
+            # Borrow a connection from the pool:
+            async with db.cursor() as cur:
+                # Add team to database, and obtain the newly minted team_id:
+                sql = f"""INSERT INTO teams (team_name, team_token) VALUES (%s, %s)
+                    RETURNING {leaderboard.TEAM_COLUMNS};"""
+                data = (team_name, token)
+                await cur.execute(sql, data)
+                team = await cur.fetchone()
+
+                # Add user to a list of registered solvers:
+                sql = """INSERT INTO solvers (discord_id, discord_name, team_id, is_captain)
+                    VALUES (%s, %s, %s, %s);"""
+                data = (user_id, user_name, team['team_id'], True)
+                await cur.execute(sql, data)
+            return team, token
+        except UniqueViolation as error:
+            if error.diag.constraint_name != 'teams_team_token_key' or attempt == attempts - 1:
+                raise
+
+# Tell a solver which team they are already registered to, and how to leave it:
+async def send_already_registered(ctx, row, separator='\n'):
+    team_name = row['team_name']
+    if row['is_captain']:
+        await ctx.send(f'You are currently registered to the team "{team_name}".{separator}'
+        'Use `!team delete` to delete that team before creating a new team.')
+    else:
+        await ctx.send(f'You are currently registered to the team "{team_name}".{separator}'
+        'Use `!team leave` to leave that team before creating a new team.')
+
+# Handle a solvers insert rejected because the user registered in the meantime
+    # (e.g. a simultaneous !team join, or a bulk registration while a stale "not a
+    # member" entry was cached): refresh the cache and explain, or re-raise anything else.
+async def handle_duplicate_solver(ctx, user_id, error, separator='\n'):
+    if error.diag.constraint_name != 'solvers_discord_id_key':
+        raise error
+    membership.cache.invalidate(user_id)
+    row = await membership.cache.get(user_id)
+    if row is not None:
+        await send_already_registered(ctx, row, separator)
+    else:
+        await ctx.send('Your registration changed while this request was being handled. Please try again.')
 
 ### BOT TRIGGER EVENTS #########################################################
 
@@ -52,17 +227,29 @@ def pad_to_width(text, width):
 @bot.event
 async def on_ready():
     for guild in bot.guilds:
-        if guild.name == GUILD:
+        schema = hunts.registry.for_guild(guild)
+        if schema is not None:
 
             print(
                 f'{bot.user} is connected to the following guild:\n'
-                f' - {guild.name}; guild.id = {guild.id}'
+                f' - {guild.name}; guild.id = {guild.id}; '
+                f"hunt = {hunts.registry.hunts[schema]['hunt_name']}"
                 )
 
             members = '\n - '.join([member.name for member in guild.members])
             print(f'Guild Members:\n - {members}')
             print(guild.id)
 
+# Time every command that passes its checks (including ones that fail partway):
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    metrics.observe(metrics.commands, ctx.command.qualified_name,
+        time.perf_counter() - ctx.started, ctx.command_failed)
+
 ### PREDICATES FOR COMMAND RESTRICTION  ########################################
 
 def is_dm():
@@ -82,6 +269,49 @@ def is_dm_or_approved_role():
         return False
     return commands.check(is_dm_or_approved_role_predicate)
 
+def is_organizer():
+    async def is_organizer_predicate(ctx):
+        # Only allow users with the 'Hunt Organizer' role (and so never within DMs):
+        if isinstance(ctx.author, discord.Member):
+            role = discord.utils.get(ctx.author.roles, name='Hunt Organizer')
+            return role is not None
+        return False
+    return commands.check(is_organizer_predicate)
+
+def is_organizer_anywhere():
+    async def is_organizer_anywhere_predicate(ctx):
+        # Allow users with the 'Hunt Organizer' role in the hunt server, whether the
+        # command is used there or in direct messages:
+        member = ctx.author
+        if not isinstance(member, discord.Member):
+            guild = hunt_guild()
+            member = guild.get_member(ctx.author.id) if guild is not None else None
+        if member is None:
+            return False
+        role = discord.utils.get(member.roles, name='Hunt Organizer')
+        return role is not None
+    return commands.check(is_organizer_anywhere_predicate)
+
+### !HUNT ######################################################################
+
+@bot.command(name='hunt', help='Choose which hunt your direct messages are for, if you are in several. '
+    'Use !hunt <name>, or !hunt to list your hunts.')
+@is_dm()
+async def choose_hunt(ctx, *, name=None):
+    schemas = hunts.registry.for_user(ctx.author)
+    if name is None:
+        current = hunts.registry.for_context(ctx)
+        lines = [f"{'**' if schema == current else ''}{hunts.registry.hunts[schema]['hunt_name']}"
+            f"{'** (current)' if schema == current else ''}" for schema in schemas]
+        await ctx.send('Your hunts:\n' + '\n'.join(lines) if lines else 'You are not in any hunt\'s server.')
+        return
+    schema = hunts.registry.find(name)
+    if schema not in schemas:
+        await ctx.send(f'You are not in a hunt named "{name}".')
+        return
+    hunts.registry.choices[ctx.author.id] = schema
+    await ctx.send(f"Your direct messages are now for **{hunts.registry.hunts[schema]['hunt_name']}**.")
+
 ### !TEAM ######################################################################
 
 # Main !team command group:
@@ -102,24 +332,11 @@ async def team_create_function(ctx):
     user_id = str(ctx.author.id)
     user_name = ctx.author.name
 
-    config = load_config()
-    with psycopg2.connect(**config) as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = """SELECT * FROM solvers JOIN teams ON solvers.team_id = teams.team_id
-                WHERE discord_id = %s"""
-            data = (user_id,)
-            cur.execute(sql,data)
-            row = cur.fetchone()
-
-            if row is not None:
-                team_name = row['team_name']
-                if row['is_captain']:
-                    await ctx.send(f'You are currently registered to the team "{team_name}".\n'
-                    'Use `!team delete` to delete that team before creating a new team.')
-                else:
-                    await ctx.send(f'You are currently registered to the team "{team_name}".\n'
-                    'Use `!team leave` to leave that team before creating a new team.')
-                return
+    row = await membership.cache.get(user_id)
+
+    if row is not None:
+        await send_already_registered(ctx, row)
+        return
 
     # Otherwise, begin with the dialogue for team creation:
     await ctx.send('Please enter the name of your team (max. 30 characters):')
@@ -150,27 +367,16 @@ async def team_create_function(ctx):
                     and reaction.message.id == confirmation_msg.id)
 
         try:
-            # If confirmed, issue a team token and update the database:
-            # TODO: Ensure that team tokens are unique.
+            # If confirmed, issue a unique team token and update the database:
             reaction, user = await bot.wait_for('reaction_add', timeout=15.0, check=reaction_check)
             if str(reaction.emoji) == green_check:
-                token = generate_random_string()
-                # Connect to the DB
-                config = load_config()
-                with psycopg2.connect(**config) as conn:
-                    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                        # Add team to database, and obtain the newly minted team_id:
-                        sql = """INSERT INTO teams (team_name, team_token) VALUES (%s, %s)
-                            RETURNING team_id;"""
-                        data = (team_name, token)
-                        cur.execute(sql, data)
-                        team_id = cur.fetchone()['team_id']
-
-                        # Add user to a list of registered solvers:
-                        sql = """INSERT INTO solvers (discord_id, discord_name, team_id, is_captain)
-                            VALUES (%s, %s, %s, %s);"""
-                        data = (user_id, user_name, team_id, True)
-                        cur.execute(sql, data)
+                try:
+                    team, token = await create_team(team_name, user_id, user_name)
+                except UniqueViolation as error:
+                    await handle_duplicate_solver(ctx, user_id, error)
+                    return
+                membership.cache.invalidate(user_id)
+                leaderboard.board.update(team)
 
                 await ctx.send(f'Team creation successful. Other members may join using `!team join` and the following token: `{token}`.')
 
@@ -190,24 +396,11 @@ async def team_join_function(ctx):
     user_id = str(ctx.author.id)
     user_name = ctx.author.name
 
-    config = load_config()
-    with psycopg2.connect(**config) as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = """SELECT * FROM solvers JOIN teams ON solvers.team_id = teams.team_id
-                WHERE discord_id = %s"""
-            data = (user_id,)
-            cur.execute(sql,data)
-            row = cur.fetchone()
-
-            if row is not None:
-                team_name = row['team_name']
-                if row['is_captain']:
-                    await ctx.send(f'You are currently registered to the team "{team_name}". '
-                    'Use `!team delete` to delete that team before creating a new team.')
-                else:
-                    await ctx.send(f'You are currently registered to the team "{team_name}". '
-                    'Use `!team leave` to leave that team before creating a new team.')
-                return
+    row = await membership.cache.get(user_id)
+
+    if row is not None:
+        await send_already_registered(ctx, row, separator=' ')
+        return
 
     # Otherwise, begin with the dialogue for joining a team:
     await ctx.send('Please enter the password for the team you would like to join:')
@@ -220,28 +413,32 @@ async def team_join_function(ctx):
         msg = await bot.wait_for('message', timeout=60.0, check=check)
         team_token = msg.content
 
-        # Connect to the DB:
-        config = load_config()
-        with psycopg2.connect(**config) as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+        try:
+            # Borrow a connection from the pool:
+            async with db.cursor() as cur:
                 # Check if a team with that token exists:
                 sql = """SELECT * FROM teams WHERE team_token = %s"""
                 data = (team_token,)
-                cur.execute(sql, data)
-                row = cur.fetchone()
+                await cur.execute(sql, data)
+                row = await cur.fetchone()
 
-                if row is None: # If the user input fails to match the token of any team:
-                    await ctx.send(f'Failed to find a matching team. Please double-check the password and retry via `!team join`.')
-                    return
-                else:
+                if row is not None:
                     team_id = row['team_id']
                     team_name = row['team_name']
                     # Add user to a list of registered solvers:
                     sql = """INSERT INTO solvers (discord_id, discord_name, team_id, is_captain)
                         VALUES (%s, %s, %s, FALSE)"""
                     data = (user_id, user_name, team_id)
-                    cur.execute(sql, data)
-                    await ctx.send(f'You have successfully joined the team "{team_name}".')
+                    await cur.execute(sql, data)
+        except UniqueViolation as error:
+            await handle_duplicate_solver(ctx, user_id, error, separator=' ')
+            return
+        membership.cache.invalidate(user_id)
+
+        if row is None: # If the user input fails to match the token of any team:
+            await ctx.send(f'Failed to find a matching team. Please double-check the password and retry via `!team join`.')
+        else:
+            await ctx.send(f'You have successfully joined the team "{team_name}".')
 
     except TimeoutError: # If team token entry takes too long.
         await ctx.send('*Request has timed out. Please try again.*')
@@ -252,31 +449,26 @@ async def team_leave_function(ctx):
     user_id = str(ctx.author.id)
     user_name = ctx.author.name
 
-    # Connect to the DB
-    config = load_config()
-    with psycopg2.connect(**config) as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            # Determine if the user is registered to a team:
-            sql = """SELECT * FROM solvers JOIN teams ON solvers.team_id = teams.team_id
-                WHERE discord_id = %s"""
-            data = (user_id,)
-            cur.execute(sql,data)
-            row = cur.fetchone()
-
-            if row is None: # If the user is not on a team, abort with adivce:
-                await ctx.send('You are not yet registered to a team. '
-                        'Create a new team with `!team create` '
-                        'or join an existing team with `!team join`.')
-            elif row['is_captain']: # If the user is a captain, abort with advice:
-                await ctx.send('You cannot leave a team you have created. '
-                        'To delete this team (removing **all members**), use `!team delete`.')
-            else:
-                # Otherwise, remove the user from the list of registered solvers:
-                team_name = row['team_name']
-                sql = """DELETE FROM solvers WHERE discord_id = %s;"""
-                data = (user_id,)
-                cur.execute(sql, data)
-                await ctx.send(f'You have successfully left the team "{team_name}".')
+    # Determine if the user is registered to a team:
+    row = await membership.cache.get(user_id)
+
+    if row is not None and not row['is_captain']:
+        # Remove the user from the list of registered solvers:
+        sql = """DELETE FROM solvers WHERE discord_id = %s;"""
+        data = (user_id,)
+        await db.execute(sql, data)
+        membership.cache.invalidate(user_id)
+
+    if row is None: # If the user is not on a team, abort with adivce:
+        await ctx.send('You are not yet registered to a team. '
+                'Create a new team with `!team create` '
+                'or join an existing team with `!team join`.')
+    elif row['is_captain']: # If the user is a captain, abort with advice:
+        await ctx.send('You cannot leave a team you have created. '
+                'To delete this team (removing **all members**), use `!team delete`.')
+    else:
+        team_name = row['team_name']
+        await ctx.send(f'You have successfully left the team "{team_name}".')
 
 # Team Deletion Subcommand:
 @team_action.command(name='delete')
@@ -284,58 +476,59 @@ async def team_delete_function(ctx):
     user_id = str(ctx.author.id)
     user_name = ctx.author.name
 
-    # Connect to the DB
-    config = load_config()
-    with psycopg2.connect(**config) as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            # Determine if the user is registered to a team as a captain:
-            sql = """SELECT * FROM solvers JOIN teams ON solvers.team_id = teams.team_id
-                WHERE discord_id = %s AND is_captain = TRUE"""
-            data = (user_id,)
-            cur.execute(sql,data)
-            row = cur.fetchone()
-
-            if row is None: # If the user is not a team captain, abort with advice:
-                await ctx.send('*Team deletion is only available to users who have created teams.*')
-            else:
-                # Confirm the deletion request:
-                team_name = row['team_name']
-                confirmation_msg = await ctx.send('This action will delete the team '
-                    f'"{team_name}" (removing all team members) and **cannot be undone**.\n'
-                    'React with ✅ to confirm your choice or with ❌ to exit.')
-
-                # Add emoji reacts to the message to speed up confirmation.
-                green_check = '✅'
-                red_x = '❌'
-                await confirmation_msg.add_reaction(green_check)
-                await confirmation_msg.add_reaction(red_x)
-
-                def reaction_check(reaction, user):
-                    return (user == ctx.author and str(reaction.emoji) in [green_check, red_x]
-                            and reaction.message.id == confirmation_msg.id)
+    # Determine if the user is registered to a team as a captain:
+    row = await membership.cache.get(user_id)
+    if row is not None and not row['is_captain']:
+        row = None
 
-                try:
-                    reaction, user = await bot.wait_for('reaction_add', timeout=15.0, check=reaction_check)
-                    if str(reaction.emoji) == green_check:
-                        # If confirmed, remove all teammates from the solvers list:
-                        team_id = row['team_id']
-                        sql = """DELETE FROM solvers WHERE team_id = %s"""
-                        data = (team_id,)
-                        cur.execute(sql, data)
-                        # ... and mark the team as deleted:
-                            # (This preserves the guesslog record better than a full scrub)
-                        sql = """UPDATE teams SET is_deleted = TRUE
-                            WHERE team_id = %s"""
-                        data = (team_id,)
-                        cur.execute(sql, data)
-                        await ctx.send('You have successfully deleted this team. '
-                            'Feel free to create a new team with `!team create` or '
-                            'join an existing team with `!team join`.')
-
-                    elif str(reaction.emoji) == red_x:
-                        await ctx.send('Team deletion terminated by user.')
-                except TimeoutError: # If confirmation takes too long.
-                    await ctx.send('*Request has timed out. Please try again.*')
+    if row is None: # If the user is not a team captain, abort with advice:
+        await ctx.send('*Team deletion is only available to users who have created teams.*')
+    else:
+        # Confirm the deletion request:
+            # (The connection goes back to the pool while we wait on the user.)
+        team_name = row['team_name']
+        confirmation_msg = await ctx.send('This action will delete the team '
+            f'"{team_name}" (removing all team members) and **cannot be undone**.\n'
+            'React with ✅ to confirm your choice or with ❌ to exit.')
+
+        # Add emoji reacts to the message to speed up confirmation.
+        green_check = '✅'
+        red_x = '❌'
+        await confirmation_msg.add_reaction(green_check)
+        await confirmation_msg.add_reaction(red_x)
+
+        def reaction_check(reaction, user):
+            return (user == ctx.author and str(reaction.emoji) in [green_check, red_x]
+                    and reaction.message.id == confirmation_msg.id)
+
+        try:
+            reaction, user = await bot.wait_for('reaction_add', timeout=15.0, check=reaction_check)
+            if str(reaction.emoji) == green_check:
+                team_id = row['team_id']
+                async with db.cursor() as cur:
+                    # If confirmed, remove all teammates from the solvers list:
+                    sql = """DELETE FROM solvers WHERE team_id = %s"""
+                    data = (team_id,)
+                    await cur.execute(sql, data)
+                    # ... and mark the team as deleted:
+                        # (This preserves the guesslog record better than a full scrub)
+                    sql = """UPDATE teams SET is_deleted = TRUE
+                        WHERE team_id = %s"""
+                    data = (team_id,)
+                    await cur.execute(sql, data)
+                membership.cache.invalidate_team(team_id)
+                leaderboard.board.remove(team_id)
+                team_state.states.forget(team_id)
+                team_queue.queues.forget(team_id)
+                solves.solved.forget(team_id)
+                await ctx.send('You have successfully deleted this team. '
+                    'Feel free to create a new team with `!team create` or '
+                    'join an existing team with `!team join`.')
+
+            elif str(reaction.emoji) == red_x:
+                await ctx.send('Team deletion terminated by user.')
+        except TimeoutError: # If confirmation takes too long.
+            await ctx.send('*Request has timed out. Please try again.*')
 
 @team_action.error
 async def team_error(ctx, error):
@@ -345,55 +538,112 @@ async def team_error(ctx, error):
 
 ### !LEADERBOARD ###############################################################
 
-@bot.command(name='leaderboard', help='Display a leaderboard of registered teams.')
+@bot.command(name='leaderboard', help='Display the leaderboard, one page at a time. '
+    'Use !leaderboard <page>, or !leaderboard me for the page with your team.')
 @is_dm_or_approved_role()
-async def display_leaderboard(ctx):
-
-    # Connect to the DB
-    config = load_config()
-    with psycopg2.connect(**config) as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            # Fetch the list of undeleted teams:
-                # Order by hunt_solve_time, then score, then last_solve_time
-            sql = """SELECT * FROM teams WHERE is_deleted = FALSE
-                ORDER BY hunt_solve_time ASC, score DESC, last_solve_time ASC"""
-            cur.execute(sql)
-
-            # Make a matrix of somewhat-reformatted leaderboard data:
-            team_place = 1
-            is_hunt_won = False
-            leaderboard_table = [["#", "Team Name", "Score", "Last Solve", "Hunt Finish"]]
-            for row in cur:
-                last_solve_datetime = row['last_solve_time'].strftime('%m-%d %H:%M:%S')
-                if row['is_hunt_solved']:
-                    is_hunt_won = True
-                    display_team_name = '🔎' + row['team_name'] + '🔎'
-                    hunt_solve_time = row['hunt_solve_time'].strftime('%m-%d %H:%M:%S')
-                else:
-                    display_team_name = row['team_name']
-                    hunt_solve_time = ''
-                team_data = [str(team_place), display_team_name, str(row['score']), last_solve_datetime, hunt_solve_time]
-                leaderboard_table.append(team_data)
-                team_place += 1
-
-            # Only display "Hunt Finish" column if at least one team has finished:
-            if is_hunt_won == False:
-                leaderboard_table = [lb_row[:-1] for lb_row in leaderboard_table]
-
-            # Compute maximal cell widths in each column:
-            col_widths = [max(calculate_width(row[i]) for row in leaderboard_table) for i in range(len(leaderboard_table[0]))]
-
-            # Generate the table in a code block environment:
-            header_line = "-|-".join('-' * col_width for col_width in col_widths) + "\n"
-            display_table = "```\n"
-            for row in leaderboard_table:
-                padded_row = [pad_to_width(cell, col_widths[i]) for i, cell in enumerate(row)]
-                display_table += " | ".join(padded_row) + "\n"
-                if row == leaderboard_table[0]:
-                    display_table += header_line
-            display_table += "```"
-
-            await ctx.send(display_table)
+async def display_leaderboard(ctx, page='1'):
+
+    # Work out which page to show (your own team's page for "me"):
+    if page.lower() == 'me':
+        number = await team_page(str(ctx.author.id))
+        if number is None:
+            await ctx.send('You are not registered to a ranked team; showing the first page.')
+            number = 1
+    elif page.isdigit():
+        number = int(page)
+    else:
+        await ctx.send('Usage: `!leaderboard`, `!leaderboard <page>` or `!leaderboard me`.')
+        return
+
+    # The standings are kept in memory, and each page is only re-rendered after a change:
+    view = LeaderboardView(number)
+    view.message = await ctx.send(view.content(), view=view)
+
+# The leaderboard page containing a solver's team (None if they have no ranked team):
+async def team_page(user_id):
+    row = await membership.cache.get(user_id)
+    if row is None:
+        return None
+    place = leaderboard.board.place(row['team_id'])
+    if place is None:
+        return None
+    return leaderboard.board.page_of(place)
+
+# Render a page of the leaderboard (a list of team rows, in ranked order) as a text table:
+def build_leaderboard_table(teams, first_place=1, show_finish=True):
+    # Make a matrix of somewhat-reformatted leaderboard data:
+    team_place = first_place
+    leaderboard_table = [["#", "Team Name", "Score", "Last Solve", "Hunt Finish"]]
+    for row in teams:
+        last_solve_datetime = row['last_solve_time'].strftime('%m-%d %H:%M:%S')
+        if row['is_hunt_solved']:
+            display_team_name = '🔎' + row['team_name'] + '🔎'
+            hunt_solve_time = row['hunt_solve_time'].strftime('%m-%d %H:%M:%S')
+        else:
+            display_team_name = row['team_name']
+            hunt_solve_time = ''
+        team_data = [str(team_place), display_team_name, str(row['score']), last_solve_datetime, hunt_solve_time]
+        leaderboard_table.append(team_data)
+        team_place += 1
+
+    # Only display "Hunt Finish" column if at least one team has finished:
+    if show_finish == False:
+        leaderboard_table = [lb_row[:-1] for lb_row in leaderboard_table]
+
+    # Generate the table in a code block environment:
+    started = time.perf_counter()
+    table = tables.render_table(leaderboard_table)
+    metrics.observe(metrics.renders, 'leaderboard', time.perf_counter() - started)
+    return table
+
+# Previous/next buttons for paging through the leaderboard, plus a jump to your own team:
+class LeaderboardView(View):
+    def __init__(self, number):
+        super().__init__(timeout=300)
+        self.number = number
+        self.message = None
+        self.schema = db.current_schema.get() # Button presses are served from the same hunt
+
+    # Render the current page (clamping it to the pages that exist) with a footer:
+    def content(self):
+        self.number, table = leaderboard.board.render_page(self.number, build_leaderboard_table)
+        num_pages = leaderboard.board.num_pages()
+        self.previous_page.disabled = self.number <= 1
+        self.next_page.disabled = self.number >= num_pages
+        return f'{table}\nPage {self.number} of {num_pages}'
+
+    async def show(self, interaction):
+        with hunts.use(self.schema):
+            async with metrics.timed('leaderboard buttons'):
+                await interaction.response.edit_message(content=self.content(), view=self)
+
+    @button(label='◀ Previous', style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button):
+        self.number -= 1
+        await self.show(interaction)
+
+    @button(label='Next ▶', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button):
+        self.number += 1
+        await self.show(interaction)
+
+    @button(label='My Team', style=discord.ButtonStyle.primary)
+    async def my_team(self, interaction: discord.Interaction, button):
+        with hunts.use(self.schema):
+            number = await team_page(str(interaction.user.id))
+        if number is None:
+            await interaction.response.send_message('You are not registered to a ranked team.', ephemeral=True)
+            return
+        self.number = number
+        await self.show(interaction)
+
+    # Remove the buttons once they stop responding:
+    async def on_timeout(self):
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException: # e.g. the message was deleted
+                pass
 
 @display_leaderboard.error
 async def leaderboard_error(ctx, error):
@@ -403,6 +653,38 @@ async def leaderboard_error(ctx, error):
         raise error
 
 
+### LIVE LEADERBOARD ###########################################################
+
+@bot.command(name='liveboard', help='Post a live leaderboard in this channel, edited as standings change '
+    '(organizers only). Use !liveboard stop to stop updating it.')
+@is_organizer()
+async def live_leaderboard(ctx, action='start'):
+    if action.lower() == 'stop':
+        await liveboard.live.detach()
+        await ctx.send('The live leaderboard will no longer be updated.')
+        return
+
+    message = await ctx.send(render_live_leaderboard())
+    await liveboard.live.attach(ctx.channel.id, message.id)
+    try:
+        await message.pin()
+    except discord.HTTPException: # e.g. missing Manage Messages permission
+        await ctx.send('*Could not pin the live leaderboard; it will still be kept up to date.*')
+
+# Content of the live leaderboard message (the first page of the standings):
+def render_live_leaderboard():
+    table = leaderboard.board.render_page(1, build_leaderboard_table)[1]
+    return (f'**Live leaderboard** (top {leaderboard.PAGE_SIZE} teams, updated automatically)\n'
+        f'{table}\nDM the bot `!leaderboard` for the full standings.')
+
+@live_leaderboard.error
+async def live_leaderboard_error(ctx, error):
+    if isinstance(error, commands.CheckFailure):
+        await ctx.send("The `!liveboard` command is restricted to hunt organizers.")
+    else:
+        raise error
+
+
 ### !PUZZLES DASHBOARD #########################################################
 
 @bot.command(name='puzzles', help='Display a dashboard of available puzzles.')
@@ -412,81 +694,71 @@ async def display_puzzles(ctx):
     # Extract information about the user
     user_id = str(ctx.author.id) # As string to avoid DB integer overflows.
 
-    # Connect to the DB
-    config = load_config()
-    with psycopg2.connect(**config) as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            # Determine if the user is registered to a team:
-            sql = """SELECT * FROM solvers JOIN teams ON solvers.team_id = teams.team_id
-                WHERE discord_id = %s"""
-            data = (user_id,)
-            cur.execute(sql, data)
-            row = cur.fetchone()
-
-            is_registered = (row is not None)
-            if is_registered:
-                team_id = row['team_id']
-            else:
-                team_id = None
-
-            # In case this appears in a general channel, set team_id = None
-            if isinstance(ctx.channel, discord.DMChannel) == False:
-                team_id = None
-
-            # Form a dictionary of id:answer pairs for puzzles solved by this team
-                # Return id:None for unsolved puzzles
-            sql = """SELECT puzzles.puzzle_id, guess
-                    FROM puzzles LEFT JOIN guesslog ON puzzles.puzzle_id = guesslog.puzzle_id
-                    AND team_id = %s AND guess_status = 'correct' ORDER BY puzzles.puzzle_id ASC"""
-            data = (team_id,)
-            cur.execute(sql, data)
-            answer_dict = {row['puzzle_id'] : row['guess'] for row in cur}
-
-            # Gather total solve/guess counts from the database:
-            sql = """SELECT puzzles.puzzle_id AS p_id, puzzles.puzzle_name,
-                    COUNT(CASE WHEN guess_status = 'correct' THEN 1 END) AS num_solves,
-                    COUNT(CASE WHEN guess_status = 'incorrect' THEN 1 END) AS num_guesses
-                    FROM puzzles LEFT JOIN guesslog ON guesslog.puzzle_id = puzzles.puzzle_id
-                    GROUP BY puzzles.puzzle_id ORDER BY puzzles.puzzle_id ASC"""
-            cur.execute(sql)
-
-            # Make a matrix of somewhat-reformatted puzzle data:
-            puzzles_table = [["#", "Puzzle Name", "# Solves", "# Guesses", "Answer"]]
-            row_counter = 1
-            is_an_answer_known = False
-            for row in cur:
-                puzzle_id = row['p_id']
-                puzzle_name = row['puzzle_name']
-                num_solves = str(row['num_solves'])
-                num_guesses = str(row['num_guesses'])
-                if answer_dict[puzzle_id] is None:
-                    answer = ''
-                else:
-                    answer = answer_dict[puzzle_id]
-                    is_an_answer_known = True
-
-                puzzle_data = [str(row_counter), puzzle_name, num_solves, num_guesses, answer]
-                puzzles_table.append(puzzle_data)
-                row_counter += 1
-
-            # Only display "Answer" column if at least one answer is known:
-            if is_an_answer_known == False:
-                puzzles_table = [lb_row[:-1] for lb_row in puzzles_table]
-
-            # Compute maximal cell widths in each column:
-            col_widths = [max(calculate_width(row[i]) for row in puzzles_table) for i in range(len(puzzles_table[0]))]
-
-            # Generate the table in a code block environment:
-            header_line = "-|-".join('-' * col_width for col_width in col_widths) + "\n"
-            display_table = "```\n"
-            for row in puzzles_table:
-                padded_row = [pad_to_width(cell, col_widths[i]) for i, cell in enumerate(row)]
-                display_table += " | ".join(padded_row) + "\n"
-                if row == puzzles_table[0]:
-                    display_table += header_line
-            display_table += "```"
-
-            await ctx.send(display_table)
+    # Determine if the user is registered to a team:
+    row = await membership.cache.get(user_id)
+
+    is_registered = (row is not None)
+    if is_registered:
+        team_id = row['team_id']
+    else:
+        team_id = None
+
+    # In case this appears in a general channel, set team_id = None
+    if isinstance(ctx.channel, discord.DMChannel) == False:
+        team_id = None
+
+    # Show the team its own latest solves, even if the replica has yet to replay them:
+    db.read_own_writes(team_id)
+
+    # Borrow a connection in the read lane, so guesses are never starved:
+    async with db.cursor(db.READ) as cur:
+        # Form a dictionary of id:answer pairs for puzzles solved by this team
+            # Return id:None for unsolved puzzles
+            # (Solves are kept in team_solves, so the guesslog is not read at all.)
+        sql = """SELECT puzzles.puzzle_id, team_solves.guess
+                FROM puzzles LEFT JOIN team_solves ON team_solves.puzzle_id = puzzles.puzzle_id
+                AND team_solves.team_id = %s ORDER BY puzzles.puzzle_id ASC"""
+        data = (team_id,)
+        await cur.execute(sql, data)
+        answer_dict = {row['puzzle_id'] : row['guess'] for row in await cur.fetchall()}
+
+        # Gather total solve/guess counts from the per-puzzle counters:
+        sql = """SELECT puzzles.puzzle_id AS p_id, puzzles.puzzle_name,
+                COALESCE(puzzle_stats.num_solves, 0) AS num_solves,
+                COALESCE(puzzle_stats.num_guesses, 0) AS num_guesses
+                FROM puzzles LEFT JOIN puzzle_stats ON puzzle_stats.puzzle_id = puzzles.puzzle_id
+                ORDER BY puzzles.puzzle_id ASC"""
+        await cur.execute(sql)
+        puzzle_rows = await cur.fetchall()
+
+    # Make a matrix of somewhat-reformatted puzzle data:
+    puzzles_table = [["#", "Puzzle Name", "# Solves", "# Guesses", "Answer"]]
+    row_counter = 1
+    is_an_answer_known = False
+    for row in puzzle_rows:
+        puzzle_id = row['p_id']
+        puzzle_name = row['puzzle_name']
+        num_solves = str(row['num_solves'])
+        num_guesses = str(row['num_guesses'])
+        if answer_dict[puzzle_id] is None:
+            answer = ''
+        else:
+            answer = answer_dict[puzzle_id]
+            is_an_answer_known = True
+
+        puzzle_data = [str(row_counter), puzzle_name, num_solves, num_guesses, answer]
+        puzzles_table.append(puzzle_data)
+        row_counter += 1
+
+    # Only display "Answer" column if at least one answer is known:
+    if is_an_answer_known == False:
+        puzzles_table = [lb_row[:-1] for lb_row in puzzles_table]
+
+    # Generate the table in a code block environment:
+    started = time.perf_counter()
+    table = tables.render_table(puzzles_table)
+    metrics.observe(metrics.renders, 'puzzles', time.perf_counter() - started)
+    await ctx.send(table)
 
 @display_puzzles.error
 async def puzzles_error(ctx, error):
@@ -498,163 +770,243 @@ async def puzzles_error(ctx, error):
 
 ### GUESS PROCESSING BACKEND ###################################################
 
+# Sent when a team with no guesses left tries to guess:
+OUT_OF_GUESSES = ("Your team has run out of guesses. "
+    "To request additional guesses, contact the hunt organizers.")
+
+# Run the guess against the DB, returning the messages to send back to the user:
+    # The guess is classified against the in-memory answer index, then recorded by
+    # submit_guess() (see migrations.py) in one round trip and one transaction,
+    # so concurrent guesses cannot lose updates. In write-behind mode the guess is
+    # instead judged against in-memory team state and written in a later batch.
+async def record_guess(user, user_id, puzzle_id, guess):
+    replies = []
+
+    # Sanitize the guess:
+    sanitize_lower = answers.normalize_guess(guess)
+
+    # Look up the puzzle in the answer index:
+    puzzle_id = int(puzzle_id)
+    puzzle = answers.index.puzzle(puzzle_id)
+    if puzzle is None:
+        replies.append('That puzzle could not be found. Please try again via `!guess`.')
+        return replies
+
+    # Determine if the user is registered to a team:
+    row = await membership.cache.get(user_id)
+
+    # Restrict to registered users:
+        # This only matters if a user leaves a team mid-hunt and interacts with an old interface.
+    if row is None:
+        replies.append('The `!guess` command is only available to registered solvers.\n'
+            'To register, create a team via `!team create` or join a team via `!team join`.')
+        return replies
+
+    # Determine the correct response to the guess:
+    guess_status, response = answers.index.classify(puzzle_id, sanitize_lower)
+
+    data = (row['team_id'], puzzle_id, sanitize_lower, guess_status,
+        puzzle['puzzle_points'], puzzle['is_final_puzzle'])
+    if writebehind.writer.enabled:
+        # Judge the guess in memory and queue it for the next batched write:
+        result = await writebehind.writer.submit(*data)
+    else:
+        sql = """SELECT * FROM submit_guess(%s, %s, %s, %s, %s, %s)"""
+        result = await db.fetchone(sql, data)
+        db.note_write(row['team_id']) # For read-your-writes on the replica
+    outcome = result['outcome']
+
+    # The team vanished after the membership was cached (e.g. deleted elsewhere):
+    if outcome == 'unregistered':
+        membership.cache.invalidate(user_id)
+        replies.append('The `!guess` command is only available to registered solvers.\n'
+            'To register, create a team via `!team create` or join a team via `!team join`.')
+        return replies
+
+    # The team ran out of guesses (e.g. while using a picker sent earlier):
+    if outcome == 'no_guesses':
+        replies.append(OUT_OF_GUESSES)
+        return replies
+
+    # Echo input as confirmation
+    puzzle_name = puzzle['puzzle_name']
+    input_confirmation = f'{user} has guessed `{sanitize_lower}` on `{puzzle_name}`.'
+    replies.append(input_confirmation)
+
+    # Terminate if the puzzle has been solved:
+    if outcome == 'solved':
+        solves.solved.add(row['team_id'], puzzle_id)
+        solved_answer = result['solved_answer']
+        replies.append(f'Your team has already solved this puzzle with answer `{solved_answer}`.')
+        return replies
+
+    # Otherwise, output a response to the guess:
+    if guess_status == 'incorrect':
+        response = "Incorrect guess (no follow-up data available)."
+    replies.append(response)
+
+    # If the guess was a duplicate guess, it has been ignored:
+    if outcome == 'duplicate':
+        replies.append('*This was a duplicate guess and will be ignored.*')
+        return replies
+
+    # If the guess was correct, move the team up the standings:
+    if outcome == 'correct':
+        solves.solved.add(row['team_id'], puzzle_id)
+        analytics.cache.invalidate(puzzle_id)
+        leaderboard.board.update({
+            'team_id': row['team_id'],
+            'team_name': row['team_name'],
+            'score': result['score'],
+            'is_hunt_solved': result['is_hunt_solved'],
+            'last_solve_time': result['last_solve_time'],
+            'hunt_solve_time': result['hunt_solve_time'],
+            })
+
+    # If the guess was incorrect, a guess has been debited from the team:
+    if outcome == 'incorrect':
+        new_num_guesses = result['num_guesses']
+        if new_num_guesses != 1:
+            replies.append(f'*Your team has {new_num_guesses} guesses remaining.*')
+        else:
+            replies.append(f'*Your team has {new_num_guesses} guess remaining.*')
+
+    return replies
+
 async def process_guess(ctx, puzzle_id, guess):
 
     # Extract information about the user
     user = ctx.author.name
     user_id = str(ctx.author.id) # As string to avoid DB integer overflows.
 
-    # Connect to the DB
-    config = load_config()
-    with psycopg2.connect(**config) as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            # Determine if the user is registered to a team:
-            # TODO: Redundant; this information could be passed from gather_guess()
-            sql = """SELECT * FROM solvers JOIN teams ON solvers.team_id = teams.team_id
-                WHERE discord_id = %s"""
-            data = (user_id,)
-            cur.execute(sql, data)
-            row = cur.fetchone()
-
-            # Restrict to registered users:
-                # This only matters if a user leaves a team mid-hunt and interacts with an old interface.
-            if row is None:
-                await ctx.send('The `!guess` command is only available to registered solvers.\n'
-                    'To register, create a team via `!team create` or join a team via `!team join`.')
-                return
-
-            # Otherwise, the user is on a team:
-            team_id = row['team_id']
-            num_guesses = row['num_guesses']
-            team_score = row['score']
-
-            # Sanitize the guess:
-            sanitize = re.sub('[^A-Za-z0-9]+', '', guess)
-            sanitize_lower = sanitize.lower()
-
-            # Query the DB to determine the correct response to the guess:
-            sql = """SELECT puzzles.puzzle_id AS p_id, puzzles.puzzle_name AS p_name,
-                responses.response, is_answer, puzzle_points, is_final_puzzle,
-                CASE WHEN puzzles.puzzle_name IS NULL THEN 'bad_puzzle'
-                    WHEN responses.guess IS NULL THEN 'bad_guess'
-                    ELSE 'success'
-                END AS status
-                FROM puzzles LEFT JOIN responses ON puzzles.puzzle_id = responses.puzzle_id
-                AND responses.guess = %s
-                WHERE puzzles.puzzle_id = %s;"""
-            data = (sanitize_lower, puzzle_id)
-            cur.execute(sql, data)
-            guess_response_info = cur.fetchone()
-
-            # Echo input as confirmation
-            puzzle_name = guess_response_info['p_name']
-            input_confirmation = f'{user} has guessed `{sanitize_lower}` on `{puzzle_name}`.'
-            await ctx.send(input_confirmation)
-
-            # Query the guesslog to determine if:
-                # a. The puzzle has already been solved.
-                # b. The guess is a duplicate guess.
-            puzzle_id = guess_response_info['p_id']
-            sql = """SELECT
-                MAX(CASE WHEN guess_status = 'correct' THEN guess ELSE NULL END) AS solved_status,
-                MAX(CASE WHEN guess = %s THEN 1 ELSE 0 END) AS duplicate_status
-                FROM guesslog WHERE puzzle_id = %s AND team_id = %s;"""
-            data = (sanitize_lower, puzzle_id, team_id)
-            cur.execute(sql, data)
-            prior_guess_info = cur.fetchone()
-            solved_status = prior_guess_info['solved_status'] # None or [answer].
-            duplicate_status = prior_guess_info['duplicate_status'] # None, 0, or 1.
-
-            # Terminate if the puzzle has been solved:
-            if solved_status != None:
-                await ctx.send(f'Your team has already solved this puzzle with answer `{solved_status}`.')
-                return
-
-            # Otherwise, output a response to the guess:
-            status = guess_response_info['status']
-            if status == 'bad_guess':
-                guess_status = 'incorrect'
-                response = "Incorrect guess (no follow-up data available)."
-            else:
-                if guess_response_info['is_answer'] == True:
-                    guess_status = 'correct'
-                else:
-                    guess_status = 'partial'
-                response = guess_response_info['response']
-            await ctx.send(response)
-
-            # If the guess was a duplicate guess, terminate:
-            if duplicate_status == 1:
-                await ctx.send('*This was a duplicate guess and will be ignored.*')
-                return
-
-            # Otherwise, enter the guess into the guesslog:
-            sql = """INSERT INTO guesslog (puzzle_id, team_id, guess, guess_status)
-                    VALUES (%s, %s, %s, %s);"""
-            data = (puzzle_id, team_id, sanitize_lower, guess_status)
-            cur.execute(sql, data)
-
-            # If the guess was incorrect, debit a guess from the team:
-            if guess_status == 'incorrect':
-                new_num_guesses = num_guesses - 1
-                sql = """UPDATE teams SET num_guesses = %s WHERE team_id = %s"""
-                data = (new_num_guesses, team_id)
-                cur.execute(sql, data)
-
-                if new_num_guesses != 1:
-                    await ctx.send(f'*Your team has {new_num_guesses} guesses remaining.*')
-                else:
-                    await ctx.send(f'*Your team has {new_num_guesses} guess remaining.*')
-
-            # If the guess was correct, update points and last_solve_time:
-            if guess_status == 'correct':
-                puzzle_points = guess_response_info['puzzle_points']
-                sql = """UPDATE teams SET score = %s, last_solve_time = CURRENT_TIMESTAMP
-                    WHERE team_id = %s"""
-                data = (team_score + puzzle_points, team_id)
-                cur.execute(sql, data)
-
-                # And mark the team as "done" if this was the final puzzle:
-                is_final_puzzle = guess_response_info['is_final_puzzle']
-                if is_final_puzzle:
-                    sql = """UPDATE teams SET is_hunt_solved = %s,
-                        hunt_solve_time = CURRENT_TIMESTAMP WHERE team_id = %s"""
-                    data = (is_final_puzzle, team_id)
-                    cur.execute(sql, data)
+    # Process the guess in its team's queue, after any earlier guesses from teammates:
+        # (Unregistered users are turned away by record_guess without touching the database.)
+    row = await membership.cache.get(user_id)
+    if row is None:
+        replies = await record_guess(user, user_id, puzzle_id, guess)
+    else:
+        replies = await team_queue.queues.run(row['team_id'],
+            lambda: record_guess(user, user_id, puzzle_id, guess))
+
+    for reply in replies:
+        await ctx.send(reply)
 
 ### !GUESS  COMMAND ############################################################
 
-# Define classes for dropdown menus and short response forms:
-class DropdownView(View):
-    def __init__(self, options, ctx):
-        super().__init__()
-        self.ctx = ctx
-        self.add_item(SelectMenu(options, ctx))
-
-class SelectMenu(Select):
-    def __init__(self, options, ctx):
-        self.ctx = ctx
-        # Convert the dictionary 'options' to a list of SelectOption objects
-        select_options = [discord.SelectOption(label=label, value=value) for label, value in options.items()]
-        super().__init__(placeholder='Select a puzzle...', min_values=1, max_values=1, options=select_options)
+# Discord allows at most 25 options in a select menu, so longer puzzle lists are
+# split into pages with Previous/Next buttons:
+PICKER_PAGE_SIZE = 25
+
+# Guess forms carry their hunt and puzzle in their custom_id:
+    # (Forms from before multi-hunt support carry only the puzzle, of the default hunt.)
+GUESS_FORM_ID = re.compile(r'guess:form:(?:(?P<hunt>\d+):)?(?P<puzzle>\d+)')
+
+# The !guess picker and guess form keep no state in memory once sent.
+    # Every picker's select menu has the same custom_id and is handled by the one
+    # GuessPicker registered in setup_hook; the page buttons carry their hunt and
+    # page number, and the guess form its hunt and puzzle, in their custom_ids. So
+    # any number of pickers can be open at once, and they keep working across restarts.
+class GuessPicker(View):
+    def __init__(self, puzzles=(), hunt_id=None):
+        super().__init__(timeout=None)
+        self.puzzle_select.options = [discord.SelectOption(label=row['puzzle_name'][:100],
+            value=f"{hunt_id}:{row['puzzle_id']}") for row in puzzles]
+
     # Once a selection is made, display the short response form:
+    @select(custom_id='guess:puzzle', placeholder='Select a puzzle...', min_values=1, max_values=1)
+    async def puzzle_select(self, interaction: discord.Interaction, select):
+        async with metrics.timed('guess select'):
+            await interaction.response.send_modal(GuessForm(select.values[0]))
+
+class PickerPageButton(DynamicItem[Button], template=r'guess:page:(?:(?P<hunt>\d+):)?(?P<number>\d+)'):
+    def __init__(self, hunt_id, number, label, disabled=False):
+        super().__init__(Button(label=label, style=discord.ButtonStyle.secondary,
+            custom_id=f'guess:page:{hunt_id}:{number}', disabled=disabled, row=1))
+        self.hunt_id = hunt_id
+        self.number = number
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match['hunt'], int(match['number']), item.label)
+
+    # Show the requested page of the solver's team's (current) unsolved puzzles:
     async def callback(self, interaction: discord.Interaction):
-        selected_value = self.values[0]
-        await interaction.response.send_modal(ShortResponseModal(self.ctx, selected_value))
-
-class ShortResponseModal(Modal):
-    def __init__(self, ctx, selected_value):
-        self.ctx = ctx
-        self.selected_value = selected_value
-        super().__init__(title="Enter a Guess")
-
-        self.response = TextInput(label="Enter a Guess", placeholder="Type your guess here...", max_length=100)
-        self.add_item(self.response)
-    # Once a guess is entered, process that guess:
-    async def on_submit(self, interaction: discord.Interaction):
-        user_response = self.response.value
-        await interaction.response.defer(ephemeral=True)  # Acknowledge the interaction without sending a message
-        await process_guess(self.ctx, self.selected_value, user_response)
+        schema = interaction_hunt(self.hunt_id)
+        if schema is None:
+            await interaction.response.send_message('That hunt is no longer running.', ephemeral=True)
+            return
+        with hunts.use(schema):
+            async with metrics.timed('guess picker buttons'):
+                row = await membership.cache.get(str(interaction.user.id))
+                if row is None:
+                    await interaction.response.send_message('The `!guess` command is only available to '
+                        'registered solvers.', ephemeral=True)
+                    return
+                content, view = build_picker(row['team_id'], self.number)
+                await interaction.response.edit_message(content=content, view=view)
+
+class GuessForm(Modal):
+    def __init__(self, selected_value): # "<hunt_id>:<puzzle_id>"
+        super().__init__(title="Enter a Guess", timeout=None, custom_id=f'guess:form:{selected_value}')
+        self.add_item(TextInput(label="Enter a Guess", placeholder="Type your guess here...",
+            max_length=100, custom_id='guess'))
+        # The submission is handled by submit_guess_form, so don't keep this form in memory:
+        self.stop()
+
+# Build a page of the guess picker for a team, returning (content, view):
+def build_picker(team_id, number=1):
+    puzzles = solves.solved.unsolved(team_id, answers.index.puzzles.values())
+    if not puzzles:
+        return 'Your team has solved every puzzle!', None
+    num_pages = (len(puzzles) - 1) // PICKER_PAGE_SIZE + 1
+    number = min(max(number, 1), num_pages)
+    start = (number - 1) * PICKER_PAGE_SIZE
+    hunt_id = hunts.registry.current()['hunt_id']
+    view = GuessPicker(puzzles[start:start + PICKER_PAGE_SIZE], hunt_id)
+    content = 'Please select a puzzle to continue:'
+    if num_pages > 1:
+        view.add_item(PickerPageButton(hunt_id, number - 1, '◀ Previous', disabled=number <= 1))
+        view.add_item(PickerPageButton(hunt_id, number + 1, 'Next ▶', disabled=number >= num_pages))
+        content = f'Please select a puzzle to continue (page {number} of {num_pages}):'
+    # Send the components without keeping the view in memory:
+    view.stop()
+    return content, view
+
+# The schema of the hunt named in a component's custom_id (None if it is not running):
+def interaction_hunt(hunt_id):
+    if hunt_id is None:
+        return db.DEFAULT_SCHEMA if db.DEFAULT_SCHEMA in hunts.registry.hunts else None
+    return hunts.registry.schema_for_id(int(hunt_id))
+
+# Stands in for the command context when a guess arrives through an interaction:
+class InteractionContext:
+    __slots__ = ('author', 'channel')
+
+    def __init__(self, interaction):
+        self.author = interaction.user
+        self.channel = interaction.channel
+
+    async def send(self, content):
+        return await self.channel.send(content)
+
+# Once a guess is entered, process that guess:
+@bot.listen('on_interaction')
+async def submit_guess_form(interaction: discord.Interaction):
+    if interaction.type != discord.InteractionType.modal_submit:
+        return
+    match = GUESS_FORM_ID.fullmatch(interaction.data.get('custom_id', ''))
+    if match is None:
+        return
+    schema = interaction_hunt(match['hunt'])
+    if schema is None:
+        await interaction.response.send_message('That hunt is no longer running.', ephemeral=True)
+        return
+    guess = next(component['value'] for action_row in interaction.data['components']
+        for component in action_row['components'])
+    with hunts.use(schema):
+        async with metrics.timed('guess modal'):
+            await interaction.response.defer(ephemeral=True)  # Acknowledge the interaction without sending a message
+            await process_guess(InteractionContext(interaction), match['puzzle'], guess)
 
 @bot.command(name='guess', help='Launch the interface for guess submission.')
 @is_dm()
@@ -663,42 +1015,109 @@ async def gather_guess(ctx):
     # Extract information about the user
     user_id = str(ctx.author.id) # As string to avoid DB integer overflows.
 
-    # Connect to the DB
-    config = load_config()
-    with psycopg2.connect(**config) as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            # Determine if the user is registered to a team:
-            sql = """SELECT * FROM solvers JOIN teams ON solvers.team_id = teams.team_id
-                WHERE discord_id = %s"""
-            data = (user_id,)
-            cur.execute(sql, data)
-            row = cur.fetchone()
-
-            # Restrict to registered users:
-            if row is None:
-                await ctx.send('The `!guess` command is only available to registered solvers.\n'
-                    'To register, create a team via `!team create` or join a team via `!team join`.')
-                return
-
-            # TODO: Gather full team data and pass this along to process_guess()
-            num_guesses = row['num_guesses']
-
-            # Refuse to process a guess attempt when the team has 0 guesses left:
-            if num_guesses < 1:
-                await ctx.send("Your team has run out of guesses. "
-                    "To request additional guesses, contact the hunt organizers.")
-                return
-
-            # Generate a list of puzzles that the team can select from:
-                # TODO: Restrict to unsolved puzzles
-            sql = """SELECT puzzle_id, puzzle_name from puzzles ORDER BY puzzle_id ASC"""
-            cur.execute(sql)
-            puzzle_dict = {row['puzzle_name']: row['puzzle_id'] for row in cur}
-
-            # Launch the data entry user interface:
-            view = DropdownView(puzzle_dict, ctx)
-            await ctx.send("Please select a puzzle to continue:", view=view)
+    # Determine if the user is registered to a team:
+    row = await membership.cache.get(user_id)
+
+    # Restrict to registered users:
+    if row is None:
+        await ctx.send('The `!guess` command is only available to registered solvers.\n'
+            'To register, create a team via `!team create` or join a team via `!team join`.')
+        return
+
+    # Read the team's remaining guesses (counters are never cached):
+        # In write-behind mode the in-memory team state is ahead of the database.
+    if writebehind.writer.enabled:
+        num_guesses = (await team_state.states.get(row['team_id'])).num_guesses
+    else:
+        sql = """SELECT num_guesses FROM teams WHERE team_id = %s"""
+        data = (row['team_id'],)
+        num_guesses = (await db.fetchone(sql, data))['num_guesses']
+
+    # Refuse to process a guess attempt when the team has 0 guesses left:
+    if num_guesses < 1:
+        await ctx.send(OUT_OF_GUESSES)
+        return
+
+    # Launch the data entry user interface, listing the team's unsolved puzzles:
+        # (Solves are held in memory, so this needs no guesslog query.)
+    content, view = build_picker(row['team_id'])
+    if view is None:
+        await ctx.send(content)
+    else:
+        await ctx.send(content, view=view)
+
+### !RELOAD ####################################################################
+
+@bot.command(name='reload', help='Reload puzzles, responses and standings from the database (organizers only).')
+@is_organizer()
+async def reload_answers(ctx):
+    # Write out queued guesses and drop team state in one step (under the writer's
+    # flush lock), so that reloaded team state includes every guess judged so far:
+    if writebehind.writer.enabled:
+        await writebehind.writer.flush_and_reset(team_state.states.clear)
+    else:
+        team_state.states.clear()
+    membership.cache.clear()
+    analytics.cache.clear()
+    num_puzzles, num_responses = await answers.index.load()
+    num_teams = await leaderboard.board.load()
+    await solves.solved.load()
+    await ctx.send(f'Reloaded {num_puzzles} puzzles, {num_responses} responses and {num_teams} teams.')
+
+@reload_answers.error
+async def reload_error(ctx, error):
+    if isinstance(error, commands.CheckFailure):
+        await ctx.send("The `!reload` command is restricted to hunt organizers.")
+    else:
+        raise error
+
+### !ANALYTICS #################################################################
+
+@bot.command(name='analytics', help='Show solve statistics for every puzzle, or in detail for one puzzle '
+    '(organizers only). Use !analytics <puzzle number or name>.')
+@is_organizer_anywhere()
+async def display_analytics(ctx, *, puzzle=None):
+    if puzzle is None:
+        pages = await analytics.cache.summary()
+    else:
+        # Accept a puzzle number or (case-insensitive) name:
+        puzzle_row = answers.index.puzzle(int(puzzle)) if puzzle.isdigit() else None
+        if puzzle_row is None:
+            puzzle_row = next((row for row in answers.index.puzzles.values()
+                if row['puzzle_name'].lower() == puzzle.lower()), None)
+        if puzzle_row is None:
+            await ctx.send(f'Could not find the puzzle "{puzzle}".')
+            return
+        pages = [f"**{puzzle_row['puzzle_name']}**\n" + page
+            for page in await analytics.cache.puzzle(puzzle_row['puzzle_id'])]
+
+    # Results are cached until the puzzle is next solved, so repeated calls are cheap:
+    for page in pages:
+        await ctx.send(page)
+
+@display_analytics.error
+async def analytics_error(ctx, error):
+    if isinstance(error, commands.CheckFailure):
+        await ctx.send("The `!analytics` command is restricted to hunt organizers.")
+    else:
+        raise error
+
+### !STATS #####################################################################
+
+@bot.command(name='stats', help='Show command latencies, database timings and queue statistics (organizers only).')
+@is_organizer()
+async def display_stats(ctx):
+    await ctx.send(f'```\n{metrics.summary(bot.latency)}\n```')
+
+@display_stats.error
+async def stats_error(ctx, error):
+    if isinstance(error, commands.CheckFailure):
+        await ctx.send("The `!stats` command is restricted to hunt organizers.")
+    else:
+        raise error
 
 ### RUN SCRIPT #################################################################
 
-bot.run(TOKEN)
+# (Guarded so that benchmarks can import the command handlers without connecting.)
+if __name__ == '__main__':
+    bot.run(TOKEN)
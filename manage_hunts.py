@@ -0,0 +1,131 @@
+### LOAD LIBRARIES #############################################################
+import argparse
+import re
+import sys
+
+import psycopg2
+from psycopg2 import sql as pgsql
+from config import load_config
+import migrations
+
+# Register and manage the hunts one bot serves. Each hunt keeps its own tables in
+# its own Postgres schema, and is played in one Discord server:
+    # python manage_hunts.py create "Practice Hunt" --guild 123456789012345678
+    # python manage_hunts.py list
+    # python manage_hunts.py set-guild "Practice Hunt" 123456789012345678
+    # python manage_hunts.py deactivate "Practice Hunt"
+# Running bots pick up the changes straight away. The other scripts (load_hunt.py,
+# register_teams.py, export_guesslog.py, audit_scores.py) take --hunt <name>.
+
+### CONNECTING #################################################################
+
+class HuntError(Exception):
+    pass
+
+# Look up a hunt by name (or schema), returning its row:
+def find_hunt(conn, hunt):
+    with conn.cursor() as cur:
+        cur.execute("""SELECT hunt_id, hunt_name, schema_name, guild_id, is_active FROM public.hunts
+            WHERE lower(hunt_name) = lower(%s) OR schema_name = %s""", (hunt, hunt))
+        row = cur.fetchone()
+    if row is None:
+        raise HuntError(f'There is no hunt named "{hunt}" (see python manage_hunts.py list).')
+    return row
+
+# Connect to the database, with the named hunt's tables on the search path (or the
+# default hunt's, if hunt is None):
+def connect(hunt=None):
+    conn = psycopg2.connect(**load_config())
+    if hunt is not None:
+        try:
+            migrations.use_schema(conn, find_hunt(conn, hunt)[2])
+        except Exception:
+            conn.close()
+            raise
+    return conn
+
+### COMMANDS ###################################################################
+
+# Derive a schema name such as hunt_practice_hunt from a hunt's name:
+def schema_for_name(hunt_name):
+    slug = re.sub('[^a-z0-9]+', '_', hunt_name.lower()).strip('_')
+    return f'hunt_{slug}'[:63]
+
+# Create a hunt's schema and migrate its tables, then register it:
+    # The hunt is only registered once its tables exist, since registering it
+    # notifies the running bot, which starts serving the hunt straight away.
+def create_hunt(conn, hunt_name, guild_id=None, schema=None):
+    schema = schema or schema_for_name(hunt_name)
+    if not migrations.SCHEMA_NAME.fullmatch(schema) or schema == 'public':
+        raise HuntError(f'Invalid schema name "{schema}"; use --schema.')
+    migrations.migrate(conn, 'public') # Creates public.hunts if needed
+    with conn.cursor() as cur:
+        cur.execute("""SELECT hunt_name FROM public.hunts
+            WHERE hunt_name = %s OR schema_name = %s OR guild_id = %s""", (hunt_name, schema, guild_id))
+        existing = cur.fetchone()
+        if existing is not None:
+            raise HuntError(f'"{existing[0]}" already has that name, schema or server.')
+        cur.execute(pgsql.SQL('CREATE SCHEMA IF NOT EXISTS {}').format(pgsql.Identifier(schema)))
+    conn.commit()
+    migrations.migrate(conn, schema)
+    with conn.cursor() as cur:
+        cur.execute("""INSERT INTO public.hunts (hunt_name, schema_name, guild_id) VALUES (%s, %s, %s)""",
+            (hunt_name, schema, guild_id))
+    conn.commit()
+    return schema
+
+def list_hunts(conn):
+    with conn.cursor() as cur:
+        cur.execute("""SELECT hunt_id, hunt_name, schema_name, guild_id, is_active FROM public.hunts
+            ORDER BY hunt_id ASC""")
+        for hunt_id, hunt_name, schema, guild_id, is_active in cur.fetchall():
+            print(f"{hunt_id}: {hunt_name} (schema {schema}, server {guild_id or 'DISCORD_GUILD'})"
+                + ('' if is_active else ' [inactive]'))
+
+def update_hunt(conn, hunt, column, value):
+    hunt_id = find_hunt(conn, hunt)[0]
+    with conn.cursor() as cur:
+        cur.execute(pgsql.SQL('UPDATE public.hunts SET {} = %s WHERE hunt_id = %s').format(
+            pgsql.Identifier(column)), (value, hunt_id))
+    conn.commit()
+
+### RUN SCRIPT #################################################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Register and manage the hunts served by the bot.')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    create = subparsers.add_parser('create', help='create a hunt with its own tables')
+    create.add_argument('name')
+    create.add_argument('--guild', type=int, help="the hunt's Discord server ID")
+    create.add_argument('--schema', help='Postgres schema for its tables (default: from the name)')
+    subparsers.add_parser('list', help='list every hunt')
+    set_guild = subparsers.add_parser('set-guild', help="change a hunt's Discord server ('none' to clear)")
+    set_guild.add_argument('name')
+    set_guild.add_argument('guild')
+    for action in ('activate', 'deactivate'):
+        subparsers.add_parser(action, help=f'{action} a hunt (its data is kept)').add_argument('name')
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(**load_config())
+    try:
+        if args.action == 'create':
+            schema = create_hunt(conn, args.name, args.guild, args.schema)
+            print(f'Created "{args.name}" in schema {schema}. Load its content with '
+                f'python load_hunt.py <directory or .yaml file> --hunt "{args.name}".')
+        elif args.action == 'list':
+            list_hunts(conn)
+        elif args.action == 'set-guild':
+            guild_id = None if args.guild.lower() == 'none' else int(args.guild)
+            update_hunt(conn, args.name, 'guild_id', guild_id)
+        else:
+            update_hunt(conn, args.name, 'is_active', args.action == 'activate')
+    except (HuntError, ValueError, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        print(error)
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
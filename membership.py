@@ -0,0 +1,78 @@
+### LOAD LIBRARIES #############################################################
+import time
+from collections import OrderedDict # Keeps cache entries in least-recently-used order
+
+import db
+import hunts
+
+### SOLVER -> TEAM MEMBERSHIP CACHE ############################################
+
+# Bounded LRU/TTL cache from a solver's discord_id to their team membership.
+    # Entries hold only fields that never change while the membership lasts
+    # (team_id, team_name, is_captain); mutable counters such as score and
+    # num_guesses must always be read from the database.
+    # The !team create/join/leave/delete commands invalidate entries explicitly;
+    # the TTL only bounds staleness from edits made outside the bot.
+class MembershipCache:
+    def __init__(self, max_size=10000, ttl=300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict() # discord_id -> (expiry, membership or None)
+        self.generation = 0 # Bumped whenever many entries are invalidated at once
+        self.key_generations = {} # discord_id -> times invalidated since the last clear()
+        self.hits = 0
+        self.misses = 0
+
+    # Resolve a solver's team, returning None if they are not registered:
+    async def get(self, discord_id):
+        cached = self.entries.get(discord_id)
+        if cached is not None and cached[0] > time.monotonic():
+            self.entries.move_to_end(discord_id)
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        generation = self.generation_of(discord_id)
+        sql = """SELECT solvers.discord_id, solvers.is_captain, teams.team_id, teams.team_name
+            FROM solvers JOIN teams ON solvers.team_id = teams.team_id
+            WHERE discord_id = %s"""
+        data = (discord_id,)
+        membership = await db.fetchone(sql, data)
+        # Only cache the result if the solver was not invalidated while the query ran,
+            # since it may predate a concurrent !team join, leave or delete:
+        if self.generation_of(discord_id) == generation:
+            self.put(discord_id, membership)
+        return membership
+
+    def generation_of(self, discord_id):
+        return (self.generation, self.key_generations.get(discord_id, 0))
+
+    # Store a lookup result (None records that the solver is unregistered):
+    def put(self, discord_id, membership):
+        self.entries[discord_id] = (time.monotonic() + self.ttl, membership)
+        self.entries.move_to_end(discord_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    # Forget a single solver (after they create, join or leave a team):
+    def invalidate(self, discord_id):
+        self.entries.pop(discord_id, None)
+        self.key_generations[discord_id] = self.key_generations.get(discord_id, 0) + 1
+
+    # Forget every cached member of a team (after the team is deleted):
+    def invalidate_team(self, team_id):
+        stale = [discord_id for discord_id, (expiry, membership) in self.entries.items()
+            if membership is not None and membership['team_id'] == team_id]
+        for discord_id in stale:
+            del self.entries[discord_id]
+        # (Members being looked up right now have no entry yet, so every lookup in
+            # flight is treated as stale.)
+        self.generation += 1
+
+    # Forget everything (e.g. after teams are registered in bulk outside the bot):
+    def clear(self):
+        self.entries.clear()
+        self.key_generations.clear()
+        self.generation += 1
+
+cache = hunts.PerHunt(MembershipCache)
@@ -0,0 +1,254 @@
+### LOAD LIBRARIES #############################################################
+import time
+from contextlib import asynccontextmanager
+
+from aiohttp import web # Installed with discord.py; serves the metrics endpoint
+
+import analytics
+import db
+import hunts
+import membership
+import leaderboard
+import liveboard
+import partitions
+import team_queue
+import writebehind
+from config import load_metrics_config
+
+### LATENCY HISTOGRAMS #########################################################
+
+# Bucket upper bounds (seconds), from a fast in-memory reply to a stuck command:
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# A Prometheus-style histogram (fixed buckets plus a running count and sum):
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last slot counts values above every bucket
+        self.count = 0
+        self.total = 0.0
+        self.failures = 0
+
+    def observe(self, seconds, failed=False):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        if failed:
+            self.failures += 1
+
+    # Upper bound of the bucket holding the q-th quantile (inf if beyond the last):
+    def quantile(self, q):
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+# Timings by name, e.g. "guess" for the !guess command or "guess modal" for its form:
+commands = {}
+renders = {} # Table rendering, separate from the commands that trigger it
+
+def observe(histograms, name, seconds, failed=False):
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms[name] = Histogram()
+    histogram.observe(seconds, failed)
+
+# Time a block of code (e.g. a modal or select callback) as if it were a command:
+@asynccontextmanager
+async def timed(name, histograms=commands):
+    started = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        observe(histograms, name, time.perf_counter() - started, failed)
+
+### STATS SUMMARY ##############################################################
+
+started_at = time.monotonic()
+
+# A compact plain-text report for the !stats command (kept under Discord's limit).
+    # Timings and the pool cover every hunt; queue and cache figures are the current hunt's.
+def summary(gateway_latency=None):
+    lines = [f'Uptime {(time.monotonic() - started_at) / 3600:.1f} h'
+        + (f', gateway latency {gateway_latency * 1000:.0f} ms' if gateway_latency is not None else '')]
+
+    lines.append('')
+    lines.append('Commands: count  mean  p95  failures')
+    for name, histogram in sorted(commands.items(), key=lambda item: -item[1].count):
+        lines.append(f'  {name}: {histogram.count}  {histogram.mean() * 1000:.0f} ms  '
+            f'<={histogram.quantile(0.95) * 1000:.0f} ms  {histogram.failures}')
+    for name, histogram in sorted(renders.items()):
+        lines.append(f'  render {name}: {histogram.count}  {histogram.mean() * 1000:.1f} ms')
+
+    lines.append('')
+    lines.append('SQL (top 5 by total time): calls  mean  max')
+    busiest = sorted(db.statement_stats.items(), key=lambda item: -item[1].total_time)[:5]
+    for name, stats in busiest:
+        lines.append(f'  {name[:60]}: {stats.calls}  {stats.total_time / stats.calls * 1000:.1f} ms  '
+            f'{stats.max_time * 1000:.0f} ms' + (f'  ({stats.errors} errors)' if stats.errors else ''))
+
+    lines.append('')
+    if db.pool is not None:
+        pool_stats = db.pool.get_stats()
+        lines.append(f"Pool: {pool_stats.get('pool_size', 0)} open, {pool_stats.get('pool_available', 0)} idle, "
+            f"{pool_stats.get('requests_waiting', 0)} waiting; shared by {len(db.schemas)} hunts")
+    for lane, stats in db.lane_stats.items():
+        lines.append(f'  {lane} lane: {stats.in_flight} in use (peak {stats.max_in_flight}), '
+            f'{stats.waiting} waiting, {stats.borrows} borrows, '
+            f'{stats.wait_time / stats.borrows * 1000 if stats.borrows else 0:.1f} ms mean wait')
+    if db.replica is not None:
+        staleness = db.replica_staleness()
+        replica = db.replica_stats
+        lines.append(f"Replica: {'never caught up' if staleness is None else f'{staleness:.1f} s behind at most'}, "
+            f'{replica.reads} reads; {replica.stale_reads} stale and {replica.own_writes} read-your-writes '
+            f'reads sent to the primary')
+
+    totals = team_queue.queues.totals()
+    lines.append(f"Team queues: {totals['active_teams']} active, {totals['queued']} queued, "
+        f"{totals['mean_wait'] * 1000:.1f} ms mean wait, {totals['max_wait'] * 1000:.0f} ms max")
+    hot = ', '.join(f'team {team_id} ({depth})' for team_id, depth in team_queue.queues.hot_teams(5) if depth)
+    if hot:
+        lines.append(f'  busiest: {hot}')
+
+    writer = writebehind.writer
+    if writer.enabled:
+        lines.append(f'Write-behind: {writer.queue_depth()} queued (peak {writer.max_queue_depth}), '
+            f'{writer.rows_flushed} written in {writer.batches_flushed} batches, {writer.flush_failures} failures')
+
+    cache = membership.cache
+    lookups = cache.hits + cache.misses
+    lines.append(f'Membership cache: {len(cache.entries)} entries, '
+        f'{cache.hits / lookups if lookups else 0:.0%} hit rate')
+    lookups = analytics.cache.hits + analytics.cache.misses
+    lines.append(f'Analytics cache: {len(analytics.cache.cached)} results, '
+        f'{analytics.cache.hits / lookups if lookups else 0:.0%} hit rate')
+    lines.append(f'Leaderboard: {len(leaderboard.board.teams)} teams; '
+        f'live message edits {liveboard.live.edits} ({liveboard.live.edit_failures} failed)')
+
+    text = '\n'.join(lines)
+    return text if len(text) <= 1990 else text[:1987] + '...'
+
+### PROMETHEUS EXPOSITION ######################################################
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def histogram_lines(metric, label, histograms):
+    lines = [f'# TYPE {metric} histogram']
+    for name, histogram in histograms.items():
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{{label}="{escape(name)}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{{label}="{escape(name)}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{metric}_sum{{{label}="{escape(name)}"}} {histogram.total}')
+        lines.append(f'{metric}_count{{{label}="{escape(name)}"}} {histogram.count}')
+    return lines
+
+# Per-statement metrics, as (metric, type, StatementStats field):
+SQL_METRICS = (
+    ('huntbot_sql_calls_total', 'counter', 'calls'),
+    ('huntbot_sql_errors_total', 'counter', 'errors'),
+    ('huntbot_sql_seconds_total', 'counter', 'total_time'),
+    ('huntbot_sql_max_seconds', 'gauge', 'max_time'),
+)
+
+# Render every metric in the Prometheus text exposition format:
+def render_prometheus():
+    lines = histogram_lines('huntbot_command_seconds', 'command', commands)
+    lines.append('# TYPE huntbot_command_failures_total counter')
+    for name, histogram in commands.items():
+        lines.append(f'huntbot_command_failures_total{{command="{escape(name)}"}} {histogram.failures}')
+    lines += histogram_lines('huntbot_render_seconds', 'table', renders)
+
+    for metric, kind, field in SQL_METRICS:
+        lines.append(f'# TYPE {metric} {kind}')
+        for name, stats in db.statement_stats.items():
+            lines.append(f'{metric}{{statement="{escape(name)}"}} {getattr(stats, field)}')
+
+    lines.append('# TYPE huntbot_lane gauge')
+    for lane, stats in db.lane_stats.items():
+        for field, value in stats.as_dict().items():
+            lines.append(f'huntbot_lane{{lane="{lane}",field="{field}"}} {value}')
+    if db.replica is not None:
+        for field, value in db.replica_stats.as_dict().items():
+            lines.append(f'# TYPE huntbot_replica_{field}_total counter')
+            lines.append(f'huntbot_replica_{field}_total {value}')
+        staleness = db.replica_staleness()
+        if staleness is not None:
+            lines.append('# TYPE huntbot_replica_staleness_seconds gauge')
+            lines.append(f'huntbot_replica_staleness_seconds {staleness}')
+    lines.append('# TYPE huntbot_pool gauge')
+    for name, source in (('primary', db.pool), ('replica', db.replica)):
+        if source is not None:
+            for field, value in source.get_stats().items():
+                lines.append(f'huntbot_pool{{server="{name}",field="{escape(field)}"}} {value}')
+
+    # Per-hunt gauges and counters, labelled with each hunt's schema:
+    gauges = {} # metric -> [(schema, value)]
+    for schema in hunts.registry.hunts:
+        with hunts.use(schema):
+            totals = team_queue.queues.totals()
+            values = {
+                'huntbot_team_queue_depth': totals['queued'],
+                'huntbot_team_queue_active_teams': totals['active_teams'],
+                'huntbot_team_queue_max_wait_seconds': totals['max_wait'],
+                'huntbot_writebehind_queue_depth': writebehind.writer.queue_depth(),
+                'huntbot_writebehind_rows_flushed_total': writebehind.writer.rows_flushed,
+                'huntbot_writebehind_flush_failures_total': writebehind.writer.flush_failures,
+                'huntbot_membership_cache_hits_total': membership.cache.hits,
+                'huntbot_membership_cache_misses_total': membership.cache.misses,
+                'huntbot_analytics_cache_hits_total': analytics.cache.hits,
+                'huntbot_analytics_cache_misses_total': analytics.cache.misses,
+                'huntbot_leaderboard_teams': len(leaderboard.board.teams),
+                'huntbot_live_leaderboard_edits_total': liveboard.live.edits,
+                'huntbot_guesslog_partitions_created_total': partitions.upkeep.partitions_created,
+                'huntbot_guesslog_partition_failures_total': partitions.upkeep.failures,
+            }
+        for metric, value in values.items():
+            gauges.setdefault(metric, []).append((schema, value))
+    for metric, samples in gauges.items():
+        lines.append(f'# TYPE {metric} {"counter" if metric.endswith("_total") else "gauge"}')
+        for schema, value in samples:
+            lines.append(f'{metric}{{hunt="{escape(schema)}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+### METRICS ENDPOINT ###########################################################
+
+runner = None
+
+# Serve /metrics over HTTP if enabled in the [metrics] settings:
+async def start_server():
+    global runner
+    settings = load_metrics_config()
+    if not settings['enabled']:
+        return
+
+    async def handle_metrics(request):
+        return web.Response(text=render_prometheus(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, settings['host'], settings['port']).start()
+    print(f"Serving metrics on http://{settings['host']}:{settings['port']}/metrics")
+
+async def stop_server():
+    global runner
+    if runner is not None:
+        await runner.cleanup()
+        runner = None
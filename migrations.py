@@ -0,0 +1,797 @@
+### LOAD LIBRARIES #############################################################
+import sys
+import json # To read EXPLAIN output
+import re # To check schema names
+import psycopg2
+from config import load_config
+
+### MIGRATIONS #################################################################
+
+# Every schema change, in order. Each migration runs in its own transaction and is
+# recorded in schema_migrations, so running migrate() against a live database only
+# applies what is missing and never drops data. Append new migrations to the end
+# of this list; never edit one that has already been released.
+MIGRATIONS = [
+    (1, 'Create the base tables', (
+        """ CREATE TABLE IF NOT EXISTS puzzles (
+            puzzle_id SERIAL PRIMARY KEY,
+            puzzle_name VARCHAR(255) NOT NULL,
+            puzzle_points INTEGER NOT NULL,
+            is_final_puzzle BOOLEAN NOT NULL) """,
+        """ CREATE TABLE IF NOT EXISTS responses (
+            response_id SERIAL PRIMARY KEY,
+            puzzle_id INTEGER NOT NULL,
+            guess VARCHAR(255),
+            is_answer BOOLEAN DEFAULT FALSE,
+            response VARCHAR(255) NOT NULL) """,
+        """ CREATE TABLE IF NOT EXISTS guesslog (
+            guess_id SERIAL PRIMARY KEY,
+            puzzle_id INTEGER NOT NULL,
+            team_id INTEGER NOT NULL,
+            guess VARCHAR(255),
+            guess_status VARCHAR(20),
+            guess_time TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP) """,
+        """ CREATE TABLE IF NOT EXISTS solvers (
+            solver_id SERIAL PRIMARY KEY,
+            discord_id VARCHAR(255) NOT NULL,
+            discord_name VARCHAR(255) NOT NULL,
+            team_id INTEGER NOT NULL,
+            is_captain BOOLEAN NOT NULL) """,
+        """ CREATE TABLE IF NOT EXISTS teams (
+            team_id SERIAL PRIMARY KEY,
+            team_name VARCHAR(255) NOT NULL,
+            team_token VARCHAR(20) NOT NULL,
+            num_guesses INTEGER DEFAULT 50,
+            score INTEGER DEFAULT 0,
+            is_hunt_solved BOOLEAN DEFAULT FALSE,
+            is_deleted BOOLEAN DEFAULT FALSE,
+            last_solve_time TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            hunt_solve_time TIMESTAMP WITH TIME ZONE DEFAULT NULL)""",
+        )),
+
+    (2, 'Add per-puzzle solve/guess counters', (
+        # Per-puzzle solve and incorrect-guess counts, kept current by submit_guess():
+            # (This lets the !puzzles dashboard skip aggregating the whole guesslog.)
+        """ CREATE TABLE IF NOT EXISTS puzzle_stats (
+            puzzle_id INTEGER PRIMARY KEY,
+            num_solves INTEGER NOT NULL DEFAULT 0,
+            num_guesses INTEGER NOT NULL DEFAULT 0) """,
+        # Recompute puzzle_stats from the guesslog (to repair drifted counters):
+            # guesslog is locked against writes so that no guess is counted twice or missed.
+        """ CREATE OR REPLACE FUNCTION rebuild_puzzle_stats() RETURNS INTEGER
+            LANGUAGE plpgsql AS $$
+            DECLARE
+                v_num_puzzles INTEGER;
+            BEGIN
+                LOCK TABLE guesslog IN SHARE MODE;
+                DELETE FROM puzzle_stats;
+                INSERT INTO puzzle_stats (puzzle_id, num_solves, num_guesses)
+                    SELECT puzzles.puzzle_id,
+                        COUNT(CASE WHEN guess_status = 'correct' THEN 1 END),
+                        COUNT(CASE WHEN guess_status = 'incorrect' THEN 1 END)
+                    FROM puzzles LEFT JOIN guesslog ON guesslog.puzzle_id = puzzles.puzzle_id
+                    GROUP BY puzzles.puzzle_id;
+                GET DIAGNOSTICS v_num_puzzles = ROW_COUNT;
+                RETURN v_num_puzzles;
+            END $$ """,
+        """ SELECT rebuild_puzzle_stats() """,
+        )),
+
+    (3, 'Process guesses with submit_guess()', (
+        # Record a guess in a single round trip:
+            # dedupe -> log -> debit/score -> mark final solve.
+            # The bot resolves the solver's team from its membership cache and classifies
+            # the guess with its in-memory answer index (answers.py), passing in the
+            # result along with the puzzle's points.
+            # The team row is locked first, so simultaneous guesses from teammates
+            # are applied one after another instead of overwriting each other.
+        """ CREATE OR REPLACE FUNCTION submit_guess(
+                p_team_id INTEGER, p_puzzle_id INTEGER, p_guess VARCHAR,
+                p_guess_status VARCHAR, p_puzzle_points INTEGER, p_is_final_puzzle BOOLEAN)
+            RETURNS TABLE (
+                outcome VARCHAR, -- unregistered/solved/duplicate/correct/partial/incorrect
+                solved_answer VARCHAR,
+                num_guesses INTEGER,
+                -- The team's standings after a correct guess (NULL otherwise):
+                score INTEGER,
+                is_hunt_solved BOOLEAN,
+                last_solve_time TIMESTAMP WITH TIME ZONE,
+                hunt_solve_time TIMESTAMP WITH TIME ZONE)
+            LANGUAGE plpgsql AS $$
+            #variable_conflict use_column
+            DECLARE
+                v_team teams%ROWTYPE;
+            BEGIN
+                SELECT * INTO v_team FROM teams
+                    WHERE teams.team_id = p_team_id AND teams.is_deleted = FALSE
+                    FOR UPDATE;
+                IF NOT FOUND THEN
+                    outcome := 'unregistered';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+                num_guesses := v_team.num_guesses;
+
+                SELECT guesslog.guess INTO solved_answer FROM guesslog
+                    WHERE guesslog.team_id = v_team.team_id
+                    AND guesslog.puzzle_id = p_puzzle_id
+                    AND guesslog.guess_status = 'correct'
+                    LIMIT 1;
+                IF FOUND THEN
+                    outcome := 'solved';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+
+                PERFORM 1 FROM guesslog
+                    WHERE guesslog.team_id = v_team.team_id
+                    AND guesslog.puzzle_id = p_puzzle_id
+                    AND guesslog.guess = p_guess;
+                IF FOUND THEN
+                    outcome := 'duplicate';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+
+                INSERT INTO guesslog (puzzle_id, team_id, guess, guess_status)
+                    VALUES (p_puzzle_id, v_team.team_id, p_guess, p_guess_status);
+
+                IF p_guess_status IN ('correct', 'incorrect') THEN
+                    INSERT INTO puzzle_stats AS stats (puzzle_id, num_solves, num_guesses)
+                        VALUES (p_puzzle_id,
+                            CASE WHEN p_guess_status = 'correct' THEN 1 ELSE 0 END,
+                            CASE WHEN p_guess_status = 'incorrect' THEN 1 ELSE 0 END)
+                        ON CONFLICT (puzzle_id) DO UPDATE
+                        SET num_solves = stats.num_solves + EXCLUDED.num_solves,
+                            num_guesses = stats.num_guesses + EXCLUDED.num_guesses;
+                END IF;
+
+                IF p_guess_status = 'incorrect' THEN
+                    UPDATE teams SET num_guesses = teams.num_guesses - 1
+                        WHERE teams.team_id = v_team.team_id
+                        RETURNING teams.num_guesses INTO num_guesses;
+                ELSIF p_guess_status = 'correct' THEN
+                    UPDATE teams SET score = teams.score + p_puzzle_points,
+                        last_solve_time = CURRENT_TIMESTAMP,
+                        is_hunt_solved = teams.is_hunt_solved OR p_is_final_puzzle,
+                        hunt_solve_time = CASE WHEN p_is_final_puzzle
+                            THEN CURRENT_TIMESTAMP ELSE teams.hunt_solve_time END
+                        WHERE teams.team_id = v_team.team_id
+                        RETURNING teams.score, teams.is_hunt_solved,
+                            teams.last_solve_time, teams.hunt_solve_time
+                        INTO score, is_hunt_solved, last_solve_time, hunt_solve_time;
+                END IF;
+
+                outcome := p_guess_status;
+                RETURN NEXT;
+            END $$ """,
+        )),
+
+    (4, 'Notify the bot when hunt content changes', (
+        # Tell running bots to reload their answer index when hunt content changes:
+        """ CREATE OR REPLACE FUNCTION notify_hunt_content() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                PERFORM pg_notify('hunt_content', TG_TABLE_NAME);
+                RETURN NULL;
+            END $$ """,
+        """ DROP TRIGGER IF EXISTS puzzles_notify_hunt_content ON puzzles """,
+        """ CREATE TRIGGER puzzles_notify_hunt_content
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON puzzles
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_hunt_content() """,
+        """ DROP TRIGGER IF EXISTS responses_notify_hunt_content ON responses """,
+        """ CREATE TRIGGER responses_notify_hunt_content
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON responses
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_hunt_content() """,
+        )),
+
+    (5, 'Add indexes, uniqueness constraints and foreign keys', (
+        # Before adding the unique constraints, stop registrations until this migration
+        # commits and report any existing duplicates (which must be resolved by hand,
+        # since the bot cannot tell which row is right):
+        """ LOCK TABLE solvers, teams IN SHARE MODE """,
+        """ DO $$
+            DECLARE
+                v_duplicates TEXT;
+            BEGIN
+                SELECT string_agg(format('discord_id %s (solver_ids %s)', discord_id, solver_ids), '; ')
+                    INTO v_duplicates
+                    FROM (SELECT discord_id, string_agg(solver_id::TEXT, ', ' ORDER BY solver_id) AS solver_ids
+                        FROM solvers GROUP BY discord_id HAVING count(*) > 1) AS duplicates;
+                IF v_duplicates IS NOT NULL THEN
+                    RAISE EXCEPTION 'Solvers are registered more than once: %', v_duplicates
+                        USING HINT = 'Delete the extra solvers rows, then run the migrations again.';
+                END IF;
+
+                SELECT string_agg(format('team_token %s (team_ids %s)', team_token, team_ids), '; ')
+                    INTO v_duplicates
+                    FROM (SELECT team_token, string_agg(team_id::TEXT, ', ' ORDER BY team_id) AS team_ids
+                        FROM teams GROUP BY team_token HAVING count(*) > 1) AS duplicates;
+                IF v_duplicates IS NOT NULL THEN
+                    RAISE EXCEPTION 'Teams share a join token: %', v_duplicates
+                        USING HINT = 'Give each of these teams a new team_token, then run the migrations again.';
+                END IF;
+            END $$ """,
+        # Hot lookups: a solver's team, a team by its join token, and a team's
+        # prior guesses on a puzzle (for the solved and duplicate checks):
+        """ ALTER TABLE solvers ADD CONSTRAINT solvers_discord_id_key UNIQUE (discord_id) """,
+        """ ALTER TABLE teams ADD CONSTRAINT teams_team_token_key UNIQUE (team_token) """,
+        """ CREATE INDEX IF NOT EXISTS solvers_team_id_idx ON solvers (team_id) """,
+        """ CREATE INDEX IF NOT EXISTS responses_puzzle_guess_idx ON responses (puzzle_id, guess) """,
+        """ CREATE INDEX IF NOT EXISTS guesslog_team_puzzle_guess_idx
+            ON guesslog (team_id, puzzle_id, guess) """,
+        # Correct solves are a small fraction of the guesslog; a partial index keeps
+        # the solved check and the dashboard's per-team answers cheap:
+        """ CREATE INDEX IF NOT EXISTS guesslog_correct_idx
+            ON guesslog (team_id, puzzle_id) INCLUDE (guess)
+            WHERE guess_status = 'correct' """,
+        # Foreign keys are added NOT VALID (a brief lock, no table scan) and checked
+        # against existing rows by the next migration:
+        """ ALTER TABLE responses ADD CONSTRAINT responses_puzzle_id_fkey
+            FOREIGN KEY (puzzle_id) REFERENCES puzzles (puzzle_id) ON DELETE CASCADE NOT VALID """,
+        """ ALTER TABLE puzzle_stats ADD CONSTRAINT puzzle_stats_puzzle_id_fkey
+            FOREIGN KEY (puzzle_id) REFERENCES puzzles (puzzle_id) ON DELETE CASCADE NOT VALID """,
+        """ ALTER TABLE guesslog ADD CONSTRAINT guesslog_puzzle_id_fkey
+            FOREIGN KEY (puzzle_id) REFERENCES puzzles (puzzle_id) NOT VALID """,
+        """ ALTER TABLE guesslog ADD CONSTRAINT guesslog_team_id_fkey
+            FOREIGN KEY (team_id) REFERENCES teams (team_id) NOT VALID """,
+        """ ALTER TABLE solvers ADD CONSTRAINT solvers_team_id_fkey
+            FOREIGN KEY (team_id) REFERENCES teams (team_id) NOT VALID """,
+        )),
+
+    (6, 'Validate foreign keys against existing rows', (
+        # Validation only takes a SHARE UPDATE EXCLUSIVE lock, so guesses keep flowing:
+        """ ALTER TABLE responses VALIDATE CONSTRAINT responses_puzzle_id_fkey """,
+        """ ALTER TABLE puzzle_stats VALIDATE CONSTRAINT puzzle_stats_puzzle_id_fkey """,
+        """ ALTER TABLE guesslog VALIDATE CONSTRAINT guesslog_puzzle_id_fkey """,
+        """ ALTER TABLE guesslog VALIDATE CONSTRAINT guesslog_team_id_fkey """,
+        """ ALTER TABLE solvers VALIDATE CONSTRAINT solvers_team_id_fkey """,
+        )),
+    (7, 'Store bot settings (e.g. the live leaderboard message)', (
+        """ CREATE TABLE IF NOT EXISTS bot_settings (
+                setting_name VARCHAR(50) PRIMARY KEY,
+                setting_value TEXT NOT NULL) """,
+        )),
+    (8, 'Make puzzle names and (puzzle, guess) responses unique', (
+        # Before adding the unique constraints, stop content edits until this migration
+        # commits and report any existing duplicates (which must be resolved by hand,
+        # since the bot cannot tell which row is right):
+        """ LOCK TABLE puzzles, responses IN SHARE MODE """,
+        """ DO $$
+            DECLARE
+                v_duplicates TEXT;
+            BEGIN
+                SELECT string_agg(format('puzzle_name %s (puzzle_ids %s)', puzzle_name, puzzle_ids), '; ')
+                    INTO v_duplicates
+                    FROM (SELECT puzzle_name, string_agg(puzzle_id::TEXT, ', ' ORDER BY puzzle_id) AS puzzle_ids
+                        FROM puzzles GROUP BY puzzle_name HAVING count(*) > 1) AS duplicates;
+                IF v_duplicates IS NOT NULL THEN
+                    RAISE EXCEPTION 'Puzzles share a name: %', v_duplicates
+                        USING HINT = 'Rename or delete the extra puzzles, then run the migrations again.';
+                END IF;
+
+                SELECT string_agg(format('puzzle_id %s guess %L (response_ids %s)', puzzle_id, guess, response_ids), '; ')
+                    INTO v_duplicates
+                    FROM (SELECT puzzle_id, guess, string_agg(response_id::TEXT, ', ' ORDER BY response_id) AS response_ids
+                        FROM responses WHERE guess IS NOT NULL
+                        GROUP BY puzzle_id, guess HAVING count(*) > 1) AS duplicates;
+                IF v_duplicates IS NOT NULL THEN
+                    RAISE EXCEPTION 'Puzzles have more than one response to a guess: %', v_duplicates
+                        USING HINT = 'Delete the extra responses rows, then run the migrations again.';
+                END IF;
+            END $$ """,
+        # load_hunt.py upserts content by these keys; the unique constraint on
+        # responses also takes over from the plain lookup index:
+        """ ALTER TABLE puzzles ADD CONSTRAINT puzzles_puzzle_name_key UNIQUE (puzzle_name) """,
+        """ ALTER TABLE responses ADD CONSTRAINT responses_puzzle_guess_key UNIQUE (puzzle_id, guess) """,
+        """ DROP INDEX IF EXISTS responses_puzzle_guess_idx """,
+        )),
+    (9, 'Register hunts, each with its own schema', (
+        # Each hunt keeps its tables in its own schema; public.hunts lists them with
+        # their Discord servers. The tables in the public schema are the "default"
+        # hunt. (Every hunt's schema runs this migration too; the public objects are
+        # created only once.)
+        """ CREATE TABLE IF NOT EXISTS public.hunts (
+            hunt_id SERIAL PRIMARY KEY,
+            hunt_name VARCHAR(100) NOT NULL UNIQUE,
+            schema_name VARCHAR(63) NOT NULL UNIQUE,
+            guild_id BIGINT UNIQUE,
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP) """,
+        """ INSERT INTO public.hunts (hunt_name, schema_name) VALUES ('default', 'public')
+            ON CONFLICT DO NOTHING """,
+        # Tell running bots to start or stop hunts as they are registered or changed:
+        """ CREATE OR REPLACE FUNCTION public.notify_hunts() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                PERFORM pg_notify('hunts', '');
+                RETURN NULL;
+            END $$ """,
+        """ DROP TRIGGER IF EXISTS hunts_notify_hunts ON public.hunts """,
+        """ CREATE TRIGGER hunts_notify_hunts
+            AFTER INSERT OR UPDATE OR DELETE ON public.hunts
+            FOR EACH STATEMENT EXECUTE FUNCTION public.notify_hunts() """,
+        # Name the schema whose content changed, so only that hunt's index reloads:
+        """ CREATE OR REPLACE FUNCTION notify_hunt_content() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                PERFORM pg_notify('hunt_content', TG_TABLE_SCHEMA);
+                RETURN NULL;
+            END $$ """,
+        )),
+    (10, 'Partition the guesslog by day, and keep solves and guesses in their own tables', (
+        # Each team's solves (one row per puzzle), so the solved check and the !puzzles
+        # dashboard read this small table instead of the guesslog:
+        """ CREATE TABLE IF NOT EXISTS team_solves (
+            team_id INTEGER NOT NULL REFERENCES teams (team_id),
+            puzzle_id INTEGER NOT NULL REFERENCES puzzles (puzzle_id),
+            guess VARCHAR(255),
+            solve_time TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (team_id, puzzle_id)) """,
+        """ INSERT INTO team_solves (team_id, puzzle_id, guess, solve_time)
+            SELECT DISTINCT ON (team_id, puzzle_id) team_id, puzzle_id, guess,
+                COALESCE(guess_time, CURRENT_TIMESTAMP)
+            FROM guesslog WHERE guess_status = 'correct'
+            ORDER BY team_id, puzzle_id, guess_id ASC
+            ON CONFLICT DO NOTHING """,
+        # Each distinct guess a team has made at each puzzle, so the duplicate check
+            # (and anything else that needs every guess) still works once old days of
+            # the guesslog are archived:
+        """ CREATE TABLE IF NOT EXISTS team_guesses (
+            team_id INTEGER NOT NULL REFERENCES teams (team_id),
+            puzzle_id INTEGER NOT NULL REFERENCES puzzles (puzzle_id),
+            guess VARCHAR(255) NOT NULL,
+            guess_status VARCHAR(20),
+            PRIMARY KEY (team_id, puzzle_id, guess)) """,
+        """ INSERT INTO team_guesses (team_id, puzzle_id, guess, guess_status)
+            SELECT DISTINCT ON (team_id, puzzle_id, guess) team_id, puzzle_id, guess, guess_status
+            FROM guesslog WHERE guess IS NOT NULL
+            ORDER BY team_id, puzzle_id, guess, guess_id ASC
+            ON CONFLICT DO NOTHING """,
+        # Days exported and detached from the guesslog by archive_guesslog.py:
+        """ CREATE TABLE IF NOT EXISTS guesslog_archives (
+            day DATE PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            num_rows INTEGER NOT NULL,
+            archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP) """,
+        # The guesslog becomes a table partitioned by (UTC) day: new guesses only ever
+        # go into the current day's partition, finished days are never written to
+        # again (so vacuum passes over them), and old days can be detached and
+        # archived (see archive_guesslog.py). Rows outside every day's partition
+        # land in guesslog_default until that day's partition is created.
+        """ ALTER TABLE guesslog RENAME TO guesslog_unpartitioned """,
+        """ ALTER SEQUENCE guesslog_guess_id_seq OWNED BY NONE """,
+        """ CREATE TABLE guesslog (
+            guess_id INTEGER NOT NULL DEFAULT nextval('guesslog_guess_id_seq'),
+            puzzle_id INTEGER NOT NULL,
+            team_id INTEGER NOT NULL,
+            guess VARCHAR(255),
+            guess_status VARCHAR(20),
+            guess_time TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP)
+            PARTITION BY RANGE (guess_time) """,
+        """ ALTER SEQUENCE guesslog_guess_id_seq OWNED BY guesslog.guess_id """,
+        """ CREATE TABLE guesslog_default PARTITION OF guesslog DEFAULT """,
+        # Create the partitions (named guesslog_YYYYMMDD) for a range of days, returning
+        # how many were new. Any of a day's rows already in guesslog_default are moved
+        # into its new partition.
+        """ CREATE OR REPLACE FUNCTION create_guesslog_partitions(p_first DATE, p_last DATE)
+            RETURNS INTEGER
+            LANGUAGE plpgsql AS $$
+            DECLARE
+                v_day DATE;
+                v_name VARCHAR;
+                v_from TIMESTAMP WITH TIME ZONE;
+                v_to TIMESTAMP WITH TIME ZONE;
+                v_created INTEGER := 0;
+            BEGIN
+                FOR v_day IN SELECT generate_series(p_first, p_last, INTERVAL '1 day')::DATE LOOP
+                    v_name := 'guesslog_' || to_char(v_day, 'YYYYMMDD');
+                    CONTINUE WHEN to_regclass(v_name) IS NOT NULL;
+                    v_from := v_day::TIMESTAMP AT TIME ZONE 'UTC';
+                    v_to := (v_day + 1)::TIMESTAMP AT TIME ZONE 'UTC';
+                    IF EXISTS (SELECT 1 FROM guesslog_default
+                            WHERE guess_time >= v_from AND guess_time < v_to) THEN
+                        EXECUTE format('CREATE TABLE %I (LIKE guesslog INCLUDING DEFAULTS)', v_name);
+                        EXECUTE format('WITH moved AS (DELETE FROM guesslog_default
+                            WHERE guess_time >= %L AND guess_time < %L RETURNING *)
+                            INSERT INTO %I SELECT * FROM moved', v_from, v_to, v_name);
+                        EXECUTE format('ALTER TABLE guesslog ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                            v_name, v_from, v_to);
+                    ELSE
+                        EXECUTE format('CREATE TABLE %I PARTITION OF guesslog FOR VALUES FROM (%L) TO (%L)',
+                            v_name, v_from, v_to);
+                    END IF;
+                    v_created := v_created + 1;
+                END LOOP;
+                RETURN v_created;
+            END $$ """,
+        # Partitions for every day with guesses, and for the next few days (the bot
+        # keeps creating days ahead; see partitions.py):
+        """ SELECT create_guesslog_partitions(day, day) FROM (
+            SELECT DISTINCT (guess_time AT TIME ZONE 'UTC')::DATE AS day
+            FROM guesslog_unpartitioned WHERE guess_time IS NOT NULL) AS days """,
+        """ SELECT create_guesslog_partitions((CURRENT_TIMESTAMP AT TIME ZONE 'UTC')::DATE,
+            (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')::DATE + 3) """,
+        """ INSERT INTO guesslog (guess_id, puzzle_id, team_id, guess, guess_status, guess_time)
+            SELECT guess_id, puzzle_id, team_id, guess, guess_status, COALESCE(guess_time, 'epoch')
+            FROM guesslog_unpartitioned """,
+        """ DROP TABLE guesslog_unpartitioned """,
+        # Indexes and keys are built once the rows are in, on every partition at once.
+        # (The solved and duplicate checks no longer read the guesslog, so its
+            # guesslog_correct_idx and guesslog_team_puzzle_guess_idx indexes go.)
+        """ ALTER TABLE guesslog ADD PRIMARY KEY (guess_id, guess_time) """,
+        """ ALTER TABLE guesslog ADD CONSTRAINT guesslog_puzzle_id_fkey
+            FOREIGN KEY (puzzle_id) REFERENCES puzzles (puzzle_id) """,
+        """ ALTER TABLE guesslog ADD CONSTRAINT guesslog_team_id_fkey
+            FOREIGN KEY (team_id) REFERENCES teams (team_id) """,
+        # Recompute puzzle_stats from team_solves and team_guesses, which (unlike the
+            # guesslog) still hold archived days' guesses:
+        """ CREATE OR REPLACE FUNCTION rebuild_puzzle_stats() RETURNS INTEGER
+            LANGUAGE plpgsql AS $$
+            DECLARE
+                v_num_puzzles INTEGER;
+            BEGIN
+                LOCK TABLE team_solves, team_guesses IN SHARE MODE;
+                DELETE FROM puzzle_stats;
+                INSERT INTO puzzle_stats (puzzle_id, num_solves, num_guesses)
+                    SELECT puzzles.puzzle_id,
+                        (SELECT COUNT(*) FROM team_solves
+                            WHERE team_solves.puzzle_id = puzzles.puzzle_id),
+                        (SELECT COUNT(*) FROM team_guesses
+                            WHERE team_guesses.puzzle_id = puzzles.puzzle_id
+                            AND team_guesses.guess_status = 'incorrect')
+                    FROM puzzles;
+                GET DIAGNOSTICS v_num_puzzles = ROW_COUNT;
+                RETURN v_num_puzzles;
+            END $$ """,
+        # submit_guess() checks for a solve in team_solves and for a duplicate in
+            # team_guesses, and records new solves and guesses there:
+        """ CREATE OR REPLACE FUNCTION submit_guess(
+                p_team_id INTEGER, p_puzzle_id INTEGER, p_guess VARCHAR,
+                p_guess_status VARCHAR, p_puzzle_points INTEGER, p_is_final_puzzle BOOLEAN)
+            RETURNS TABLE (
+                outcome VARCHAR, -- unregistered/solved/duplicate/correct/partial/incorrect
+                solved_answer VARCHAR,
+                num_guesses INTEGER,
+                -- The team's standings after a correct guess (NULL otherwise):
+                score INTEGER,
+                is_hunt_solved BOOLEAN,
+                last_solve_time TIMESTAMP WITH TIME ZONE,
+                hunt_solve_time TIMESTAMP WITH TIME ZONE)
+            LANGUAGE plpgsql AS $$
+            #variable_conflict use_column
+            DECLARE
+                v_team teams%ROWTYPE;
+            BEGIN
+                SELECT * INTO v_team FROM teams
+                    WHERE teams.team_id = p_team_id AND teams.is_deleted = FALSE
+                    FOR UPDATE;
+                IF NOT FOUND THEN
+                    outcome := 'unregistered';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+                num_guesses := v_team.num_guesses;
+
+                SELECT team_solves.guess INTO solved_answer FROM team_solves
+                    WHERE team_solves.team_id = v_team.team_id
+                    AND team_solves.puzzle_id = p_puzzle_id;
+                IF FOUND THEN
+                    outcome := 'solved';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+
+                PERFORM 1 FROM team_guesses
+                    WHERE team_guesses.team_id = v_team.team_id
+                    AND team_guesses.puzzle_id = p_puzzle_id
+                    AND team_guesses.guess = p_guess;
+                IF FOUND THEN
+                    outcome := 'duplicate';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+
+                INSERT INTO guesslog (puzzle_id, team_id, guess, guess_status)
+                    VALUES (p_puzzle_id, v_team.team_id, p_guess, p_guess_status);
+                INSERT INTO team_guesses (team_id, puzzle_id, guess, guess_status)
+                    VALUES (v_team.team_id, p_puzzle_id, p_guess, p_guess_status);
+
+                IF p_guess_status IN ('correct', 'incorrect') THEN
+                    INSERT INTO puzzle_stats AS stats (puzzle_id, num_solves, num_guesses)
+                        VALUES (p_puzzle_id,
+                            CASE WHEN p_guess_status = 'correct' THEN 1 ELSE 0 END,
+                            CASE WHEN p_guess_status = 'incorrect' THEN 1 ELSE 0 END)
+                        ON CONFLICT (puzzle_id) DO UPDATE
+                        SET num_solves = stats.num_solves + EXCLUDED.num_solves,
+                            num_guesses = stats.num_guesses + EXCLUDED.num_guesses;
+                END IF;
+
+                IF p_guess_status = 'incorrect' THEN
+                    UPDATE teams SET num_guesses = teams.num_guesses - 1
+                        WHERE teams.team_id = v_team.team_id
+                        RETURNING teams.num_guesses INTO num_guesses;
+                ELSIF p_guess_status = 'correct' THEN
+                    INSERT INTO team_solves (team_id, puzzle_id, guess)
+                        VALUES (v_team.team_id, p_puzzle_id, p_guess);
+                    UPDATE teams SET score = teams.score + p_puzzle_points,
+                        last_solve_time = CURRENT_TIMESTAMP,
+                        is_hunt_solved = teams.is_hunt_solved OR p_is_final_puzzle,
+                        hunt_solve_time = CASE WHEN p_is_final_puzzle
+                            THEN CURRENT_TIMESTAMP ELSE teams.hunt_solve_time END
+                        WHERE teams.team_id = v_team.team_id
+                        RETURNING teams.score, teams.is_hunt_solved,
+                            teams.last_solve_time, teams.hunt_solve_time
+                        INTO score, is_hunt_solved, last_solve_time, hunt_solve_time;
+                END IF;
+
+                outcome := p_guess_status;
+                RETURN NEXT;
+            END $$ """,
+        )),
+
+    (11, 'Refuse guesses from teams with no guesses remaining', (
+        # submit_guess() turns away a new guess once the team's guesses run out (old
+        # !guess pickers and forms stay usable, so the check cannot only be in !guess):
+        """ CREATE OR REPLACE FUNCTION submit_guess(
+                p_team_id INTEGER, p_puzzle_id INTEGER, p_guess VARCHAR,
+                p_guess_status VARCHAR, p_puzzle_points INTEGER, p_is_final_puzzle BOOLEAN)
+            RETURNS TABLE (
+                outcome VARCHAR, -- unregistered/solved/duplicate/no_guesses/correct/partial/incorrect
+                solved_answer VARCHAR,
+                num_guesses INTEGER,
+                -- The team's standings after a correct guess (NULL otherwise):
+                score INTEGER,
+                is_hunt_solved BOOLEAN,
+                last_solve_time TIMESTAMP WITH TIME ZONE,
+                hunt_solve_time TIMESTAMP WITH TIME ZONE)
+            LANGUAGE plpgsql AS $$
+            #variable_conflict use_column
+            DECLARE
+                v_team teams%ROWTYPE;
+            BEGIN
+                SELECT * INTO v_team FROM teams
+                    WHERE teams.team_id = p_team_id AND teams.is_deleted = FALSE
+                    FOR UPDATE;
+                IF NOT FOUND THEN
+                    outcome := 'unregistered';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+                num_guesses := v_team.num_guesses;
+
+                SELECT team_solves.guess INTO solved_answer FROM team_solves
+                    WHERE team_solves.team_id = v_team.team_id
+                    AND team_solves.puzzle_id = p_puzzle_id;
+                IF FOUND THEN
+                    outcome := 'solved';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+
+                PERFORM 1 FROM team_guesses
+                    WHERE team_guesses.team_id = v_team.team_id
+                    AND team_guesses.puzzle_id = p_puzzle_id
+                    AND team_guesses.guess = p_guess;
+                IF FOUND THEN
+                    outcome := 'duplicate';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+
+                IF v_team.num_guesses < 1 THEN
+                    outcome := 'no_guesses';
+                    RETURN NEXT;
+                    RETURN;
+                END IF;
+
+                INSERT INTO guesslog (puzzle_id, team_id, guess, guess_status)
+                    VALUES (p_puzzle_id, v_team.team_id, p_guess, p_guess_status);
+                INSERT INTO team_guesses (team_id, puzzle_id, guess, guess_status)
+                    VALUES (v_team.team_id, p_puzzle_id, p_guess, p_guess_status);
+
+                IF p_guess_status IN ('correct', 'incorrect') THEN
+                    INSERT INTO puzzle_stats AS stats (puzzle_id, num_solves, num_guesses)
+                        VALUES (p_puzzle_id,
+                            CASE WHEN p_guess_status = 'correct' THEN 1 ELSE 0 END,
+                            CASE WHEN p_guess_status = 'incorrect' THEN 1 ELSE 0 END)
+                        ON CONFLICT (puzzle_id) DO UPDATE
+                        SET num_solves = stats.num_solves + EXCLUDED.num_solves,
+                            num_guesses = stats.num_guesses + EXCLUDED.num_guesses;
+                END IF;
+
+                IF p_guess_status = 'incorrect' THEN
+                    UPDATE teams SET num_guesses = teams.num_guesses - 1
+                        WHERE teams.team_id = v_team.team_id
+                        RETURNING teams.num_guesses INTO num_guesses;
+                ELSIF p_guess_status = 'correct' THEN
+                    INSERT INTO team_solves (team_id, puzzle_id, guess)
+                        VALUES (v_team.team_id, p_puzzle_id, p_guess);
+                    UPDATE teams SET score = teams.score + p_puzzle_points,
+                        last_solve_time = CURRENT_TIMESTAMP,
+                        is_hunt_solved = teams.is_hunt_solved OR p_is_final_puzzle,
+                        hunt_solve_time = CASE WHEN p_is_final_puzzle
+                            THEN CURRENT_TIMESTAMP ELSE teams.hunt_solve_time END
+                        WHERE teams.team_id = v_team.team_id
+                        RETURNING teams.score, teams.is_hunt_solved,
+                            teams.last_solve_time, teams.hunt_solve_time
+                        INTO score, is_hunt_solved, last_solve_time, hunt_solve_time;
+                END IF;
+
+                outcome := p_guess_status;
+                RETURN NEXT;
+            END $$ """,
+        )),
+]
+
+# Schema names are used unquoted (e.g. in search_path), so keep them simple:
+SCHEMA_NAME = re.compile(r'[a-z_][a-z0-9_]{0,62}')
+
+### RUNNER #####################################################################
+
+# Arbitrary key for the advisory lock that stops two runners migrating at once:
+MIGRATION_LOCK_ID = 4866
+
+# Point a connection's session at a hunt's schema:
+def use_schema(conn, schema):
+    if not SCHEMA_NAME.fullmatch(schema):
+        raise ValueError(f'Invalid schema name "{schema}".')
+    with conn.cursor() as cur:
+        cur.execute("SELECT set_config('search_path', %s, false)", (schema,))
+    conn.commit()
+
+# Apply every pending migration in order to one hunt's schema, returning the
+# versions applied:
+def migrate(conn, schema='public'):
+    applied = []
+    use_schema(conn, schema)
+    with conn.cursor() as cur:
+        cur.execute(""" CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP) """)
+        conn.commit()
+
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            cur.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cur.fetchall()}
+            for version, description, commands in MIGRATIONS:
+                if version in done:
+                    continue
+                # Each migration commits (or rolls back) as a unit:
+                try:
+                    for command in commands:
+                        cur.execute(command)
+                    cur.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (version, description))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    print(f'Migration {version} ({description}) failed in {schema}; no changes were made by it.')
+                    raise
+                print(f'Applied migration {version} to {schema}: {description}')
+                applied.append(version)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+
+    if not applied:
+        print(f'The {schema} schema is up to date.')
+    return applied
+
+# The schemas of every registered hunt (just public before hunts are registered):
+def hunt_schemas(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('public.hunts') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return ['public']
+        cur.execute("SELECT schema_name FROM public.hunts ORDER BY hunt_id ASC")
+        return [row[0] for row in cur.fetchall()]
+
+# Migrate the public schema, then every other registered hunt's schema:
+def migrate_all(conn):
+    applied = {'public': migrate(conn, 'public')}
+    for schema in hunt_schemas(conn):
+        if schema != 'public':
+            applied[schema] = migrate(conn, schema)
+    return applied
+
+# Print each migration and whether it has been applied:
+def print_status(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        done = {}
+        if cur.fetchone()[0]:
+            cur.execute("SELECT version, applied_at FROM schema_migrations")
+            done = dict(cur.fetchall())
+    for version, description, commands in MIGRATIONS:
+        if version in done:
+            applied_at = done[version].strftime('%Y-%m-%d %H:%M:%S')
+            print(f'[x] {version}: {description} (applied {applied_at})')
+        else:
+            print(f'[ ] {version}: {description}')
+
+### QUERY PLAN CHECKS ##########################################################
+
+# The bot's hot queries, with the index each one is expected to use:
+HOT_QUERIES = [
+    ("Resolve a solver's team",
+        """SELECT solvers.discord_id, solvers.is_captain, teams.team_id, teams.team_name
+            FROM solvers JOIN teams ON solvers.team_id = teams.team_id
+            WHERE discord_id = %s""",
+        ('0',), 'solvers_discord_id_key'),
+    ("Find a team by its token",
+        """SELECT * FROM teams WHERE team_token = %s""",
+        ('token',), 'teams_team_token_key'),
+    ("List a team's members",
+        """SELECT solver_id FROM solvers WHERE team_id = %s""",
+        (0,), 'solvers_team_id_idx'),
+    ("Check whether a team has solved a puzzle",
+        """SELECT guess FROM team_solves WHERE team_id = %s AND puzzle_id = %s""",
+        (0, 0), 'team_solves_pkey'),
+    ("Check for a duplicate guess",
+        """SELECT 1 FROM team_guesses WHERE team_id = %s AND puzzle_id = %s AND guess = %s""",
+        (0, 0, 'guess'), 'team_guesses_pkey'),
+    ("List a team's answers for !puzzles",
+        """SELECT puzzles.puzzle_id, team_solves.guess
+            FROM puzzles LEFT JOIN team_solves ON team_solves.puzzle_id = puzzles.puzzle_id
+            AND team_solves.team_id = %s ORDER BY puzzles.puzzle_id ASC""",
+        (0,), 'team_solves_pkey'),
+    ("Look up the response to a guess",
+        """SELECT response, is_answer FROM responses WHERE puzzle_id = %s AND guess = %s""",
+        (0, 'guess'), 'responses_puzzle_guess_key'),
+]
+
+# Collect the names of all indexes used anywhere in an EXPLAIN plan:
+def plan_indexes(node):
+    if 'Index Name' in node:
+        yield node['Index Name']
+    for child in node.get('Plans', []):
+        yield from plan_indexes(child)
+
+# EXPLAIN each hot query and report whether it uses its expected index:
+    # Sequential scans are disabled for the check; on small tables the planner would
+    # otherwise (rightly) prefer them, hiding whether a usable index exists at all.
+def check_query_plans(conn):
+    all_passed = True
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for name, sql, data, index_name in HOT_QUERIES:
+            cur.execute('EXPLAIN (FORMAT JSON) ' + sql, data)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            used = sorted(set(plan_indexes(plan[0]['Plan'])))
+            passed = index_name in used
+            all_passed = all_passed and passed
+            print(f"{'PASS' if passed else 'FAIL'}: {name} (expects {index_name}; "
+                f"uses {', '.join(used) or 'no index'})")
+    conn.rollback()
+    return all_passed
+
+if __name__ == '__main__':
+    config = load_config()
+    with psycopg2.connect(**config) as conn:
+        # Use --status to list migrations, or --check-plans to EXPLAIN the hot queries,
+        # for every hunt (or only the one named with --hunt <schema>):
+        schemas = hunt_schemas(conn)
+        if '--hunt' in sys.argv:
+            schemas = [sys.argv[sys.argv.index('--hunt') + 1]]
+        if '--status' in sys.argv:
+            for schema in schemas:
+                print(f'{schema}:')
+                use_schema(conn, schema)
+                print_status(conn)
+        elif '--check-plans' in sys.argv:
+            passed = True
+            for schema in schemas:
+                print(f'{schema}:')
+                use_schema(conn, schema)
+                passed = check_query_plans(conn) and passed
+            if not passed:
+                sys.exit(1)
+        elif '--hunt' in sys.argv:
+            migrate(conn, schemas[0])
+        else:
+            migrate_all(conn)
@@ -0,0 +1,11 @@
+### LOAD LIBRARIES #############################################################
+import re # Regular Expressions
+
+### GUESS NORMALIZATION ########################################################
+
+# Sanitize a guess: keep only letters and digits, and lowercase the result.
+    # Every guess and every stored response is compared in this form. (Kept apart
+    # from answers.py so that load_hunt.py does not need the bot's database driver.)
+def normalize_guess(guess):
+    sanitize = re.sub('[^A-Za-z0-9]+', '', guess)
+    return sanitize.lower()
@@ -0,0 +1,54 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+import datetime
+
+import db
+import hunts
+from config import load_partitions_config
+
+### GUESSLOG PARTITIONS ########################################################
+
+# The guesslog is partitioned by (UTC) day (see migration 10), so each guess is
+# written to the current day's small partition. The next few days' partitions are
+# created ahead of time and checked every check_interval seconds; a guess that
+# still arrives before its day's partition exists is kept in guesslog_default and
+# moved once the partition is created.
+class PartitionUpkeep:
+    def __init__(self):
+        self.days_ahead = 3
+        self.check_interval = 3600.0
+        self.task = None
+        # Metrics:
+        self.partitions_created = 0
+        self.failures = 0
+
+    def start(self, settings=None):
+        settings = settings or load_partitions_config()
+        self.days_ahead = settings['days_ahead']
+        self.check_interval = settings['check_interval']
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    # Create any missing partitions from today to days_ahead days from now:
+    async def ensure(self):
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        sql = """SELECT create_guesslog_partitions(%s, %s) AS num_created"""
+        data = (today, today + datetime.timedelta(days=self.days_ahead))
+        row = await db.fetchone(sql, data)
+        self.partitions_created += row['num_created']
+        return row['num_created']
+
+    async def run(self):
+        while True:
+            try:
+                await self.ensure()
+            except Exception as error:
+                self.failures += 1
+                print(f'Could not create guesslog partitions in {db.current_schema.get()}: {error}')
+            await asyncio.sleep(self.check_interval)
+
+upkeep = hunts.PerHunt(PartitionUpkeep)
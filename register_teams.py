@@ -0,0 +1,145 @@
+### LOAD LIBRARIES #############################################################
+import argparse
+import csv
+import io
+import sys
+import time
+
+import psycopg2
+from psycopg2 import errors
+import manage_hunts # Connects to the chosen hunt's tables
+import tokens # Secure, unique team tokens
+
+# Register teams collected ahead of time (e.g. from a sign-up form) in one batch,
+# instead of each captain running through !team create. The input CSV has the
+# columns team_name, captain_discord_id, captain_discord_name; the output is a
+# token sheet to send to each captain so their teammates can !team join.
+
+MAX_TEAM_NAME_LENGTH = 30 # As enforced by !team create
+
+### READING REGISTRATIONS ######################################################
+
+# Read and check the registrations, returning (rows, problems):
+def read_registrations(filename):
+    rows = []
+    problems = []
+    names = set()
+    captains = set()
+    with open(filename, newline='', encoding='utf-8-sig') as file:
+        for line, row in enumerate(csv.DictReader(file), start=2):
+            team_name = (row.get('team_name') or '').strip()
+            captain_id = (row.get('captain_discord_id') or '').strip()
+            captain_name = (row.get('captain_discord_name') or '').strip()
+            if not team_name or not captain_id.isdigit() or not captain_name:
+                problems.append(f'line {line}: needs a team name, a numeric captain Discord ID and a captain name')
+            elif len(team_name) > MAX_TEAM_NAME_LENGTH:
+                problems.append(f'line {line}: team name "{team_name}" is longer than {MAX_TEAM_NAME_LENGTH} characters')
+            elif team_name.casefold() in names:
+                problems.append(f'line {line}: duplicate team name "{team_name}"')
+            elif captain_id in captains:
+                problems.append(f'line {line}: captain {captain_id} is already registering another team')
+            else:
+                names.add(team_name.casefold())
+                captains.add(captain_id)
+                rows.append((team_name, captain_id, captain_name))
+    return rows, problems
+
+# Report registrations that clash with teams or solvers already in the database:
+def check_against_database(cur, rows):
+    problems = []
+    cur.execute("""SELECT discord_id FROM solvers WHERE discord_id = ANY(%s)""",
+        ([captain_id for team_name, captain_id, captain_name in rows],))
+    for (discord_id,) in cur.fetchall():
+        problems.append(f'captain {discord_id} is already registered to a team')
+    cur.execute("""SELECT team_name FROM teams WHERE is_deleted = FALSE AND lower(team_name) = ANY(%s)""",
+        ([team_name.lower() for team_name, captain_id, captain_name in rows],))
+    for (team_name,) in cur.fetchall():
+        problems.append(f'a team named "{team_name}" already exists')
+    return problems
+
+### REGISTERING TEAMS ##########################################################
+
+# Create every team and captain in one transaction, returning the token sheet rows:
+    # Tokens are drawn against the set of tokens already in use; the unique
+    # constraint on team_token catches any created concurrently by the bot, in
+    # which case the whole batch is retried with fresh tokens.
+def register_teams(conn, rows, attempts=3):
+    for attempt in range(attempts):
+        with conn.cursor() as cur:
+            cur.execute("""SELECT team_token FROM teams""")
+            taken = {token for (token,) in cur.fetchall()}
+            sheet = [(team_name, captain_id, captain_name, token) for (team_name, captain_id, captain_name), token
+                in zip(rows, tokens.generate_unique_tokens(len(rows), taken))]
+
+            cur.execute("""CREATE TEMP TABLE staged_registrations (
+                team_name VARCHAR(255) NOT NULL,
+                captain_discord_id VARCHAR(255) NOT NULL,
+                captain_discord_name VARCHAR(255) NOT NULL,
+                team_token VARCHAR(20) NOT NULL) ON COMMIT DROP""")
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(sheet)
+            buffer.seek(0)
+            cur.copy_expert('COPY staged_registrations FROM STDIN WITH (FORMAT csv)', buffer)
+
+            try:
+                cur.execute("""INSERT INTO teams (team_name, team_token)
+                    SELECT team_name, team_token FROM staged_registrations""")
+            except errors.UniqueViolation:
+                conn.rollback()
+                continue
+            cur.execute("""INSERT INTO solvers (discord_id, discord_name, team_id, is_captain)
+                SELECT staged.captain_discord_id, staged.captain_discord_name, teams.team_id, TRUE
+                FROM staged_registrations AS staged JOIN teams USING (team_token)""")
+            cur.execute("""SELECT teams.team_id, staged.team_name, staged.captain_discord_id,
+                    staged.captain_discord_name, staged.team_token
+                FROM staged_registrations AS staged JOIN teams USING (team_token)
+                ORDER BY teams.team_id""")
+            return cur.fetchall()
+    raise RuntimeError(f'Could not find unused team tokens after {attempts} attempts.')
+
+### RUN SCRIPT #################################################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Register teams and their captains in bulk.')
+    parser.add_argument('registrations', help='CSV with team_name, captain_discord_id, captain_discord_name')
+    parser.add_argument('--output', default='team_tokens.csv', help='where to write the token sheet')
+    parser.add_argument('--dry-run', action='store_true', help='check the registrations without saving them')
+    parser.add_argument('--hunt', help='the hunt to use, by name (default: the default hunt)')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    rows, problems = read_registrations(args.registrations)
+    try:
+        conn = manage_hunts.connect(args.hunt)
+    except manage_hunts.HuntError as error:
+        print(error)
+        return 1
+    try:
+        with conn.cursor() as cur:
+            problems += check_against_database(cur, rows)
+        if problems:
+            print('No teams were registered:\n' + '\n'.join(problems))
+            return 1
+        if args.dry_run:
+            print(f'{len(rows)} teams are ready to register.')
+            return 0
+        sheet = register_teams(conn, rows)
+        conn.commit()
+    except psycopg2.DatabaseError as error:
+        conn.rollback()
+        print(f'No teams were registered: {error}')
+        return 1
+    finally:
+        conn.close()
+
+    with open(args.output, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['team_id', 'team_name', 'captain_discord_id', 'captain_discord_name', 'team_token'])
+        writer.writerows(sheet)
+    print(f'Registered {len(sheet)} teams in {time.perf_counter() - started:.2f} s; '
+        f'tokens written to {args.output}.')
+    print('Run !reload in the hunt server so the running bot sees the new teams.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
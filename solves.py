@@ -0,0 +1,40 @@
+### LOAD LIBRARIES #############################################################
+import db
+import hunts
+
+### SOLVED PUZZLES #############################################################
+
+# Which puzzles each team has solved, kept in memory so that the !guess picker
+# can offer only unsolved puzzles without querying the guesslog.
+    # Loaded once at startup (and by !reload), then updated by record_guess as
+    # each correct guess is recorded, in both direct and write-behind modes.
+class SolvedPuzzles:
+    def __init__(self):
+        self.teams = {} # team_id -> set of solved puzzle_ids
+
+    # Load every team's solves from the database, replacing what is in memory:
+    async def load(self):
+        sql = """SELECT team_id, puzzle_id FROM team_solves"""
+        rows = await db.fetchall(sql, lane=db.READ)
+        teams = {}
+        for row in rows:
+            teams.setdefault(row['team_id'], set()).add(row['puzzle_id'])
+        self.teams = teams
+        return len(rows)
+
+    def add(self, team_id, puzzle_id):
+        self.teams.setdefault(team_id, set()).add(puzzle_id)
+
+    def is_solved(self, team_id, puzzle_id):
+        return puzzle_id in self.teams.get(team_id, ())
+
+    # The given puzzles (e.g. answers.index.puzzles.values()) that a team has not solved:
+    def unsolved(self, team_id, puzzles):
+        solved = self.teams.get(team_id, ())
+        return [puzzle for puzzle in puzzles if puzzle['puzzle_id'] not in solved]
+
+    # Drop a team's solves (e.g. once the team is deleted):
+    def forget(self, team_id):
+        self.teams.pop(team_id, None)
+
+solved = hunts.PerHunt(SolvedPuzzles)
@@ -0,0 +1,63 @@
+### LOAD LIBRARIES #############################################################
+from functools import lru_cache # Memoize character and string widths
+from wcwidth import wcwidth # To find widths of extended Unicode/emoji characters
+
+### WIDTHS #####################################################################
+
+# Width of a single character, counting wide (emoji/CJK) characters as 2.2 columns
+# since Discord's code blocks render them slightly wider than two:
+@lru_cache(maxsize=None)
+def char_width(char):
+    width = wcwidth(char)
+    return 2.2 if width == 2 else width
+
+# Calculate string width, using wcwidth() for width of nonstandard characters:
+    # Team and puzzle names recur on every render, so whole strings are cached too.
+@lru_cache(maxsize=65536)
+def calculate_width(text):
+    return round(sum(map(char_width, text)))
+
+# Pad a string to a given width using whitespace:
+def pad_to_width(text, width):
+    return text + ' ' * (width - calculate_width(text))
+
+### TABLES #####################################################################
+
+# Discord's limit on the length of a message:
+MESSAGE_LIMIT = 2000
+
+# Lay out a table (a list of rows of strings, header first) as lines of text:
+def table_lines(table):
+    # Measure every cell once, then size each column to its widest cell:
+    cell_widths = [[calculate_width(cell) for cell in row] for row in table]
+    col_widths = [max(widths) for widths in zip(*cell_widths)]
+
+    lines = []
+    for row, widths in zip(table, cell_widths):
+        lines.append(' | '.join(cell + ' ' * (col_width - width)
+            for cell, width, col_width in zip(row, widths, col_widths)))
+    # Underline the header row:
+    lines.insert(1, '-|-'.join('-' * col_width for col_width in col_widths))
+    return lines
+
+# Render a table in a code block:
+def render_table(table):
+    return '\n'.join(['```'] + table_lines(table) + ['```'])
+
+# Render a table as one or more code blocks, each short enough for one message
+# and each repeating the header; columns line up across every block:
+def render_pages(table, limit=MESSAGE_LIMIT):
+    lines = table_lines(table)
+    header, rows = lines[:2], lines[2:]
+    pages = []
+    page = []
+    size = len('```\n```') + sum(len(line) + 1 for line in header)
+    used = size
+    for line in rows:
+        if page and used + len(line) + 1 > limit:
+            pages.append(page)
+            page, used = [], size
+        page.append(line)
+        used += len(line) + 1
+    pages.append(page)
+    return ['\n'.join(['```'] + header + page + ['```']) for page in pages]
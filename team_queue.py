@@ -0,0 +1,113 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+import time
+from collections import deque
+
+import hunts
+
+### PER-TEAM GUESS QUEUES ######################################################
+
+# Queueing statistics for one team:
+class QueueStats:
+    def __init__(self):
+        self.submitted = 0
+        self.processed = 0
+        self.max_depth = 0
+        self.wait_time = 0.0 # Total seconds jobs spent queued before starting
+        self.max_wait = 0.0
+
+    def as_dict(self):
+        return {
+            'submitted': self.submitted,
+            'processed': self.processed,
+            'max_depth': self.max_depth,
+            'mean_wait': self.wait_time / self.processed if self.processed else 0.0,
+            'max_wait': self.max_wait,
+            }
+
+# Runs each team's guesses strictly one at a time, in arrival order, while
+# different teams' guesses proceed concurrently.
+    # A worker task is started when a team's first job arrives and exits as soon as
+    # its queue is empty, so idle teams hold no tasks. Serializing here also means a
+    # team flooding guesses occupies one pool connection rather than one per guess
+    # (each waiting on submit_guess()'s row lock), and that leaderboard updates are
+    # applied in the same order as the solves.
+class TeamQueues:
+    def __init__(self):
+        self.queues = {} # team_id -> deque of (job, future, enqueue time)
+        self.workers = {} # team_id -> worker task
+        self.stats = {} # team_id -> QueueStats
+
+    # Run job() (a coroutine function) in the team's queue and return its result:
+    async def run(self, team_id, job):
+        future = asyncio.get_running_loop().create_future()
+        queue = self.queues.setdefault(team_id, deque())
+        queue.append((job, future, time.perf_counter()))
+
+        stats = self.stats.get(team_id)
+        if stats is None:
+            stats = self.stats[team_id] = QueueStats()
+        stats.submitted += 1
+        stats.max_depth = max(stats.max_depth, len(queue))
+
+        if team_id not in self.workers:
+            self.workers[team_id] = asyncio.create_task(self.work(team_id))
+        return await future
+
+    # Process a team's queue until it is empty, then exit:
+    async def work(self, team_id):
+        queue = self.queues[team_id]
+        stats = self.stats.setdefault(team_id, QueueStats())
+        try:
+            while queue:
+                job, future, enqueued = queue.popleft()
+                waited = time.perf_counter() - enqueued
+                stats.wait_time += waited
+                stats.max_wait = max(stats.max_wait, waited)
+                # (Jobs still run if their caller has gone away; the guess was submitted.)
+                try:
+                    result = await job()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as error:
+                    if not future.done():
+                        future.set_exception(error)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                stats.processed += 1
+        finally:
+            # (No await between the emptiness check and here, so nothing can be lost;
+            # jobs are only left over if the worker was cancelled at shutdown.)
+            for job, future, enqueued in queue:
+                future.cancel()
+            del self.workers[team_id]
+            del self.queues[team_id]
+
+    # Number of a team's jobs waiting behind the one running:
+    def depth(self, team_id):
+        return len(self.queues.get(team_id, ()))
+
+    # The teams with the most queued jobs right now, busiest first:
+    def hot_teams(self, limit=10):
+        busiest = sorted(self.queues.items(), key=lambda item: len(item[1]), reverse=True)
+        return [(team_id, len(queue)) for team_id, queue in busiest[:limit]]
+
+    # Totals across every team:
+    def totals(self):
+        processed = sum(stats.processed for stats in self.stats.values())
+        return {
+            'active_teams': len(self.workers),
+            'queued': sum(len(queue) for queue in self.queues.values()),
+            'submitted': sum(stats.submitted for stats in self.stats.values()),
+            'processed': processed,
+            'mean_wait': sum(stats.wait_time for stats in self.stats.values()) / processed if processed else 0.0,
+            'max_wait': max((stats.max_wait for stats in self.stats.values()), default=0.0),
+            }
+
+    # Drop a (deleted) team's statistics:
+    def forget(self, team_id):
+        self.stats.pop(team_id, None)
+
+queues = hunts.PerHunt(TeamQueues)
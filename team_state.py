@@ -0,0 +1,76 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+
+import db
+import hunts
+
+### PER-TEAM GUESS STATE #######################################################
+
+# Everything needed to judge a team's next guess without touching the database:
+    # its counters, the puzzles it has solved (with their answers), and every
+    # (puzzle_id, guess) pair it has already submitted.
+class TeamState:
+    def __init__(self, team, solves, guesses):
+        self.team_id = team['team_id']
+        self.num_guesses = team['num_guesses']
+        self.score = team['score']
+        self.is_hunt_solved = team['is_hunt_solved']
+        self.last_solve_time = team['last_solve_time']
+        self.hunt_solve_time = team['hunt_solve_time']
+        self.solved = {row['puzzle_id']: row['guess'] for row in solves} # puzzle_id -> answer
+        self.guessed = {(row['puzzle_id'], row['guess']) for row in guesses} # (puzzle_id, guess)
+
+# Team states, loaded from the database the first time each team is needed:
+class TeamStates:
+    def __init__(self):
+        self.states = {} # team_id -> TeamState
+        self.loading = {} # team_id -> task loading that team
+
+    # Return a team's state (or None for an unknown team), sharing one load
+    # between simultaneous callers:
+        # If the states are cleared (by !reload) while a caller waits on a load, that
+        # load's result is no longer current and the team is loaded again.
+    async def get(self, team_id):
+        while True:
+            state = self.states.get(team_id)
+            if state is not None:
+                return state
+            task = self.loading.get(team_id)
+            if task is None:
+                task = asyncio.create_task(self.load(team_id))
+                self.loading[team_id] = task
+            state = await task
+            if state is None or self.states.get(team_id) is state:
+                return state
+
+    async def load(self, team_id):
+        try:
+            async with db.cursor() as cur:
+                sql = """SELECT team_id, num_guesses, score, is_hunt_solved,
+                    last_solve_time, hunt_solve_time FROM teams WHERE team_id = %s"""
+                await cur.execute(sql, (team_id,))
+                team = await cur.fetchone()
+                # (From team_solves and team_guesses, which keep archived days' guesses.)
+                sql = """SELECT puzzle_id, guess FROM team_solves WHERE team_id = %s"""
+                await cur.execute(sql, (team_id,))
+                solves = await cur.fetchall()
+                sql = """SELECT puzzle_id, guess FROM team_guesses WHERE team_id = %s"""
+                await cur.execute(sql, (team_id,))
+                guesses = await cur.fetchall()
+            if team is None: # No such team
+                return None
+            state = TeamState(team, solves, guesses)
+            self.states[team_id] = state
+            return state
+        finally:
+            self.loading.pop(team_id, None)
+
+    # Drop a team's state (e.g. once the team is deleted):
+    def forget(self, team_id):
+        self.states.pop(team_id, None)
+
+    # Drop every state, so that each is reloaded from the database on next use:
+    def clear(self):
+        self.states.clear()
+
+states = hunts.PerHunt(TeamStates)
@@ -0,0 +1,109 @@
+### LOAD LIBRARIES #############################################################
+import datetime
+
+import leaderboard
+
+### HELPERS ####################################################################
+
+def at(minute):
+    return datetime.datetime(2024, 4, 12, 18, minute, tzinfo=datetime.timezone.utc)
+
+def team(team_id, score, last_solve, hunt_solve=None, name=None):
+    return {'team_id': team_id, 'team_name': name or f'Team {team_id}', 'score': score,
+        'is_hunt_solved': hunt_solve is not None, 'last_solve_time': at(last_solve),
+        'hunt_solve_time': None if hunt_solve is None else at(hunt_solve)}
+
+# The order of the original query:
+    # ORDER BY hunt_solve_time ASC NULLS LAST, score DESC, last_solve_time ASC
+def expected_order(teams):
+    return [row['team_id'] for row in sorted(teams, key=lambda row: (
+        row['hunt_solve_time'] is None, row['hunt_solve_time'] or at(0),
+        -row['score'], row['last_solve_time'], row['team_id']))]
+
+def make_board(teams):
+    board = leaderboard.Leaderboard()
+    for row in teams:
+        board.update(row)
+    return board
+
+TEAMS = [
+    team(1, 10, 5),
+    team(2, 30, 20),
+    team(3, 30, 10),
+    team(4, 50, 40, hunt_solve=40),
+    team(5, 20, 30, hunt_solve=30),
+    team(6, 10, 5),
+    ]
+
+### RANKING ####################################################################
+
+def test_ranking_matches_original_order_by():
+    board = make_board(TEAMS)
+    assert [row['team_id'] for row in board.ranked()] == [5, 4, 3, 2, 1, 6]
+    assert [row['team_id'] for row in board.ranked()] == expected_order(TEAMS)
+
+def test_finished_teams_win_the_hunt():
+    assert make_board(TEAMS).is_hunt_won()
+    assert not make_board(TEAMS[:3]).is_hunt_won()
+
+# A solve moves the team to its new place, replacing its old row:
+def test_update_moves_a_team():
+    board = make_board(TEAMS)
+    version = board.version
+    board.update(team(1, 40, 50))
+    assert [row['team_id'] for row in board.ranked()] == [5, 4, 1, 3, 2, 6]
+    assert len(board.keys) == len(TEAMS)
+    assert board.teams[1]['score'] == 40
+    assert board.version == version + 1
+
+def test_unchanged_update_keeps_the_version():
+    board = make_board(TEAMS)
+    version = board.version
+    board.update(dict(TEAMS[0]))
+    assert board.version == version
+
+def test_renaming_a_team_counts_as_a_change():
+    board = make_board(TEAMS)
+    version = board.version
+    board.update(team(1, 10, 5, name='Renamed'))
+    assert board.version == version + 1
+    assert board.teams[1]['team_name'] == 'Renamed'
+
+def test_remove_drops_a_team():
+    board = make_board(TEAMS)
+    board.remove(3)
+    board.remove(99) # Unknown teams are ignored
+    assert [row['team_id'] for row in board.ranked()] == [5, 4, 2, 1, 6]
+    assert board.place(3) is None
+
+### PAGES ######################################################################
+
+def test_place_and_page():
+    teams = [team(team_id, 100 - team_id, 5) for team_id in range(1, 26)]
+    board = make_board(teams)
+    assert board.num_pages() == 3
+    assert board.place(1) == 1
+    assert board.place(11) == 11
+    assert board.page_of(board.place(11)) == 2
+    assert board.page_of(board.place(25)) == 3
+
+# Pages are rendered once, until the ranking changes, and out-of-range pages are clamped:
+def test_render_page_caches_until_changed():
+    board = make_board([team(team_id, 100 - team_id, 5) for team_id in range(1, 26)])
+    calls = []
+    def build_table(teams, first_place, show_finish):
+        calls.append((first_place, [row['team_id'] for row in teams], show_finish))
+        return f'page from {first_place}'
+    assert board.render_page(2, build_table) == (2, 'page from 11')
+    assert board.render_page(2, build_table) == (2, 'page from 11')
+    assert calls == [(11, list(range(11, 21)), False)]
+    assert board.render_page(9, build_table) == (3, 'page from 21')
+    assert board.render_page(0, build_table) == (1, 'page from 1')
+    board.update(team(25, 1000, 1))
+    assert board.render_page(1, build_table) == (1, 'page from 1')
+    assert calls[-1][1][0] == 25
+
+def test_empty_board_has_one_page():
+    board = leaderboard.Leaderboard()
+    assert board.num_pages() == 1
+    assert not board.is_hunt_won()
@@ -0,0 +1,75 @@
+### LOAD LIBRARIES #############################################################
+import os
+
+import pytest
+
+import load_hunt
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+### VALIDATION #################################################################
+
+PUZZLES = [(2, 'Opening', '1', False), (3, 'Meta', '5', True)]
+RESPONSES = [
+    (2, 'Opening', 'Right Answer', True, 'Correct!'),
+    (3, 'Opening', 'close', False, 'Keep going.'),
+    (4, 'Meta', 'THE END', True, 'You win!'),
+    ]
+
+def problems(puzzles, responses):
+    with pytest.raises(load_hunt.ContentError) as error:
+        load_hunt.validate(puzzles, responses)
+    return str(error.value).split('\n')
+
+def test_valid_content_is_normalized():
+    puzzles, responses, warnings = load_hunt.validate(PUZZLES, RESPONSES)
+    assert puzzles == [('Opening', 1, False), ('Meta', 5, True)]
+    assert ('Opening', 'rightanswer', True, 'Correct!') in responses
+    assert ('Meta', 'theend', True, 'You win!') in responses
+    assert warnings == []
+
+def test_every_problem_is_reported():
+    puzzles = PUZZLES + [(4, '', '1', False), (5, 'Opening', '2', False), (6, 'Extra', 'many', False)]
+    responses = RESPONSES + [
+        (5, 'Missing', 'guess', False, 'Nope'),
+        (6, 'Meta', '?!', False, 'Nope'),
+        (7, 'Meta', 'wrong', False, '  '),
+        (8, 'Opening', 'right answer!', False, 'Again'),
+        ]
+    assert problems(puzzles, responses) == [
+        'puzzles 4: missing puzzle name',
+        'puzzles 5: duplicate puzzle "Opening"',
+        'puzzles 6: "Extra" has invalid points "many"',
+        'responses 5: unknown puzzle "Missing"',
+        'responses 6: guess "?!" is empty once normalized',
+        'responses 7: missing response to "wrong"',
+        'responses 8: "right answer!" duplicates an earlier guess on "Opening" '
+            '(both normalize to "rightanswer")',
+        ]
+
+def test_warnings_do_not_stop_loading():
+    puzzles = [(2, 'Opening', '1', False), (3, 'x' * 101, '1', False)]
+    responses = [(2, 'Opening', 'guess', False, 'Nope')]
+    clean_puzzles, clean_responses, warnings = load_hunt.validate(puzzles, responses)
+    assert len(clean_puzzles) == 2
+    assert warnings == [
+        f'puzzles 3: "{"x" * 101}" is longer than 100 characters',
+        '"Opening" has no response marked as the answer',
+        f'"{"x" * 101}" has no response marked as the answer',
+        'no puzzle is marked as the final puzzle',
+        ]
+
+### READING CONTENT ############################################################
+
+# The two example formats hold the same content:
+def test_examples_validate_alike():
+    from_csv = load_hunt.validate(*load_hunt.read_csv_content(EXAMPLES))
+    assert from_csv[0]
+    if load_hunt.yaml is not None:
+        from_yaml = load_hunt.validate(*load_hunt.read_yaml_content(os.path.join(EXAMPLES, 'hunt.yaml')))
+        assert sorted(from_yaml[0]) == sorted(from_csv[0])
+        assert sorted(from_yaml[1]) == sorted(from_csv[1])
+
+def test_parse_bool():
+    assert load_hunt.parse_bool('Yes') and load_hunt.parse_bool('x') and load_hunt.parse_bool(True)
+    assert not load_hunt.parse_bool('') and not load_hunt.parse_bool(None) and not load_hunt.parse_bool('no')
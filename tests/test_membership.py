@@ -0,0 +1,32 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+
+import db
+import membership
+
+### HELPERS ####################################################################
+
+# Look a solver up while invalidate() runs mid-query, returning (result, cache):
+def race(monkeypatch, invalidate, row=None):
+    cache = membership.MembershipCache()
+    async def fetchone(sql, data):
+        invalidate(cache) # e.g. a concurrent !team join
+        return row
+    monkeypatch.setattr(db, 'fetchone', fetchone)
+    return asyncio.run(cache.get('42')), cache
+
+### INVALIDATION RACES #########################################################
+
+# A lookup that overlaps an invalidation returns its result without caching it:
+def test_invalidated_lookups_are_not_cached(monkeypatch):
+    for invalidate in (lambda cache: cache.invalidate('42'), lambda cache: cache.invalidate_team(7),
+            lambda cache: cache.clear()):
+        result, cache = race(monkeypatch, invalidate)
+        assert result is None
+        assert '42' not in cache.entries
+
+def test_other_solvers_do_not_block_caching(monkeypatch):
+    row = {'discord_id': '42', 'is_captain': False, 'team_id': 7, 'team_name': 'Alpha'}
+    result, cache = race(monkeypatch, lambda cache: cache.invalidate('43'), row)
+    assert result == row
+    assert cache.entries['42'][1] == row
@@ -0,0 +1,46 @@
+### LOAD LIBRARIES #############################################################
+import tables
+
+### WIDTHS #####################################################################
+
+def test_wide_characters_count_extra():
+    assert tables.calculate_width('abc') == 3
+    assert tables.calculate_width('🔎') == 2
+    assert tables.calculate_width('🔎🔎') == 4 # 4.4, rounded
+    assert tables.pad_to_width('ab', 5) == 'ab   '
+
+### TABLES #####################################################################
+
+TABLE = [['#', 'Team Name', 'Score'], ['1', 'Alpha', '30'], ['2', 'Much Longer Name', '5']]
+
+def test_columns_line_up():
+    lines = tables.table_lines(TABLE)
+    assert lines == [
+        '# | Team Name        | Score',
+        '--|------------------|------',
+        '1 | Alpha            | 30   ',
+        '2 | Much Longer Name | 5    ',
+        ]
+
+def test_render_table_is_one_code_block():
+    rendered = tables.render_table(TABLE)
+    assert rendered.startswith('```\n') and rendered.endswith('\n```')
+    assert rendered.count('\n') == len(TABLE) + 2
+
+# Long tables are split into blocks that each fit the limit and repeat the header:
+def test_render_pages_splits_long_tables():
+    table = [['#', 'Name']] + [[str(n), f'Team number {n}'] for n in range(1, 201)]
+    pages = tables.render_pages(table, limit=500)
+    assert len(pages) > 1
+    header = tables.table_lines(table)[:2]
+    rows = []
+    for page in pages:
+        assert len(page) <= 500
+        lines = page.split('\n')
+        assert lines[0] == lines[-1] == '```'
+        assert lines[1:3] == header
+        rows.extend(lines[3:-1])
+    assert rows == tables.table_lines(table)[2:]
+
+def test_render_pages_keeps_short_tables_whole():
+    assert tables.render_pages(TABLE) == [tables.render_table(TABLE)]
@@ -0,0 +1,100 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+
+import pytest
+
+import team_queue
+
+### PER-TEAM GUESS QUEUES ######################################################
+
+# A job that records when it starts and finishes, yielding to other tasks between:
+def job(log, name, result=None):
+    async def run():
+        log.append(('start', name))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        log.append(('end', name))
+        return result if result is not None else name
+    return run
+
+# One team's jobs run one at a time, in arrival order:
+def test_a_teams_jobs_run_in_order():
+    async def main():
+        queues = team_queue.TeamQueues()
+        log = []
+        results = await asyncio.gather(*(queues.run(1, job(log, n)) for n in range(5)))
+        return queues, log, results
+    queues, log, results = asyncio.run(main())
+    assert results == list(range(5))
+    assert log == [(event, n) for n in range(5) for event in ('start', 'end')]
+    assert queues.stats[1].submitted == 5
+    assert queues.stats[1].processed == 5
+    assert queues.stats[1].max_depth == 5
+
+# Different teams' jobs interleave:
+def test_teams_run_concurrently():
+    async def main():
+        queues = team_queue.TeamQueues()
+        log = []
+        await asyncio.gather(queues.run(1, job(log, 'a')), queues.run(2, job(log, 'b')))
+        return log
+    log = asyncio.run(main())
+    assert log[:2] == [('start', 'a'), ('start', 'b')]
+
+# Workers exit (and queues are dropped) once a team's queue is empty:
+def test_idle_teams_are_reaped():
+    async def main():
+        queues = team_queue.TeamQueues()
+        await queues.run(1, job([], 'a'))
+        await asyncio.sleep(0)
+        reaped = (dict(queues.workers), dict(queues.queues), queues.depth(1))
+        await queues.run(1, job([], 'b')) # A new worker starts for the next job
+        await asyncio.sleep(0)
+        return queues, reaped
+    queues, reaped = asyncio.run(main())
+    assert reaped == ({}, {}, 0)
+    assert queues.workers == {}
+    assert queues.totals()['processed'] == 2
+    assert queues.totals()['active_teams'] == 0
+
+# A failing job raises in its caller without stopping the jobs queued behind it:
+def test_failures_reach_their_caller_only():
+    async def fail():
+        raise ValueError('bad guess')
+    async def main():
+        queues = team_queue.TeamQueues()
+        log = []
+        return await asyncio.gather(queues.run(1, fail), queues.run(1, job(log, 'after')),
+            return_exceptions=True)
+    failed, after = asyncio.run(main())
+    assert isinstance(failed, ValueError)
+    assert after == 'after'
+
+def test_hot_teams_lists_the_busiest_first():
+    async def main():
+        queues = team_queue.TeamQueues()
+        release = asyncio.Event()
+        async def wait():
+            await release.wait()
+        tasks = [asyncio.create_task(queues.run(team_id, wait))
+            for team_id, count in ((1, 2), (2, 4), (3, 1)) for _ in range(count)]
+        await asyncio.sleep(0)
+        hot = queues.hot_teams(limit=2)
+        release.set()
+        await asyncio.gather(*tasks)
+        return hot
+    assert asyncio.run(main()) == [(2, 4), (1, 2)]
+
+def test_forget_drops_a_teams_stats():
+    async def main():
+        queues = team_queue.TeamQueues()
+        await queues.run(1, job([], 'a'))
+        queues.forget(1)
+        return queues
+    assert 1 not in asyncio.run(main()).stats
+
+def test_stats_report_mean_wait():
+    stats = team_queue.QueueStats()
+    assert stats.as_dict()['mean_wait'] == 0.0
+    stats.processed, stats.wait_time = 4, 2.0
+    assert stats.as_dict()['mean_wait'] == pytest.approx(0.5)
@@ -0,0 +1,25 @@
+### LOAD LIBRARIES #############################################################
+import tokens
+
+### TEAM TOKENS ################################################################
+
+def test_tokens_use_the_alphabet():
+    token = tokens.generate_token()
+    assert len(token) == tokens.TOKEN_LENGTH
+    assert set(token) <= set(tokens.TOKEN_ALPHABET)
+
+def test_unique_tokens_avoid_each_other_and_taken_tokens():
+    taken = {tokens.generate_token() for _ in range(100)}
+    before = set(taken)
+    generated = tokens.generate_unique_tokens(500, taken)
+    assert len(generated) == 500
+    assert len(set(generated)) == 500
+    assert not set(generated) & before
+    assert taken == before | set(generated) # taken is updated in place
+
+# With a tiny token space, every remaining token is still found exactly once:
+def test_unique_tokens_fill_a_small_space():
+    space = len(tokens.TOKEN_ALPHABET)
+    taken = set(tokens.TOKEN_ALPHABET[:10])
+    generated = tokens.generate_unique_tokens(space - 10, taken, length=1)
+    assert sorted(generated) == sorted(tokens.TOKEN_ALPHABET[10:])
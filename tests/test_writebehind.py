@@ -0,0 +1,56 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+
+import hunts
+import team_state
+import writebehind
+
+### HELPERS ####################################################################
+
+SCHEMA = 'test_writebehind'
+
+# A writer whose team 1 has the given number of guesses left, judged entirely in
+# memory (team state is only read from the database on a cache miss):
+def run_guesses(num_guesses, guesses):
+    team = {'team_id': 1, 'num_guesses': num_guesses, 'score': 0, 'is_hunt_solved': False,
+        'last_solve_time': None, 'hunt_solve_time': None}
+    async def main():
+        writer = writebehind.GuessWriter()
+        results = [await writer.submit(1, puzzle_id, guess, guess_status, 1, False)
+            for puzzle_id, guess, guess_status in guesses]
+        return writer, results
+    with hunts.use(SCHEMA):
+        team_state.states.states[1] = team_state.TeamState(team, [], [])
+        try:
+            return asyncio.run(main())
+        finally:
+            hunts.forget(SCHEMA)
+
+### GUESS LIMIT ################################################################
+
+# Regression: old pickers and forms could keep submitting guesses after a team ran
+# out, driving its counter negative.
+def test_guesses_stop_at_zero():
+    writer, results = run_guesses(2, [(1, 'one', 'incorrect'), (1, 'two', 'incorrect'),
+        (1, 'three', 'incorrect'), (2, 'answer', 'correct')])
+    assert [result['outcome'] for result in results] == ['incorrect', 'incorrect', 'no_guesses', 'no_guesses']
+    assert [result['num_guesses'] for result in results] == [1, 0, 0, 0]
+    assert len(writer.pending) == 2 # Refused guesses are not written
+
+def test_a_team_with_no_guesses_is_refused():
+    writer, results = run_guesses(0, [(1, 'answer', 'correct')])
+    assert results[0]['outcome'] == 'no_guesses'
+    assert writer.pending == []
+
+# Duplicates are still reported as such, and cost nothing:
+def test_duplicates_cost_nothing():
+    writer, results = run_guesses(1, [(1, 'same', 'partial'), (1, 'same', 'partial'), (1, 'wrong', 'incorrect')])
+    assert [result['outcome'] for result in results] == ['partial', 'duplicate', 'incorrect']
+    assert results[-1]['num_guesses'] == 0
+
+def test_correct_guesses_score_and_mark_solved():
+    writer, results = run_guesses(1, [(1, 'answer', 'correct'), (1, 'other', 'incorrect')])
+    assert results[0]['outcome'] == 'correct'
+    assert results[0]['score'] == 1
+    assert results[1]['outcome'] == 'solved'
+    assert results[1]['solved_answer'] == 'answer'
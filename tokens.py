@@ -0,0 +1,25 @@
+### LOAD LIBRARIES #############################################################
+import secrets # Cryptographically secure randomness, so tokens cannot be predicted
+
+### TEAM TOKENS ################################################################
+
+# Easily identifiable characters (omitting I, 1, 0, O and l):
+TOKEN_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz23456789'
+TOKEN_LENGTH = 8
+
+# Generate a single team token:
+def generate_token(length=TOKEN_LENGTH):
+    return ''.join(secrets.choice(TOKEN_ALPHABET) for _ in range(length))
+
+# Generate count tokens that are distinct from each other and from every token in
+# taken (a set of tokens already in use, which is updated in place):
+    # The teams_team_token_key unique constraint remains the final guarantee against
+    # teams created concurrently elsewhere.
+def generate_unique_tokens(count, taken, length=TOKEN_LENGTH):
+    tokens = []
+    while len(tokens) < count:
+        token = generate_token(length)
+        if token not in taken:
+            taken.add(token)
+            tokens.append(token)
+    return tokens
@@ -0,0 +1,222 @@
+### LOAD LIBRARIES #############################################################
+import asyncio
+import csv
+import datetime
+import time
+
+import db
+import hunts
+import team_state # Authoritative per-team counters while write-behind is enabled
+from config import load_write_behind_config
+
+### WRITE-BEHIND GUESS LOGGING #################################################
+
+# Where queued guesses are saved if they still cannot be written at shutdown
+# (other hunts than the default add their schema to the name):
+UNFLUSHED_FILE = 'unflushed_guesses.csv'
+
+# Optional mode for guess storms (hunt open, meta unlocks): accepted guesses are
+# judged against in-memory team state, answered immediately, and queued; a
+# background task writes the queue with COPY and batched counter updates every
+# flush_interval_ms (or sooner, once max_batch_rows guesses are waiting).
+    # While enabled, team_state holds the authoritative counters and dedupe sets,
+    # so the database trails the bot by at most one flush interval.
+class GuessWriter:
+    def __init__(self):
+        self.enabled = False
+        self.pending = [] # Queued guesslog rows, oldest first
+        self.flush_interval = 0.2
+        self.max_batch_rows = 500
+        self.task = None
+        self.wakeup = None
+        self.flush_lock = None
+        # Metrics:
+        self.rows_flushed = 0
+        self.batches_flushed = 0
+        self.flush_failures = 0
+        self.max_queue_depth = 0
+        self.last_flush_seconds = 0.0
+
+    def queue_depth(self):
+        return len(self.pending)
+
+    # Read the [write_behind] settings (unless given) and, if enabled, start the flush loop:
+    def start(self, settings=None):
+        settings = settings or load_write_behind_config()
+        self.enabled = settings['enabled']
+        self.flush_interval = settings['flush_interval_ms'] / 1000
+        self.max_batch_rows = settings['max_batch_rows']
+        if self.enabled:
+            self.wakeup = asyncio.Event()
+            self.flush_lock = asyncio.Lock()
+            self.task = asyncio.create_task(self.run())
+
+    # Stop the flush loop and write out everything still queued:
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        self.task = None
+        for attempt in range(3):
+            try:
+                await self.flush()
+                return
+            except Exception as error:
+                print(f'Final guesslog flush failed (attempt {attempt + 1}): {error}')
+                await asyncio.sleep(1)
+        self.save_unflushed()
+
+    # Last resort: keep queued guesses on disk rather than losing them.
+        # (Load them afterwards with psql's \copy guesslog (...) FROM 'unflushed_guesses.csv' CSV HEADER;
+        # team_solves, team_guesses, team counters and puzzle_stats then need repairing.)
+    def save_unflushed(self):
+        schema = db.current_schema.get()
+        filename = UNFLUSHED_FILE if schema == db.DEFAULT_SCHEMA else f'unflushed_guesses_{schema}.csv'
+        with open(filename, 'a', newline='') as file:
+            writer = csv.writer(file)
+            if file.tell() == 0:
+                writer.writerow(['puzzle_id', 'team_id', 'guess', 'guess_status', 'guess_time'])
+            for row in self.pending:
+                writer.writerow(row[:5])
+        print(f'Saved {len(self.pending)} unwritten guesses to {filename}.')
+        self.pending.clear()
+
+    # Flush whenever the interval elapses or the queue reaches max_batch_rows:
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as error:
+                # Rows stay queued and are retried on the next pass:
+                self.flush_failures += 1
+                print(f'Guesslog flush failed ({len(self.pending)} guesses queued): {error}')
+
+    # Write queued guesses in batches until the queue is empty:
+    async def flush(self):
+        async with self.flush_lock:
+            await self.write_pending()
+
+    # Write out the queue, then call reset() (e.g. to drop team state) before the
+    # flush lock is released. Guesses judged while writing are written first, and
+    # none can be queued between the last write and reset().
+    async def flush_and_reset(self, reset):
+        async with self.flush_lock:
+            await self.write_pending()
+            reset()
+
+    # (Called with flush_lock held.)
+    async def write_pending(self):
+        while self.pending:
+            batch = self.pending[:self.max_batch_rows]
+            started = time.perf_counter()
+            await self.write_batch(batch)
+            del self.pending[:len(batch)]
+            self.last_flush_seconds = time.perf_counter() - started
+            self.rows_flushed += len(batch)
+            self.batches_flushed += 1
+
+    # Write one batch (guesslog rows, solves and guesses, team counters, puzzle_stats) in one transaction:
+    async def write_batch(self, batch):
+        # Combine the batch into one counter delta per team and per puzzle:
+        team_deltas = {}
+        puzzle_deltas = {}
+        for puzzle_id, team_id, guess, guess_status, guess_time, points, is_final in batch:
+            team = team_deltas.setdefault(team_id, [0, 0, None, None])
+            stats = puzzle_deltas.setdefault(puzzle_id, [0, 0])
+            if guess_status == 'incorrect':
+                team[0] += 1
+                stats[1] += 1
+            elif guess_status == 'correct':
+                team[1] += points
+                team[2] = guess_time
+                if is_final:
+                    team[3] = guess_time
+                stats[0] += 1
+
+        async with db.cursor() as cur:
+            async with cur.copy("""COPY guesslog (puzzle_id, team_id, guess, guess_status, guess_time)
+                FROM STDIN""") as copy:
+                for row in batch:
+                    await copy.write_row(row[:5])
+
+            sql = """INSERT INTO team_guesses (team_id, puzzle_id, guess, guess_status) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (team_id, puzzle_id, guess) DO NOTHING"""
+            await cur.executemany(sql, [(team_id, puzzle_id, guess, guess_status)
+                for puzzle_id, team_id, guess, guess_status, guess_time, points, is_final in batch])
+
+            sql = """INSERT INTO team_solves (team_id, puzzle_id, guess, solve_time) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (team_id, puzzle_id) DO NOTHING"""
+            await cur.executemany(sql, [(team_id, puzzle_id, guess, guess_time)
+                for puzzle_id, team_id, guess, guess_status, guess_time, points, is_final in batch
+                if guess_status == 'correct'])
+
+            sql = """UPDATE teams SET num_guesses = num_guesses - %s, score = score + %s,
+                last_solve_time = COALESCE(%s, last_solve_time),
+                is_hunt_solved = is_hunt_solved OR %s,
+                hunt_solve_time = COALESCE(hunt_solve_time, %s)
+                WHERE team_id = %s"""
+            await cur.executemany(sql, [(debit, points, last_solve, hunt_solve is not None, hunt_solve, team_id)
+                for team_id, (debit, points, last_solve, hunt_solve) in team_deltas.items()])
+
+            sql = """INSERT INTO puzzle_stats AS stats (puzzle_id, num_solves, num_guesses)
+                VALUES (%s, %s, %s) ON CONFLICT (puzzle_id) DO UPDATE
+                SET num_solves = stats.num_solves + EXCLUDED.num_solves,
+                    num_guesses = stats.num_guesses + EXCLUDED.num_guesses"""
+            await cur.executemany(sql, [(puzzle_id, solves, guesses)
+                for puzzle_id, (solves, guesses) in puzzle_deltas.items() if solves or guesses])
+        for team_id in team_deltas:
+            db.note_write(team_id) # For read-your-writes on the replica
+
+    # Judge a guess against the team's in-memory state and queue it for writing.
+        # Returns the same fields as the submit_guess() stored function.
+    async def submit(self, team_id, puzzle_id, guess, guess_status, puzzle_points, is_final_puzzle):
+        state = await team_state.states.get(team_id)
+        result = {'outcome': None, 'solved_answer': None, 'num_guesses': None, 'score': None,
+            'is_hunt_solved': None, 'last_solve_time': None, 'hunt_solve_time': None}
+        if state is None:
+            result['outcome'] = 'unregistered'
+            return result
+        result['num_guesses'] = state.num_guesses
+
+        # (No awaits from here on, so guesses from teammates cannot interleave.)
+        if puzzle_id in state.solved:
+            result['outcome'] = 'solved'
+            result['solved_answer'] = state.solved[puzzle_id]
+            return result
+        if (puzzle_id, guess) in state.guessed:
+            result['outcome'] = 'duplicate'
+            return result
+        if state.num_guesses < 1:
+            result['outcome'] = 'no_guesses'
+            return result
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        state.guessed.add((puzzle_id, guess))
+        if guess_status == 'incorrect':
+            state.num_guesses -= 1
+            result['num_guesses'] = state.num_guesses
+        elif guess_status == 'correct':
+            state.solved[puzzle_id] = guess
+            state.score += puzzle_points
+            state.last_solve_time = now
+            if is_final_puzzle and not state.is_hunt_solved:
+                state.is_hunt_solved = True
+                state.hunt_solve_time = now
+            result.update({'score': state.score, 'is_hunt_solved': state.is_hunt_solved,
+                'last_solve_time': state.last_solve_time, 'hunt_solve_time': state.hunt_solve_time})
+
+        self.pending.append((puzzle_id, team_id, guess, guess_status, now,
+            puzzle_points, is_final_puzzle and guess_status == 'correct'))
+        self.max_queue_depth = max(self.max_queue_depth, len(self.pending))
+        if len(self.pending) >= self.max_batch_rows:
+            self.wakeup.set()
+
+        result['outcome'] = guess_status
+        return result
+
+writer = hunts.PerHunt(GuessWriter)